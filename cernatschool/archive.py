@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Binary columnar archives of CERN@school Timepix datasets.
+
+A dataset's frames are packed into a single file so that the ASCII data
+and DSC files don't have to be parsed again on every analysis pass.
+The archive is laid out as:
+
+ * the identifier (ARCHIVE_MAGIC) and the length of the JSON header
+   (as a little-endian unsigned 64-bit integer);
+ * the JSON header (version, data format, frame size, file names, the
+   dataset metadata and pixel mask, and the array descriptions);
+ * the arrays, each aligned to ARCHIVE_ALIGNMENT bytes:
+   - "Xs": the concatenated pixel indices (X = y*width + x) of all frames;
+   - "Cs": the concatenated pixel counts;
+   - "offsets": the (N+1) offsets of each frame's pixels in Xs and Cs;
+   - "frames": the frame metadata table (see ARCHIVE_FRAME_DTYPE).
+
+The arrays are memory-mapped when the archive is read, and each frame's
+pixels are handed out as views of the mapped arrays.
+"""
+
+#...for the logging.
+import logging as lg
+
+#...for the archive header.
+import json
+
+#...for the frame data hashes.
+import hashlib
+
+#...for the MATH.
+import numpy as np
+
+#...for the data values.
+from datavals import *
+
+#...for the start time strings.
+from handlers import getPixelmanTimeString
+
+## The frame metadata table columns and types.
+ARCHIVE_FRAME_DTYPE = np.dtype([
+    ("starttime", "<f8"),
+    ("acqtime",   "<f8"),
+    ("hv",        "<f8"),
+    ("chipid",    "S32"),
+    ("dacs",      "<i4", (ARCHIVE_N_DACS,))
+    ])
+
+def getAlignedOffset(offset):
+    """ Round a byte offset up to the archive alignment. """
+    return -(-offset // ARCHIVE_ALIGNMENT) * ARCHIVE_ALIGNMENT
+
+def getArchiveIntType(a):
+    """ Get the smallest (little-endian) integer type that can hold an array's values. """
+
+    if len(a) == 0 or (a.min() >= 0 and a.max() <= np.iinfo(np.uint16).max):
+        return "<u2"
+    elif a.min() >= 0 and a.max() <= np.iinfo(np.uint32).max:
+        return "<u4"
+
+    return "<i8"
+
+def isArchive(path):
+    """ Check if a path is a binary frame archive. """
+
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+    except IOError:
+        return False
+
+def packDataset(ds, filename, metadata=None, pixelmask=None):
+    """
+    Pack a dataset's frames into a binary frame archive.
+
+    @param [in] ds The dataset (see dataset.py).
+    @param [in] filename The path of the archive to write.
+    @param [in] metadata The dataset metadata (e.g. the contents of metadata.json).
+    @param [in] pixelmask The (rows, cols) pixel mask array (None for no mask).
+    @returns The number of frames packed.
+    """
+
+    ## The DSC files (in start time order).
+    dscfiles = ds.dscfiles
+
+    ## The frame width and height.
+    width, height = 256, 256
+    #
+    if len(dscfiles) > 0:
+        width, height = dscfiles[0].getFrameWidth(), dscfiles[0].getFrameHeight()
+
+    ## The frame metadata table.
+    frames = np.zeros(len(dscfiles), dtype=ARCHIVE_FRAME_DTYPE)
+
+    frames["dacs"] = -1
+
+    ## The pixel arrays of each frame.
+    Xs_list, Cs_list = [], []
+
+    for i, df in enumerate(dscfiles):
+
+        if df.getFrameWidth() != width or df.getFrameHeight() != height:
+            raise IOError("FRAME_SIZE_MISMATCH")
+
+        Xs, Cs = df.getPixelArrays()
+
+        Xs_list.append(Xs); Cs_list.append(Cs)
+
+        df.freePixelMap()
+
+        frames[i]["starttime"] = df.getStartTime()
+        frames[i]["acqtime"]   = df.getAcqTime()
+        frames[i]["hv"]        = df.getBiasVoltage() if df.getBiasVoltage() is not None else np.nan
+        frames[i]["chipid"]    = df.getChipId() if df.getChipId() is not None else ""
+
+        if df.getDACs() is not None:
+            dacs = df.getDACs()[:ARCHIVE_N_DACS]
+            frames[i]["dacs"][:len(dacs)] = dacs
+
+    ## The offsets of each frame's pixels.
+    offsets = np.concatenate(([0], np.cumsum([len(Xs) for Xs in Xs_list]))).astype("<i8")
+
+    Xs = np.concatenate(Xs_list) if len(Xs_list) > 0 else np.zeros(0, dtype=np.int64)
+
+    Cs = np.concatenate(Cs_list) if len(Cs_list) > 0 else np.zeros(0, dtype=np.int64)
+
+    ## The arrays to write.
+    arrays = [ \
+        ("Xs",      Xs.astype(getArchiveIntType(Xs))), \
+        ("Cs",      Cs.astype(getArchiveIntType(Cs))), \
+        ("offsets", offsets), \
+        ("frames",  frames) \
+        ]
+
+    ## The array descriptions {name : [dtype, offset, length]}, with the
+    ## offsets relative to the (aligned) end of the header.
+    descriptions = {}
+
+    ## The offset of the next array.
+    offset = 0
+
+    for name, a in arrays:
+        descriptions[name] = [a.dtype.str if name != "frames" else None, offset, len(a)]
+        offset = getAlignedOffset(offset + a.nbytes)
+
+    ## The mask pixel indices.
+    masked = None
+    #
+    if pixelmask is not None:
+        masked = np.flatnonzero(pixelmask).tolist()
+
+    ## The archive header.
+    header = json.dumps({ \
+        "version"      : ARCHIVE_VERSION, \
+        "format"       : ds.getFormat(), \
+        "width"        : width, \
+        "height"       : height, \
+        "names"        : [df.getDataFilename().split("/")[-1] for df in dscfiles], \
+        "metadata"     : metadata, \
+        "maskedpixels" : masked, \
+        "arrays"       : descriptions \
+        })
+
+    ## The start of the arrays.
+    datastart = getAlignedOffset(len(ARCHIVE_MAGIC) + 8 + len(header))
+
+    with open(filename, "wb") as f:
+
+        f.write(ARCHIVE_MAGIC)
+        f.write(np.array([len(header)], dtype="<u8").tostring())
+        f.write(header)
+
+        for name, a in arrays:
+            f.write("\0" * (datastart + descriptions[name][1] - f.tell()))
+            f.write(a.tostring())
+
+    lg.info(" * Packed %d frames (%d pixels) into '%s'." % (len(dscfiles), len(Xs), filename))
+
+    return len(dscfiles)
+
+class ArchiveEntry:
+    """
+    A frame stored in a binary frame archive.
+
+    Provides the same getters as the DSC file wrapper (DscFile) for the
+    settings that are stored in the archive.
+    """
+
+    def __init__(self, archive, index):
+
+        ## The archive.
+        self.__archive = archive
+
+        ## The index of the frame in the archive.
+        self.__index = index
+
+        ## The frame metadata record.
+        self.__record = archive.getFrameTable()[index]
+
+        ## The pixel map (built from the pixel arrays when it is first needed).
+        self.__pixelmap = None
+
+    def __lt__(self, other):
+        return self.getStartTime() < other.getStartTime()
+
+    def getDscFilename(self):
+        return self.getDataFilename() + ".dsc"
+
+    def getDataFilename(self):
+        return self.__archive.getNames()[self.__index]
+
+    def getFrameWidth(self):
+        return self.__archive.getFrameWidth()
+
+    def getFrameHeight(self):
+        return self.__archive.getFrameHeight()
+
+    def getAcqTime(self):
+        return float(self.__record["acqtime"])
+
+    def getChipId(self):
+        return str(self.__record["chipid"])
+
+    def getDACs(self):
+        if (self.__record["dacs"] < 0).all(): return None
+        return self.__record["dacs"].tolist()
+
+    def getBiasVoltage(self):
+        if np.isnan(self.__record["hv"]): return None
+        return float(self.__record["hv"])
+
+    def getIKrum(self):
+        return self.getDACs()[0]
+
+    def getStartTime(self):
+        return float(self.__record["starttime"])
+
+    def getStartTimeS(self):
+        return getPixelmanTimeString(self.getStartTime())[2]
+
+    def getPixelArrays(self):
+        return self.__archive.getPixelArrays(self.__index)
+
+    def getPixelMap(self):
+        if self.__pixelmap is None:
+            Xs, Cs = self.getPixelArrays()
+            self.__pixelmap = dict(zip(Xs.tolist(), Cs.tolist()))
+        return self.__pixelmap
+
+    def getDataHash(self):
+        """ Get the SHA-1 hash of the frame's pixel data. """
+
+        Xs, Cs = self.getPixelArrays()
+
+        return hashlib.sha1(Xs.tostring() + Cs.tostring()).hexdigest()
+
+    def freePixelMap(self):
+        """ Release the pixel map (the pixel arrays stay in the archive). """
+        self.__pixelmap = None
+
+class FrameArchive:
+    """ Reader for the binary frame archives (see packDataset). """
+
+    def __init__(self, filename):
+
+        ## The archive file name.
+        self.__filename = filename
+
+        with open(filename, "rb") as f:
+
+            if f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+                raise IOError("BAD_ARCHIVE")
+
+            ## The length of the header.
+            hlen = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+
+            ## The archive header.
+            self.__header = json.loads(f.read(hlen))
+
+        if self.__header["version"] != ARCHIVE_VERSION:
+            lg.debug(" '%s' is archive version %d (not %d)." % (filename, self.__header["version"], ARCHIVE_VERSION))
+            raise IOError("BAD_ARCHIVE_VERSION")
+
+        ## The start of the arrays.
+        datastart = getAlignedOffset(len(ARCHIVE_MAGIC) + 8 + hlen)
+
+        ## The (memory-mapped) arrays.
+        self.__arrays = {}
+
+        for name, (dtype, offset, length) in self.__header["arrays"].iteritems():
+
+            dtype = ARCHIVE_FRAME_DTYPE if name == "frames" else np.dtype(str(dtype))
+
+            if length == 0:
+                self.__arrays[name] = np.zeros(0, dtype=dtype)
+            else:
+                self.__arrays[name] = np.memmap(filename, dtype=dtype, mode="r", \
+                    offset=datastart + offset, shape=(length,))
+
+        lg.debug(" * Opened archive '%s' (%d frames)." % (filename, self.getNumberOfFrames()))
+
+    def getFilename(self):
+        return self.__filename
+
+    def getFormat(self):
+        return self.__header["format"]
+
+    def getFrameWidth(self):
+        return self.__header["width"]
+
+    def getFrameHeight(self):
+        return self.__header["height"]
+
+    def getNames(self):
+        return self.__header["names"]
+
+    def getMetadata(self):
+        return self.__header["metadata"]
+
+    def getNumberOfFrames(self):
+        return len(self.__arrays["frames"])
+
+    def getFrameTable(self):
+        return self.__arrays["frames"]
+
+    def getPixelMask(self):
+        """ Get the (rows, cols) pixel mask array (None if there isn't one). """
+
+        if self.__header["maskedpixels"] is None:
+            return None
+
+        ## The pixel mask array.
+        mask = np.zeros((self.getFrameHeight(), self.getFrameWidth()), dtype=bool)
+
+        mask.flat[self.__header["maskedpixels"]] = True
+
+        return mask
+
+    def getPixelArrays(self, i):
+        """
+        Get a frame's pixels.
+
+        @param [in] i The index of the frame in the archive.
+        @returns Xs The pixel index (X = y*width + x) array (a view of the archive).
+        @returns Cs The pixel count array (a view of the archive).
+        """
+
+        o0, o1 = self.__arrays["offsets"][i], self.__arrays["offsets"][i + 1]
+
+        return self.__arrays["Xs"][o0:o1], self.__arrays["Cs"][o0:o1]
+
+    def getEntries(self):
+        """ Get the frames in the archive (see ArchiveEntry). """
+        return [ArchiveEntry(self, i) for i in range(self.getNumberOfFrames())]
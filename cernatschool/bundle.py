@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reader for datasets bundled in tar (optionally compressed) and zip files.
+
+The files are read straight out of the bundle, without being extracted.
+Zip files and uncompressed tar files are read one member at a time, as
+they are needed. Compressed tar files can only be read sequentially, so
+they are read in a single pass when the bundle is opened: the contents of
+the data folder, and of the files beside it (e.g. metadata.json), are
+kept in memory, and each data file is let go once it has been read.
+"""
+
+# The usual suspects.
+import os
+
+#...for the logging.
+import logging as lg
+
+#...for the bundles.
+import tarfile, zipfile
+
+#...for reading zip files from more than one thread.
+import threading
+
+def findDataFolder(names):
+    """
+    Find the folder in a bundle that holds the data files.
+
+    @param [in] names The names of the files in the bundle.
+    @returns The folder with the DSC files in ("" for the top level of the bundle).
+    """
+
+    ## The folders containing DSC files.
+    folders = set(os.path.dirname(fn) for fn in names if fn.endswith(".dsc"))
+
+    if len(folders) == 0:
+        raise IOError("FOLDER_EMPTY")
+    elif len(folders) > 1:
+        lg.debug(" The bundle has DSC files in %d folders." % (len(folders)))
+        raise IOError("MULTIPLE_FOLDERS")
+
+    return folders.pop()
+
+def readTarMembers(filename, iskept):
+    """
+    Read a (compressed) tar file's members in a single pass.
+
+    @param [in] filename The path to the tar file.
+    @param [in] iskept Function to check if a member (by name) is kept.
+    @returns names The names of the files in the tar file.
+    @returns contents The contents of the members kept {name : contents}.
+    """
+
+    ## The names of the files.
+    names = []
+
+    ## The contents of the members kept.
+    contents = {}
+
+    ## The tar file (read as a stream).
+    tf = tarfile.open(filename, "r|*")
+
+    for m in tf:
+        if m.isfile():
+            name = os.path.normpath(m.name)
+            if iskept(name):
+                contents[name] = tf.extractfile(m).read()
+            names.append(name)
+
+    tf.close()
+
+    return names, contents
+
+def isBundle(path):
+    """ Check if a path is a tar (.tar, .tar.gz, etc.) or zip file. """
+
+    if not os.path.isfile(path):
+        return False
+
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+def isTarBundle(path):
+    """ Check if a path is a tar bundle (which is read through from the start when opened). """
+    return isBundle(path) and not zipfile.is_zipfile(path)
+
+class DatasetBundle:
+    """ Wrapper class for the tar and zip dataset bundles. """
+
+    def __init__(self, filename, folder=None):
+        """
+        The constructor.
+
+        @param [in] filename The path to the bundle.
+        @param [in] folder The folder in the bundle holding the data files
+                           ("" for the top level; None to find it - see findDataFolder).
+        """
+
+        ## The bundle file name.
+        self.__filename = filename
+
+        ## The folder in the bundle holding the data files.
+        self.__folder = folder
+
+        ## The zip file (None for tar files).
+        self.__zipfile = None
+
+        ## The uncompressed tar file (None for zip and compressed tar files).
+        self.__tarfile = None
+
+        ## The lock for reading the zip or tar file (which isn't thread-safe).
+        self.__lock = threading.Lock()
+
+        ## The position and size of the uncompressed tar file members {name : (offset, size)}.
+        self.__members = {}
+
+        ## The contents of the compressed tar file members kept {name : contents}.
+        self.__contents = {}
+
+        ## The data files whose contents have been let go (compressed tar files).
+        self.__released = set()
+
+        ## The names of the files in the bundle.
+        self.__names = []
+
+        if zipfile.is_zipfile(filename):
+
+            self.__zipfile = zipfile.ZipFile(filename, "r")
+
+            for info in self.__zipfile.infolist():
+                if not info.filename.endswith("/"):
+                    self.__names.append(info.filename)
+
+            if self.__folder is None:
+                self.__folder = findDataFolder(self.__names)
+
+        elif tarfile.is_tarfile(filename):
+
+            try:
+                ## The tar file (if it isn't compressed - only the headers are read).
+                tf = tarfile.open(filename, "r:")
+            except tarfile.ReadError:
+                tf = None
+
+            if tf is not None:
+
+                for m in tf.getmembers():
+                    if m.isfile():
+                        name = os.path.normpath(m.name)
+                        self.__members[name] = (m.offset_data, m.size)
+                        self.__names.append(name)
+
+                tf.close()
+
+                if self.__folder is None:
+                    self.__folder = findDataFolder(self.__names)
+
+                self.__tarfile = open(filename, "rb")
+
+            elif self.__folder is not None:
+
+                self.__names, self.__contents = readTarMembers(filename, self.isKept)
+
+            else:
+
+                # Keep everything until the data folder is known (rather
+                # than decompressing the file twice).
+                self.__names, self.__contents = readTarMembers(filename, lambda name : True)
+
+                self.__folder = findDataFolder(self.__names)
+
+                for name in self.__names:
+                    if not self.isKept(name):
+                        del self.__contents[name]
+
+        else:
+            raise IOError("NOT_BUNDLE")
+
+        ## The names of the DSC files in the bundle.
+        self.__dscnames = set(name for name in self.__names if name.endswith(".dsc"))
+
+        lg.debug(" * Found %d files in the bundle '%s' (data folder '%s')." % (len(self.__names), filename, self.__folder))
+
+    def getFilename(self):
+        return self.__filename
+
+    def getNames(self):
+        """ Get the names of the files in the bundle. """
+        return self.__names
+
+    def getFolder(self):
+        """ Get the folder in the bundle holding the data files. """
+        return self.__folder
+
+    def isKept(self, name):
+        """ Is a tar file member kept - is it in the data folder, or beside it? """
+        return os.path.dirname(name) in [self.__folder, os.path.dirname(self.__folder)]
+
+    def isDataFile(self, name):
+        """ Is a bundle member one of the data files (with a DSC file)? """
+        return os.path.dirname(name) == self.__folder and (name + ".dsc") in self.__dscnames
+
+    def read(self, name):
+        """ Get the contents of a file in the bundle. """
+
+        if self.__zipfile is not None:
+            with self.__lock:
+                try:
+                    return self.__zipfile.read(name)
+                except KeyError:
+                    raise IOError("NOT_EXIST")
+
+        if self.__tarfile is not None:
+
+            if name not in self.__members:
+                raise IOError("NOT_EXIST")
+
+            offset, size = self.__members[name]
+
+            with self.__lock:
+                self.__tarfile.seek(offset)
+                return self.__tarfile.read(size)
+
+        with self.__lock:
+
+            # A data file read again (e.g. when a dataset is processed twice)
+            # means reading the data files from the tar file again.
+            if name in self.__released:
+                lg.debug(" * Reading the data files from '%s' again." % (self.__filename))
+                names, contents = readTarMembers(self.__filename, lambda n : n in self.__released)
+                self.__contents.update(contents)
+                self.__released.clear()
+
+            if name not in self.__contents:
+                if name in self.__names:
+                    lg.debug(" * '%s' isn't kept from the bundle '%s'." % (name, self.__filename))
+                    raise IOError("NOT_KEPT")
+                raise IOError("NOT_EXIST")
+
+            # Each data file is only needed once (per pass over the dataset).
+            if self.isDataFile(name):
+                self.__released.add(name)
+                return self.__contents.pop(name)
+
+            return self.__contents[name]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Calibration benchmark for the "auto" clustering engine.
+
+Both clustering engines are timed on a set of frames spanning a range
+of occupancies. The occupancy threshold that would have minimised the
+total clustering time (using the neighbour search below it and
+labelling above it) is returned for use as the KlusterFinder's
+"auto" engine threshold.
+"""
+
+#...for the logging.
+import logging as lg
+
+#...for the timing.
+import time
+
+#...for the MATH.
+import numpy as np
+
+#...for the klusters.
+from kluster import KlusterFinder
+
+## The default benchmark frame occupancies (fraction of pixels hit).
+BENCHMARK_OCCUPANCIES = [0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05]
+
+def getBenchmarkFrames(rows=256, cols=256, occupancies=BENCHMARK_OCCUPANCIES, seed=42):
+    """
+    Make synthetic frames (randomly placed hits) for the benchmark.
+
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @param [in] occupancies The frame occupancies to make.
+    @param [in] seed The random number seed.
+    @returns A list of pixel maps {X:C}.
+    """
+
+    ## The random number generator.
+    rng = np.random.RandomState(seed)
+
+    ## The pixel maps to return.
+    pixelmaps = []
+
+    for occ in occupancies:
+
+        ## The number of hits.
+        n = max(1, int(occ * rows * cols))
+
+        Xs = rng.choice(rows * cols, n, replace=False)
+
+        Cs = rng.randint(1, 200, n)
+
+        pixelmaps.append(dict(zip(Xs.tolist(), Cs.tolist())))
+
+    return pixelmaps
+
+def getEngineThreshold(occupancies, t_pixel, t_label):
+    """
+    Find the occupancy threshold that minimises the total clustering time.
+
+    @param [in] occupancies The occupancy of each benchmark frame.
+    @param [in] t_pixel The neighbour search time for each frame.
+    @param [in] t_label The labelling time for each frame.
+    @returns The occupancy above which labelling should be used.
+    """
+
+    ## The frames in occupancy order.
+    order = np.argsort(occupancies, kind="mergesort")
+
+    occ = np.asarray(occupancies, dtype=np.float64)[order]
+
+    t_p = np.asarray(t_pixel, dtype=np.float64)[order]
+
+    t_l = np.asarray(t_label, dtype=np.float64)[order]
+
+    # The total time when the first i frames use the neighbour search
+    # and the rest use labelling, for i = 0 to n.
+    totals = np.concatenate(([0.0], np.cumsum(t_p))) + \
+        np.concatenate((np.cumsum(t_l[::-1])[::-1], [0.0]))
+
+    ## The number of frames to use the neighbour search for.
+    i = int(np.argmin(totals))
+
+    if i == 0:
+        return 0.0
+    elif i == len(occ):
+        return 1.0
+
+    # Put the threshold halfway (geometrically) between the two frames.
+    return float(np.sqrt(occ[i - 1] * occ[i]))
+
+def calibrateEngineThreshold(pixelmaps=None, rows=256, cols=256, repeats=3, features=None):
+    """
+    Time both clustering engines and find the "auto" engine threshold.
+
+    @param [in] pixelmaps The frames to time (None for the synthetic frames).
+    @param [in] rows The number of rows in the frames.
+    @param [in] cols The number of columns in the frames.
+    @param [in] repeats The number of times to cluster each frame.
+    @param [in] features The cluster feature groups to compute.
+    @returns The occupancy above which labelling should be used.
+    """
+
+    if pixelmaps is None:
+        pixelmaps = getBenchmarkFrames(rows, cols)
+
+    ## The occupancy of each frame.
+    occupancies = [float(len(pm)) / float(rows * cols) for pm in pixelmaps]
+
+    ## The (best) clustering times for each engine.
+    times = {"pixel" : [], "label" : []}
+
+    for pm in pixelmaps:
+        for engine, ts in times.iteritems():
+            best = None
+            for r in range(repeats):
+                t0 = time.time()
+                KlusterFinder(pm, rows, cols, False, engine=engine, features=features)
+                t = time.time() - t0
+                if best is None or t < best:
+                    best = t
+            ts.append(best)
+
+    for occ, t_p, t_l in zip(occupancies, times["pixel"], times["label"]):
+        lg.info(" * Occupancy %8.6f: pixel %8.3f ms, label %8.3f ms." % (occ, t_p * 1000.0, t_l * 1000.0))
+
+    threshold = getEngineThreshold(occupancies, times["pixel"], times["label"])
+
+    lg.info(" * Calibrated 'auto' engine threshold: %f" % (threshold))
+
+    return threshold
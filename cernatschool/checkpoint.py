@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Checkpoints for resuming interrupted processing runs.
+
+The checkpoint (CHECKPOINT_NAME, kept in the output folder) is a JSON
+Lines log. The first line records the processing options. Each line
+after that records the frames finished since the line before (by DSC
+file name), and the state of each output (see writers.py) once those
+frames had been written out to disk.
+
+When a run is resumed, each output is cut back to its last checkpointed
+state and the frames already finished are skipped. Frames finished after
+the last checkpoint are processed again.
+"""
+
+# The usual suspects.
+import os
+
+#...for the logging.
+import logging as lg
+
+#...for the JSON.
+import json
+
+#...for reading the checkpoint log.
+from readers import iterEncodedEntries
+
+#...for the data values.
+from datavals import *
+
+def getCheckpointPath(outputpath):
+    """ Get the path of an output folder's checkpoint. """
+    return os.path.join(outputpath, CHECKPOINT_NAME)
+
+def getCheckpointOptions(options):
+    """ Get the processing options as they are stored in a checkpoint. """
+    return json.loads(json.dumps(options))
+
+def loadCheckpoint(outputpath):
+    """
+    Load an output folder's checkpoint.
+
+    @param [in] outputpath The path to the output folder.
+    @returns A dictionary of the "options", the finished "frames" (in the
+             order they were processed) and the "outputs" states (None
+             if nothing was checkpointed), or None if there's no checkpoint.
+    """
+
+    ## The path to the checkpoint.
+    fn = getCheckpointPath(outputpath)
+
+    if not os.path.isfile(fn):
+        return None
+
+    ## The checkpoint lines.
+    lines = []
+    #
+    try:
+        lines = [json.loads(line) for line in iterEncodedEntries(fn)]
+    except ValueError:
+        lg.debug(" * The checkpoint '%s' can't be read." % (fn))
+        raise IOError("BAD_CHECKPOINT")
+
+    if len(lines) == 0 or lines[0].get("version", None) != CHECKPOINT_VERSION:
+        lg.debug(" * The checkpoint '%s' is out of date." % (fn))
+        raise IOError("BAD_CHECKPOINT")
+
+    ## The checkpoint.
+    checkpoint = {"options" : lines[0]["options"], "frames" : [], "outputs" : None}
+
+    for line in lines[1:]:
+        checkpoint["frames"].extend(str(name) for name in line["frames"])
+        checkpoint["outputs"] = line["outputs"]
+
+    lg.debug(" * Loaded the checkpoint '%s' (%d frames finished)." % (fn, len(checkpoint["frames"])))
+
+    return checkpoint
+
+class CheckpointLog:
+    """ Writes the checkpoints of a processing run. """
+
+    def __init__(self, outputpath, options, writers, interval=CHECKPOINT_FRAMES, resume=False):
+        """
+        The constructor.
+
+        @param [in] outputpath The path to the output folder.
+        @param [in] options The processing options.
+        @param [in] writers The output writers {name : writer}.
+        @param [in] interval The number of frames finished between checkpoints.
+        @param [in] resume Carry on the existing checkpoint (rather than replacing it)?
+        """
+
+        ## The output writers.
+        self.__writers = writers
+
+        ## The number of frames finished between checkpoints.
+        self.__interval = interval
+
+        ## The frames finished since the last checkpoint.
+        self.__frames = []
+
+        ## The checkpoint file.
+        self.__f = open(getCheckpointPath(outputpath), "a" if resume else "w")
+        #
+        if not resume:
+            self.__f.write(json.dumps({"version" : CHECKPOINT_VERSION, "options" : options}) + "\n")
+            self.__f.flush()
+
+    def addFrame(self, name):
+        """
+        Record that a frame has been finished (and its outputs written).
+
+        @param [in] name The frame's DSC file name.
+        """
+
+        self.__frames.append(os.path.basename(name))
+
+        if len(self.__frames) >= self.__interval:
+            self.write()
+
+    def write(self):
+        """ Write a checkpoint. """
+
+        ## The states of the outputs, once written to disk.
+        outputs = dict((name, w.checkpoint()) for name, w in self.__writers.iteritems())
+
+        self.__f.write(json.dumps({"frames" : self.__frames, "outputs" : outputs}) + "\n")
+
+        self.__f.flush()
+
+        os.fsync(self.__f.fileno())
+
+        lg.debug(" * Checkpointed %d more frames." % (len(self.__frames)))
+
+        self.__frames = []
+
+    def close(self):
+        """ Write a final checkpoint. """
+
+        self.write()
+
+        self.__f.close()
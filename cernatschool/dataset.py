@@ -11,33 +11,121 @@ import os, glob, inspect
 #...for the logging.
 import logging as lg
 
+#...for the MATH.
+import numpy as np
+
 #...for the data values.
 from datavals import *
 
-#...for processing the file format.
-from helpers import getFormat
+#...for the DAC names.
+from dscvals import DSC_DAC_NAMES
+
+#...for processing the file format and the pixel mask.
+from helpers import getFormatFromBuffer, isFormatConsistent, getPixelMaskArray
 
 #...for the DSC file wrapper class.
 from dsc import DscFile
 
+#...for the binary frame archives.
+from archive import FrameArchive, isArchive
+
+#...for the tar and zip dataset bundles.
+from bundle import DatasetBundle, isBundle
+
+#...for the dataset manifests.
+from manifest import getFileStats, loadManifest, writeManifest
+
 #...for the frames.
 from frame import Frame
 
+#...for reading the upcoming frames in the background.
+from prefetch import FramePrefetcher
+
+#...for removing the masked pixels.
+from labelling import getMaskedPixelMap, getOrderedPixelArrays
+
+#...for labelling frames in bulk.
+from features import getKlusterTableStack
+
+#...for the frame cache.
+from framecache import getFrameCacheKey
+
 class Dataset:
     """ Wrapper class for the CERN@school Timepix datasets. """
 
-    def __init__(self, foldername):
+    def __init__(self, foldername, bundlefolder=None, usemanifest=True, watch=False):
+        """
+        The constructor.
+
+        @param [in] foldername The path to the dataset folder (or to a binary
+                               frame archive, or a tar or zip bundle).
+        @param [in] bundlefolder The folder in the bundle holding the data
+                                 files (None for the folder with the DSC files).
+        @param [in] usemanifest Use (and keep up to date) the dataset folder's
+                                manifest (see manifest.py)?
+        @param [in] watch Watch the folder for frames as they are written? The
+                          frames are then added by pollNewDscFiles.
+        """
 
         # Check if the folder exists. If it doesn't, throw an exception.
         if not os.path.exists(foldername):
             #raise IOError("The folder doesn't exist.")
             raise IOError("NOT_EXIST")
 
-        ## The folder name.
+        ## The folder name (or the binary frame archive or bundle path).
         self.foldername = foldername
 
-        ## The list of names of files in the folder (sorted).
-        self.filenames = sorted(glob.glob(foldername + "/*"))
+        ## The binary frame archive (None for folders of data files).
+        self.__archive = None
+
+        ## The tar or zip bundle (None for folders of data files).
+        self.__bundle = None
+
+        ## The folder in the bundle holding the data files.
+        self.__bundlefolder = None
+
+        ## The file sizes found by the last poll of a watched folder.
+        self.__watchsizes = {}
+
+        ## The DSC files of a watched folder rejected by a poll {name : (DSC size, data size)}.
+        self.__rejected = {}
+
+        if watch:
+            if not os.path.isdir(foldername):
+                raise IOError("NOT_FOLDER")
+
+            # Start with no frames - they are found by pollNewDscFiles.
+            self.filenames = []
+            self.datfilenames = {}
+            self.dscfilenames = {}
+            self.datfileformats = {}
+            self.__format = None
+            self.dscfiles = []
+            return
+
+        if os.path.isfile(foldername) and isArchive(foldername):
+            self.processArchive(foldername)
+            return
+        elif os.path.isfile(foldername):
+            if not isBundle(foldername):
+                raise IOError("NOT_ARCHIVE")
+
+            if bundlefolder is not None:
+                bundlefolder = os.path.normpath(bundlefolder).strip("/")
+                bundlefolder = "" if bundlefolder == "." else bundlefolder
+
+            self.__bundle = DatasetBundle(foldername, bundlefolder)
+
+            self.__bundlefolder = self.__bundle.getFolder()
+
+            ## The list of names of files in the bundle folder (sorted),
+            ## skipping hidden files (as glob does).
+            self.filenames = sorted(fn for fn in self.__bundle.getNames() \
+                if (fn.startswith(self.__bundlefolder + "/") or self.__bundlefolder == "") \
+                and not os.path.basename(fn).startswith("."))
+        else:
+            ## The list of names of files in the folder (sorted).
+            self.filenames = sorted(glob.glob(foldername + "/*"))
 
         # Throw an exception if the supplied folder is empty.
         if len(self.filenames) == 0:
@@ -53,7 +141,29 @@ class Dataset:
         ## The datafile formats.
         self.datfileformats = {}
 
-        # Loop over the files found in the folder.
+        ## The data file format (found from the first non-empty data file).
+        self.__format = None
+
+        ## The contents of the data files read to find the format.
+        buffers = {}
+
+        ## The file sizes and modification times (for the manifest).
+        stats = None
+
+        if self.__bundle is None and usemanifest:
+
+            stats = getFileStats(self.filenames)
+
+            ## The manifest from when the folder was last opened.
+            manifest = loadManifest(foldername, stats)
+
+            # If nothing has changed, skip the checks and the DSC file parsing.
+            if manifest is not None:
+                self.processManifest(manifest)
+                return
+
+        # Loop over the files found in the folder. DSC files are recognised
+        # by name, so that each file is only opened once (when it is parsed).
         lg.debug("")
         lg.debug(" Files found in '%s':" % (foldername))
         lg.debug("")
@@ -65,28 +175,44 @@ class Dataset:
             lg.debug(" * '%s'" % (bn))
 
             # If the "file" is a directory, raise an exception.
-            if os.path.isdir(fn):
+            if self.__bundle is None and os.path.isdir(fn):
+                raise IOError("CONTAINS_DIR")
+            elif self.__bundle is not None and os.path.dirname(fn) != self.__bundlefolder:
                 raise IOError("CONTAINS_DIR")
 
-            formatval = getFormat(fn)
+            if bn.endswith(".dsc"):
+                lg.debug(" *--> Adding '%s' to the DSC files." % (bn))
 
-            ## If the file isn't recognised, raise an exception.
-            if formatval == 0:
-                lg.debug("'%s' is in an unrecognised format." % (bn))
-                raise IOError("BAD_FORMAT")
-            elif formatval > 0:
-                lg.debug(" *--> Adding '%s' ('%s' format) to the data files." \
-                    % (bn, DATA_FILE_TYPES[formatval]))
+                self.dscfilenames[i] = bn
 
-                self.datfilenames[i] = bn
+                continue
 
-                self.datfileformats[i] = formatval
+            # Find the data file format from the first (non-empty) data files.
+            if self.__format is None:
 
-            else:
-                lg.debug(" *--> Adding '%s' ('%s' format) to the DSC files." \
-                    % (bn, DATA_FILE_TYPES[formatval]))
+                buffers[bn] = self.readFile(fn)
 
-                self.dscfilenames[i] = bn
+                formatval = getFormatFromBuffer(buffers[bn])
+
+                ## If the file isn't recognised, raise an exception.
+                if formatval <= 0:
+                    lg.debug("'%s' is in an unrecognised format." % (bn))
+                    raise IOError("BAD_FORMAT")
+
+                if buffers[bn].strip() != "":
+                    self.__format = formatval
+
+            lg.debug(" *--> Adding '%s' to the data files." % (bn))
+
+            self.datfilenames[i] = bn
+
+        # (All of the data files are empty.)
+        if self.__format is None and len(self.datfilenames) > 0:
+            self.__format = 4114
+
+        # The other data files are checked against this format when they are read.
+        for i in self.datfilenames.keys():
+            self.datfileformats[i] = self.__format
 
         lg.debug("")
 
@@ -106,8 +232,204 @@ class Dataset:
         # to build the data set information.
 
         ## The DSC file wrappers.
-        self.dscfiles = sorted([DscFile(foldername + "/" + fn) for fn in self.dscfilenames.values()])
+        self.dscfiles = sorted([DscFile(self.getFilePath(fn), self.__format, buffers.get(fn[:-4], None), \
+            self.__bundle) for fn in self.dscfilenames.values()])
+
+        if stats is not None:
+            writeManifest(foldername, stats, self.__format, self.dscfiles)
+
+
+    def processManifest(self, manifest):
+        """ Get the data and DSC files from a (valid) dataset manifest. """
+
+        self.__format = manifest["format"]
+
+        for i, fn in enumerate(self.filenames):
+
+            ## The basename of the file.
+            bn = os.path.basename(fn)
+
+            if bn.endswith(".dsc"):
+                self.dscfilenames[i] = bn
+            else:
+                self.datfilenames[i] = bn
+                self.datfileformats[i] = self.__format
+
+        ## The static settings of the DSC files, by fingerprint.
+        settings = manifest["settings"]
+
+        # The DSC files are listed in start time order.
+        self.dscfiles = [DscFile(self.getFilePath(str(bn)), self.__format, None, None, \
+            (str(fp), settings[fp], st)) for bn, fp, st in manifest["frames"]]
+
+        lg.debug(" There are %d data files (from the manifest)." % (self.getNumberOfDataFiles())); lg.debug("")
+
+    def processArchive(self, filename):
+        """ Get the frames from a binary frame archive (see archive.py). """
+
+        self.__archive = FrameArchive(filename)
+
+        self.filenames = [filename]
+
+        self.__format = self.__archive.getFormat()
+
+        self.datfilenames = dict(enumerate(self.__archive.getNames()))
+
+        self.dscfilenames = dict((i, bn + ".dsc") for i, bn in self.datfilenames.iteritems())
+
+        self.datfileformats = dict((i, self.__format) for i in self.datfilenames.keys())
+
+        lg.debug(" There are %d frames in '%s'." % (self.getNumberOfDataFiles(), filename)); lg.debug("")
+
+        ## The archived frames (which stand in for the DSC file wrappers).
+        self.dscfiles = sorted(self.__archive.getEntries())
+
+    def pollNewDscFiles(self):
+        """
+        Find the frames that have been written to a watched folder.
+
+        A frame is added once both its data and DSC files exist and
+        neither has changed size since the previous poll (i.e. they have
+        finished being written). The same format and DSC checks as for
+        the rest of the dataset are made; a pair of files that fails them
+        is logged and rejected (and isn't tried again unless one of the
+        files changes size), and the other frames are still added.
+
+        @returns The new DSC files, in start time order.
+        """
+
+        ## The sizes of the files in the folder now.
+        sizes = {}
+
+        for fn in glob.glob(self.foldername + "/*"):
+            try:
+                if os.path.isfile(fn):
+                    sizes[os.path.basename(fn)] = os.path.getsize(fn)
+            except OSError:
+                # (The file has been removed since the folder was listed.)
+                pass
+
+        ## The DSC files already found.
+        known = set(self.dscfilenames.values())
+
+        ## The new DSC files.
+        new = []
+
+        for bn in sorted(sizes.keys()):
+
+            if not bn.endswith(".dsc") or bn in known:
+                continue
+
+            ## The data file name.
+            datn = bn[:-4]
+
+            if datn not in sizes or sizes[bn] == 0:
+                continue
+
+            # Wait until neither file has changed size since the last poll.
+            if self.__watchsizes.get(bn, None) != sizes[bn] or self.__watchsizes.get(datn, None) != sizes[datn]:
+                continue
+
+            if self.__rejected.get(bn, None) == (sizes[bn], sizes[datn]):
+                continue
+
+            ## The data file format (found from the first non-empty data file).
+            formatval = self.__format
+
+            try:
+
+                ## The contents of the data file.
+                buf = self.readFile(self.getFilePath(datn))
+
+                if formatval is None and buf.strip() != "":
+
+                    formatval = getFormatFromBuffer(buf)
+
+                    if formatval <= 0:
+                        lg.debug("'%s' is in an unrecognised format." % (datn))
+                        raise IOError("BAD_FORMAT")
+
+                elif formatval is not None and not isFormatConsistent(buf, formatval):
+                    lg.debug("'%s' is not in the dataset's format." % (datn))
+                    raise IOError("FORMAT_MISMATCH")
+
+                ## The data file format (empty files are read as ASCII [x, y, C]).
+                fmt = formatval if formatval is not None else 4114
+
+                ## The new DSC file.
+                df = DscFile(self.getFilePath(bn), fmt, buf)
+
+            except IOError as e:
+                lg.warning(" * Rejected the frame '%s' in '%s' (%s)." % (bn, self.foldername, e))
+                self.__rejected[bn] = (sizes[bn], sizes[datn])
+                continue
+
+            self.__rejected.pop(bn, None)
+
+            self.__format = formatval
+
+            new.append(df)
+
+            ## The index of the data file.
+            i = len(self.filenames)
+
+            self.filenames += [self.getFilePath(datn), self.getFilePath(bn)]
+
+            self.datfilenames[i] = datn
+
+            self.datfileformats[i] = fmt
+
+            self.dscfilenames[i + 1] = bn
 
+        self.__watchsizes = sizes
+
+        new.sort()
+
+        self.dscfiles += new
+
+        if len(new) > 0:
+            lg.debug(" * Found %d new frames in '%s'." % (len(new), self.foldername))
+
+        return new
+
+    def getRejectedDscFilenames(self):
+        """ Get the names of the DSC files rejected by the polls of a watched folder. """
+        return sorted(self.__rejected.keys())
+
+    def getFilePath(self, bn):
+        """ Get the path to a file in the dataset (from its basename). """
+
+        if self.__bundle is None:
+            return self.foldername + "/" + bn
+        elif self.__bundlefolder == "":
+            return bn
+
+        return self.__bundlefolder + "/" + bn
+
+    def readFile(self, fn):
+        """ Read a file (from the dataset bundle, if there is one). """
+
+        if self.__bundle is not None:
+            return self.__bundle.read(fn)
+
+        with open(fn, "rb") as f:
+            return f.read()
+
+    def getBundle(self):
+        """ Get the tar or zip bundle (None if the dataset is a folder). """
+        return self.__bundle
+
+    def getBundleFolder(self):
+        """ Get the folder in the bundle that holds the data files. """
+        return self.__bundlefolder
+
+    def getArchive(self):
+        """ Get the binary frame archive (None if the dataset is a folder). """
+        return self.__archive
+
+    def getFormat(self):
+        """ Get the data file format value (see DATA_FILE_TYPES). """
+        return self.__format
 
     def areFormatsConsistent(self):
         """ Check if the data files found are all the same format. """
@@ -133,6 +455,9 @@ class Dataset:
     def dscFilesPresent(self):
         """ Check if the corresponding detector settings files exist. """
 
+        ## The DSC file names found.
+        dscnames = set(self.dscfilenames.values())
+
         # Loop through the data files and check if a matching
         # DSC file has been found.
         for i, bn in self.datfilenames.iteritems():
@@ -140,7 +465,7 @@ class Dataset:
             ## The DSC file name for the data file.
             dscn = bn + ".dsc"
 
-            if not dscn in self.dscfilenames.values():
+            if not dscn in dscnames:
                 lg.debug("Data file '%s' is missing a DSC file." % (bn))
                 return False
 
@@ -158,42 +483,296 @@ class Dataset:
         else:
             return "various"
 
-    def getFrames(self, geo, **kwargs):
-        """ Extract the frames from the dataset. """
+    def selectDscFiles(self, mintime=None, maxtime=None, chipid=None, biasvoltage=None, dacs=None, maxframes=-1, \
+        dscfiles=None):
+        """
+        Select frames using their detector settings alone.
+
+        Only the DSC file headers (or the manifest, or the archive's frame
+        table) are used, so the data files of the frames that aren't
+        selected are never read.
+
+        @param [in] mintime The earliest start time [s] (None for no limit).
+        @param [in] maxtime The start time [s] before which the frames must start (None for no limit).
+        @param [in] chipid The chip ID (None for any).
+        @param [in] biasvoltage The bias voltage [V] (None for any).
+        @param [in] dacs A dictionary of the DAC values required, e.g. {"IKrum" : 1}.
+        @param [in] maxframes The maximum number of frames to select (-1 for all).
+        @param [in] dscfiles The DSC files to select from (None for all of the dataset's).
+        @returns The selected DSC files, in start time order.
+        """
+
+        if dscfiles is None:
+            dscfiles = self.dscfiles
+
+        ## The DAC values required, by index.
+        dacvals = []
+
+        for name, val in (dacs or {}).iteritems():
+            if name not in DSC_DAC_NAMES:
+                lg.debug(" Unknown DAC '%s'." % (name))
+                raise IOError("BAD_DAC_NAME")
+            dacvals.append((DSC_DAC_NAMES.index(name), val))
+
+        ## The selected DSC files.
+        selection = []
+
+        for df in dscfiles:
+
+            if maxframes >= 0 and len(selection) >= maxframes:
+                break
+
+            if mintime is not None and df.getStartTime() < mintime:
+                continue
+
+            if maxtime is not None and df.getStartTime() >= maxtime:
+                continue
+
+            if chipid is not None and df.getChipId() != chipid:
+                continue
+
+            if biasvoltage is not None and df.getBiasVoltage() != biasvoltage:
+                continue
+
+            if len(dacvals) > 0:
+                if df.getDACs() is None or any(df.getDACs()[i] != val for i, val in dacvals):
+                    continue
+
+            selection.append(df)
+
+        lg.debug(" * Selected %d of the %d frames." % (len(selection), len(dscfiles)))
+
+        return selection
+
+    def getFrameLabels(self, dscfiles, **kwargs):
+        """
+        Label a chunk of frames (that use the labelling engine) in one pass.
+
+        @param [in] dscfiles The DSC files of the frames (None for frames
+                             that needn't be labelled, e.g. found in the
+                             frame cache).
+        @param [in] kwargs The frame arguments (engine, pixelmask, etc.).
+        @returns A list of the precomputed (ids, n, table) for each frame,
+                 or None for frames that use the pixel-by-pixel engine
+                 (or weren't labelled).
+        """
+
+        ## The clustering engine.
+        engine = kwargs.get("engine", "pixel")
+
+        ## The occupancy above which the "auto" engine uses labelling.
+        threshold = kwargs.get("enginethreshold", AUTO_ENGINE_OCCUPANCY)
+
+        ## The pixel mask array.
+        mask = kwargs.get("pixelmask", None)
+
+        ## The frames' ordered pixel arrays (for the labelled frames).
+        pixels = []
+
+        for df in dscfiles:
+
+            if df is None:
+                pixels.append(None)
+                continue
+
+            ## The unmasked pixels.
+            pm = getMaskedPixelMap(df.getPixelMap(), mask)
+
+            if engine == "label" or \
+                (engine == "auto" and len(pm) > threshold * df.getFrameWidth() * df.getFrameHeight()):
+                pixels.append(getOrderedPixelArrays(pm))
+            else:
+                pixels.append(None)
+
+        ## The labelled frames' pixel arrays.
+        labelled = [p for p in pixels if p is not None]
+
+        if len(labelled) == 0:
+            return pixels
+
+        ## The offsets of each frame's pixels.
+        offsets = np.concatenate(([0], np.cumsum([len(Xs) for Xs, Cs in labelled])))
+
+        ## A frame to get the frame geometry from.
+        df = [df for df in dscfiles if df is not None][0]
+
+        ids, t, koffsets = getKlusterTableStack(np.concatenate([Xs for Xs, Cs in labelled]), \
+            np.concatenate([Cs for Xs, Cs in labelled]), offsets, \
+            df.getFrameHeight(), df.getFrameWidth(), \
+            kwargs.get("ismc", False), kwargs.get("linmode", "compat"), kwargs.get("features", None), \
+            kwargs.get("gammas", True))
+
+        lg.debug(" * Labelled %d clusters in %d frames." % (len(t), len(labelled)))
+
+        ## The precomputed labels to return.
+        labels = []
+
+        ## The index of the labelled frame.
+        i = 0
+
+        for p in pixels:
+            if p is None:
+                labels.append(None)
+                continue
+            labels.append((ids[offsets[i]:offsets[i+1]] - koffsets[i], koffsets[i+1] - koffsets[i], \
+                t[koffsets[i]:koffsets[i+1]]))
+            i += 1
+
+        return labels
+
+    def iterFrames(self, geo, **kwargs):
+        """
+        Generate the frames from the dataset one at a time.
+
+        The frames are read, parsed and clustered as they are needed,
+        in start time order, and each frame's data is released by the
+        dataset once it has been handed on. Frames that use the
+        labelling engine are labelled in chunks (of "chunksize" frames)
+        rather than one at a time. Only the frames in the "selection"
+        (see selectDscFiles) are read, if one is given. The data files of
+        up to "prefetch" frames ahead are read by "iothreads" background
+        threads while the current frame is being clustered. Frames found
+        in the frame "cache" (a FrameCache, if one is given) are neither
+        parsed nor clustered, and the frames that aren't are added to it.
+        """
 
         # Get the geospatial information from the tuple provided.
         lat = geo[0]; lon = geo[1]; alt = geo[2]
 
-        ## The list of frames to return.
-        frames = []
-
-        # Loop over the DSC files to get each frame.
-        for df in self.dscfiles:
-            #print df.getDscFilename(), df.getDataFilename()
-
-            frameargs = {\
-                "lat"         : lat, \
-                "lon"         : lon, \
-                "alt"         : alt, \
-                #
-                "chipid"      : df.getChipId(), \
-                "biasvoltage" : df.getBiasVoltage(), \
-                "ikrum"       : df.getIKrum(), \
-                #
-                "starttime"   : df.getStartTime(), \
-                "acqtime"     : df.getAcqTime(), \
-                "width"       : df.getFrameWidth(), \
-                "height"      : df.getFrameHeight(), \
-                "format"      : self.datfileformats[0], \
-                "pixelmap"    : df.getPixelMap(), \
-                "ismc"        : False\
-                }
-
-            # Optional properties.
-            for key, arg in kwargs.iteritems():
-                frameargs[key] = kwargs[key]
-
-            # Add the frame to the list of frames.
-            frames.append(Frame(**frameargs))
-
-        return frames
+        # Convert the pixel mask to an array once, to be shared by all frames.
+        if "pixelmask" in kwargs.keys() and len(self.dscfiles) > 0:
+            kwargs["pixelmask"] = getPixelMaskArray(kwargs["pixelmask"], \
+                self.dscfiles[0].getFrameHeight(), self.dscfiles[0].getFrameWidth())
+
+        ## The number of frames to label at once.
+        chunksize = kwargs.pop("chunksize", FRAME_CHUNK_SIZE)
+
+        ## The DSC files of the frames to read.
+        dscfiles = kwargs.pop("selection", self.dscfiles)
+
+        ## Label the frames in chunks?
+        bulk = kwargs.get("engine", "pixel") in ["label", "auto"] and \
+            not kwargs.get("skipclustering", False)
+
+        ## The number of frames to read ahead.
+        prefetch = kwargs.pop("prefetch", 0)
+
+        ## The number of threads reading the frames ahead.
+        iothreads = kwargs.pop("iothreads", IO_THREADS)
+
+        ## The frame cache (None if the frames aren't cached).
+        cache = kwargs.pop("cache", None)
+        #
+        if kwargs.get("skipclustering", False):
+            cache = None
+
+        ## The pixel mask array (or None).
+        mask = kwargs.get("pixelmask", None)
+
+        ## The cache keys of the frames not found in the cache {index : key}.
+        keys = {}
+
+        ## The cache entries of the frames found in the cache {index : entry}.
+        cached = {}
+
+        def readFrame(k):
+            """ Read a frame's data file (unless the frame is in the cache). """
+
+            if cache is not None:
+
+                ## The frame's cache key.
+                key = getFrameCacheKey(dscfiles[k].getDataHash(), \
+                    dscfiles[k].getFrameWidth(), dscfiles[k].getFrameHeight(), kwargs)
+
+                ## The frame's cache entry.
+                entry = cache.get(key, mask)
+
+                if entry is not None:
+                    cached[k] = entry
+                    return
+
+                keys[k] = key
+
+            dscfiles[k].getPixelArrays()
+
+        ## The background reader of the upcoming frames' data files.
+        prefetcher = FramePrefetcher(dscfiles, prefetch, iothreads, readFrame)
+
+        ## The precomputed labels of each frame in the current chunk.
+        labels = []
+
+        ## The number of frames handed on.
+        n_done = 0
+
+        try:
+
+            # Loop over the DSC files to get each frame.
+            for j, df in enumerate(dscfiles):
+
+                if bulk and j % chunksize == 0:
+                    for k in range(j, min(j + chunksize, len(dscfiles))):
+                        prefetcher.wait(k)
+                    labels = self.getFrameLabels([None if k in cached else dscfiles[k] \
+                        for k in range(j, min(j + chunksize, len(dscfiles)))], **kwargs)
+
+                prefetcher.wait(j)
+
+                ## The frame's cache entry (None if it isn't in the cache).
+                entry = cached.pop(j, None)
+
+                frameargs = {\
+                    "lat"         : lat, \
+                    "lon"         : lon, \
+                    "alt"         : alt, \
+                    #
+                    "chipid"      : df.getChipId(), \
+                    "biasvoltage" : df.getBiasVoltage(), \
+                    "ikrum"       : df.getIKrum(), \
+                    #
+                    "starttime"   : df.getStartTime(), \
+                    "acqtime"     : df.getAcqTime(), \
+                    "width"       : df.getFrameWidth(), \
+                    "height"      : df.getFrameHeight(), \
+                    "format"      : self.__format, \
+                    "pixelmap"    : df.getPixelMap() if entry is None else \
+                        dict(zip(entry["Xs"].tolist(), entry["Cs"].tolist())), \
+                    "ismc"        : False\
+                    }
+
+                # Optional properties.
+                for key, arg in kwargs.iteritems():
+                    frameargs[key] = kwargs[key]
+
+                if bulk and labels[j % chunksize] is not None:
+                    frameargs["labels"] = labels[j % chunksize]
+                    labels[j % chunksize] = None
+
+                if entry is not None:
+                    frameargs["labels"] = entry["labels"]
+
+                ## The frame.
+                f = Frame(**frameargs)
+
+                if j in keys:
+                    Xs, Cs = df.getPixelArrays()
+                    cache.put(keys.pop(j), f, Xs, Cs, mask, kwargs.get("features", None))
+
+                # The frame has the pixel map now.
+                df.freePixelMap()
+
+                n_done = j + 1
+
+                yield f
+
+        finally:
+
+            prefetcher.close()
+
+            # Release any data read for the frames that weren't handed on.
+            for df in dscfiles[n_done:]:
+                df.freePixelMap()
+
+    def getFrames(self, geo, **kwargs):
+        """ Extract the frames from the dataset (see iterFrames). """
+
+        return list(self.iterFrames(geo, **kwargs))
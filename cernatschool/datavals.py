@@ -17,6 +17,9 @@ DATA_FILE_TYPES = {
     -2   : "Empty"
     }
 
+## The characters allowed in an ASCII data file.
+DATA_FILE_CHARACTERS = "0123456789 \t\r\n"
+
 ACQ_MODES = {
     1 : "Started immediately, Stopped by timer",
     2 : "Started immediately, Stopped by SW trigger",
@@ -195,6 +198,111 @@ TRIPIXEL_RADIUS = 0.75
 
 TETRAPIXEL_RADIUS = 0.71
 
+## The cluster feature groups and the properties in each.
+KLUSTER_FEATURES = {
+    "size"      : ["size"],
+    "extent"    : ["xmin", "xmax", "ymin", "ymax", "width", "height", "isedgekluster"],
+    "radius"    : ["x_uw", "y_uw", "radius_uw", "density_uw"],
+    "counts"    : ["totalcounts", "maxcounts"],
+    "linearity" : ["lin_m", "lin_c", "lin_sumofres", "lin_linearity"],
+    "edges"     : ["n_edgepixels", "edgefrac", "innerfrac"]
+    }
+
+## The available line of best fit modes for the cluster linearity.
+LINEARITY_MODES = {
+    "compat"        : "Minimise the y residuals (original behaviour)",
+    "perpendicular" : "Minimise the perpendicular distances"
+    }
+
+## The available clustering engines.
+KLUSTER_ENGINES = {
+    "pixel" : "Pixel-by-pixel neighbour search",
+    "label" : "Array-based connected-component labelling",
+    "auto"  : "Choose pixel or label from the frame occupancy"
+    }
+
+## The frame occupancy (fraction of pixels hit) above which the "auto"
+## engine uses labelling (see calibration.py to tune this).
+AUTO_ENGINE_OCCUPANCY = 0.001
+
+## The number of frames to label at once with the labelling engine.
+FRAME_CHUNK_SIZE = 100
+
+## The default number of frames to read ahead (in the background) in process-frames.py.
+PREFETCH_DEPTH = 8
+
+## The default number of threads used to read the frames ahead.
+IO_THREADS = 2
+
+## The default time between polls of a watched dataset folder [s].
+WATCH_INTERVAL = 2.0
+
+## The frame and cluster information output formats {format : file extension}.
+OUTPUT_FORMATS = {
+    "jsonl"    : ".jsonl",
+    "jsonl.gz" : ".jsonl.gz",
+    "json"     : ".json"
+    }
+
+## The order in which the output formats are looked for when reading.
+OUTPUT_FORMAT_ORDER = ["jsonl", "jsonl.gz", "json"]
+
+## The number of entries written to a JSON Lines output between flushes.
+OUTPUT_FLUSH_ENTRIES = 1000
+
+## The folder (in the output folder) for the cluster information columns.
+KLUSTER_COLUMNS_FOLDER = "klustercolumns"
+
+## The size of the cluster information column (.npy) file headers [bytes].
+NPY_HEADER_SIZE = 128
+
+## The processing checkpoint file name (kept in the output folder, see checkpoint.py).
+CHECKPOINT_NAME = ".fca-checkpoint.jsonl"
+
+## The processing checkpoint format version.
+CHECKPOINT_VERSION = 1
+
+## The default number of frames processed between checkpoints.
+CHECKPOINT_FRAMES = 100
+
+## The frame cache entry format version. (Changes to the clustering code
+## are found from its source files - see FRAME_CACHE_SOURCES.)
+FRAME_CACHE_VERSION = 3
+
+## The source files of the code that reads and clusters the frames, which
+## the frame cache entries depend on (see framecache.py).
+FRAME_CACHE_SOURCES = [ \
+    "dsc.py", "pixel.py", "kluster.py", "labelling.py", "features.py", \
+    "gammas.py", "helpers.py", "datavals.py", "framecache.py" \
+    ]
+
+## The default frame cache size limit [MB].
+FRAME_CACHE_SIZE = 1024
+
+## The frame cache entry file identifier (see framecache.py).
+FRAME_CACHE_MAGIC = "FCACACH1"
+
+## The frame cache entry file extension.
+FRAME_CACHE_EXTENSION = ".fcacache"
+
+## The binary frame archive file identifier (see archive.py).
+ARCHIVE_MAGIC = "FCAARCH1"
+
+## The binary frame archive format version.
+ARCHIVE_VERSION = 1
+
+## The byte alignment of the arrays in a binary frame archive.
+ARCHIVE_ALIGNMENT = 64
+
+## The number of DAC values stored per frame in a binary frame archive.
+ARCHIVE_N_DACS = 14
+
+## The name of the dataset manifest file (kept in the dataset folder).
+DATASET_MANIFEST_NAME = ".fca-manifest.json"
+
+## The dataset manifest format version.
+DATASET_MANIFEST_VERSION = 1
+
 
 # Detectors
 #-----------
@@ -7,9 +7,15 @@ Wrapper class and helper methods for the Timepix DSC files.
 # The usual suspects.
 import os, glob, inspect
 
+#...for the DSC header fingerprints.
+import hashlib
+
 #...for the logging.
 import logging as lg
 
+#...for the MATH.
+import numpy as np
+
 #...for the data values.
 from datavals import *
 
@@ -20,23 +26,292 @@ from dscvals import *
 from handlers import isChipIdValid, getPixelmanTimeString
 
 #...for the HELPING.
-from helpers import getFormat
+from helpers import getFormatFromBuffer, isFormatConsistent
+
+def getPixelArraysFromFile(fn, fmt, width=256, height=256):
+    """
+    Read the hit pixels from a Timepix data file in a single bulk parse.
+
+    @param [in] fn The path to the data file.
+    @param [in] fmt The data file format value (see DATA_FILE_TYPES).
+    @param [in] width The frame width.
+    @param [in] height The frame height.
+    @returns Xs The pixel index (X = y*width + x) array, in file order.
+    @returns Cs The pixel count array.
+    """
+
+    with open(fn, "rb") as df:
+        return getPixelArraysFromBuffer(df.read(), fmt, width, height)
+
+def getPixelArraysFromBuffer(buf, fmt, width=256, height=256):
+    """
+    Parse the hit pixels from the contents of a Timepix data file.
+
+    @param [in] buf The contents of the data file.
+    @param [in] fmt The data file format value (see DATA_FILE_TYPES).
+    @param [in] width The frame width.
+    @param [in] height The frame height.
+    @returns Xs The pixel index (X = y*width + x) array, in file order.
+    @returns Cs The pixel count array.
+    """
+
+    # np.fromstring stops (without an error) at the first value that isn't
+    # an integer, so check that the file holds nothing else and that all
+    # of it was read.
+    if len(buf.translate(None, DATA_FILE_CHARACTERS)) > 0:
+        raise IOError("BAD_DATA_FILE")
+
+    vals = np.fromstring(buf, dtype=np.int64, sep=" ")
+
+    if len(vals) != len(buf.split()):
+        raise IOError("BAD_DATA_FILE")
+
+    if   fmt == 4114: # ASCII xyC.
+        if len(vals) % 3 != 0:
+            raise IOError("BAD_DATA_FILE")
+        vals = vals.reshape(-1, 3)
+        return (width * vals[:, 1]) + vals[:, 0], vals[:, 2]
+    elif fmt == 18: # ASCII matrix.
+        if len(vals) != width * height:
+            raise IOError("BAD_DATA_FILE")
+        Xs = np.flatnonzero(vals > 0)
+        return Xs, vals[Xs]
+    elif fmt == 8210: # ASCII XC
+        if len(vals) % 2 != 0:
+            raise IOError("BAD_DATA_FILE")
+        vals = vals.reshape(-1, 2)
+        return vals[:, 0], vals[:, 1]
+
+    raise IOError("FRAME_BAD_FORMAT")
+
+## The parsed static DSC header settings, by header fingerprint.
+DSC_SETTINGS_CACHE = {}
+
+def getDscRecords(ls):
+    """
+    Split the lines of a DSC file into records in a single pass.
+
+    Each record is a '"Name" ("Description"):' line, followed by a type
+    line (e.g. 'double[1]') and a value line.
+
+    @param [in] ls The lines of the DSC file.
+    @returns A dictionary of {lower case record name : value string}, with
+             the type of each record under the key "name:type" and the
+             value's line number under "name:line".
+    """
+
+    ## The records to return.
+    records = {}
+
+    for i, l in enumerate(ls[:-2]):
+
+        if l.startswith('"') and l.rstrip().endswith(":"):
+
+            ## The (lower case) record name.
+            key = l.split('"')[1].lower()
+
+            records[key] = ls[i+2].strip()
+
+            records[key + ":type"] = ls[i+1].strip()
+
+            records[key + ":line"] = i + 2
+
+    return records
+
+def getDscFingerprint(ls, records):
+    """
+    Get a fingerprint of the static part of a DSC file.
+
+    The values of the records that change from frame to frame
+    (DSC_DYNAMIC_KEYS) are left out.
+
+    @param [in] ls The lines of the DSC file.
+    @param [in] records The DSC records (see getDscRecords).
+    @returns The fingerprint.
+    """
+
+    ## The line numbers of the dynamic values.
+    dynamic = set(records[key + ":line"] for key in DSC_DYNAMIC_KEYS if key in records)
+
+    return hashlib.sha1("".join(l for i, l in enumerate(ls) if i not in dynamic)).hexdigest()
+
+def getDscSettings(ls, records):
+    """
+    Parse (and check) the static detector settings from a DSC file.
+
+    @param [in] ls The lines of the DSC file.
+    @param [in] records The DSC records (see getDscRecords).
+    @returns A dictionary of the detector settings.
+    """
+
+    ## The settings to return (None if not in the DSC file).
+    settings = dict((key, None) for key in ["acqmode", "acqtime", "chipid", "dacs", "firmware", "hv", \
+        "hwtimermode", "interface", "mpxclock", "mpxtype", "pixelmanv", "polarity", "tpxclock", "namesn"])
+
+    # The frame width and height.
+    whvals = ls[2].strip().split(" ")
+
+    try:
+        settings["width"] = int(whvals[2].split("=")[1])
+    except TypeError:
+        raise IOError("BAD_WIDTH")
+
+    if settings["width"] < 256 or settings["width"] > 1024:
+        raise IOError("BAD_WIDTH")
+
+    try:
+        settings["height"] = int(whvals[3].split("=")[1])
+    except TypeError:
+        raise IOError("BAD_HEIGHT")
+
+    if settings["height"] < 256 or settings["height"] > 1024:
+        raise IOError("BAD_HEIGHT")
+
+    lg.debug(" * Frame dimensions: %d [pix.] x %d [pix.]." % (settings["width"], settings["height"]))
+
+    # Acquisition mode.
+    if DSC_ACQ_MODE_KEY in records:
+        try:
+            settings["acqmode"] = int(records[DSC_ACQ_MODE_KEY])
+        except ValueError:
+            raise IOError("BAD_ACQ_MODE")
+        lg.debug(" * Acquisition mode is '%s'." % (ACQ_MODES[settings["acqmode"]]))
+
+    if DSC_ACQ_TIME_KEY in records:
+        try:
+            settings["acqtime"] = float(records[DSC_ACQ_TIME_KEY])
+        except ValueError:
+            raise IOError("BAD_ACQ_TIME")
+        lg.debug(" * Acquisition time is '%f' [%s]." % (settings["acqtime"], ACQ_TIME_UNITS_SHORT))
+
+    if DSC_CHIPID_KEY in records:
+        chipid = records[DSC_CHIPID_KEY]
+        if not isChipIdValid(chipid):
+            raise IOError("Invalid chip ID in the DSC file.")
+        settings["chipid"] = chipid
+        lg.debug(" * Chip ID is '%s'." % (chipid))
+
+    if DSC_DACS_KEY in records:
+
+        # The DAC values.
+        settings["dacs"] = [int(x) for x in records[DSC_DACS_KEY].split(" ")]
+
+        lg.debug(" * DAC values: %s" % (" ".join("%d" % (x) for x in settings["dacs"])))
+
+    if DSC_FIRMWARE_KEY in records:
+        settings["firmware"] = records[DSC_FIRMWARE_KEY]
+
+    # Note - the keys are lower case because of a 2.1.1/2.2.2 mismatch...
+    if DSC_BIAS_VOLTAGE_KEY in records:
+        try:
+            hv = float(records[DSC_BIAS_VOLTAGE_KEY])
+        except ValueError:
+            raise IOError("BAD_HV_VALUE")
+
+        if hv < 0.0 or hv > 100.0:
+            raise IOError("BAD_HV_VALUE")
+
+        settings["hv"] = hv
+        lg.debug(" * Bias voltage (HV) is %f [V]." % (hv))
+
+    if DSC_HW_TIMER_KEY in records:
+        try:
+            settings["hwtimermode"] = int(records[DSC_HW_TIMER_KEY])
+        except ValueError:
+            raise IOError("BAD_HW_TIMER_MODE")
+        lg.debug(" * Hardware time mode is '%s'." % (HW_TIME_MODES[settings["hwtimermode"]]))
+
+    if DSC_INTERFACE_KEY in records:
+        settings["interface"] = records[DSC_INTERFACE_KEY]
+        lg.debug(" * Interface is '%s'." % (settings["interface"]))
+
+    if DSC_MPX_CLOCK_KEY in records:
+        try:
+            settings["mpxclock"] = float(records[DSC_MPX_CLOCK_KEY])
+        except ValueError:
+            raise IOError("BAD_MPX_CLOCK")
+        lg.debug(" * Medipix clock is %f [MHz]." % (settings["mpxclock"]))
+
+    if DSC_MPX_TYPE_KEY in records:
+        try:
+            mpxType = int(records[DSC_MPX_TYPE_KEY])
+        except ValueError:
+            raise IOError("BAD_MPX_TYPE")
+        if mpxType not in [1,2,3]:
+            raise IOError("BAD_MPX_TYPE")
+        settings["mpxtype"] = mpxType
+        lg.debug(" * Detector type is '%s'." % (MPX_TYPES_LONG[mpxType]))
+
+    if DSC_PIXELMAN_VERSION_KEY in records:
+        settings["pixelmanv"] = records[DSC_PIXELMAN_VERSION_KEY]
+        lg.debug(" * Pixelman version is '%s'." % (settings["pixelmanv"]))
+
+    if DSC_POLARITY_KEY in records:
+        try:
+            pol = int(records[DSC_POLARITY_KEY])
+        except ValueError:
+            raise IOError("BAD_POLARITY")
+        if pol not in [0,1]:
+            raise IOError("BAD_POLARITY")
+        settings["polarity"] = pol
+        lg.debug(" * Polarity is '%s'." % (POLARITIES[pol]))
+
+    if DSC_TPX_CLOCK_KEY in records:
+
+        if "byte[1]" in records[DSC_TPX_CLOCK_KEY + ":type"]:
+
+            val = int(records[DSC_TPX_CLOCK_KEY])
+
+            if val not in [0,1,2,3]:
+                raise IOError("BAD_TPX_CLOCK_MODE")
+
+            settings["tpxclock"] = TPX_CLOCK_VALS[val]
+            lg.debug(" * Timepix clock = %f [MHz]." % (settings["tpxclock"]))
+
+        elif "double[1]" in records[DSC_TPX_CLOCK_KEY + ":type"]:
+            settings["tpxclock"] = float(records[DSC_TPX_CLOCK_KEY])
+        else:
+            raise IOError("BAD_TPX_CLOCK")
+
+    if DSC_NAME_SN_KEY in records:
+        settings["namesn"] = records[DSC_NAME_SN_KEY]
+        lg.debug(" * Name and serial no. = '%s'." % (settings["namesn"]))
+
+    return settings
 
 class DscFile:
     """
     A wrapper class for the Pixelman DSC files.
     """
 
-    def __init__(self, dscfilename):
-        """ The constructor. """
+    def __init__(self, dscfilename, fmt=None, databuffer=None, bundle=None, header=None):
+        """
+        The constructor.
+
+        @param [in] dscfilename The path to the DSC file.
+        @param [in] fmt The data file format, if the Dataset has already found
+                        it (the files are then known to exist).
+        @param [in] databuffer The contents of the data file, if they have
+                               already been read.
+        @param [in] bundle The dataset bundle holding the files (None if the
+                           files are on disk - see bundle.py).
+        @param [in] header The (fingerprint, static settings, start time) of
+                           the DSC file, if they are already known (e.g. from
+                           a dataset manifest), so that it isn't parsed.
+        """
+
+        ## The dataset bundle holding the files.
+        self.__bundle = bundle
 
-        # Check if the file exists. If it doesn't, throw an exception.
-        if not os.path.exists(dscfilename):
-            raise IOError("NOT_EXIST")
+        if fmt is None and bundle is None:
 
-        # Check that the file is, indeed, a file.
-        if not os.path.isfile(dscfilename):
-            raise IOError("NOT_FILE")
+            # Check if the file exists. If it doesn't, throw an exception.
+            if not os.path.exists(dscfilename):
+                raise IOError("NOT_EXIST")
+
+            # Check that the file is, indeed, a file.
+            if not os.path.isfile(dscfilename):
+                raise IOError("NOT_FILE")
 
         ## The frame width.
         self.__fWidth = None
@@ -98,20 +373,37 @@ class DscFile:
         ## The data file name.
         self.__datafilename = dscfilename[:-4]
 
-        if not os.path.exists(self.__datafilename):
+        if fmt is None and bundle is None and not os.path.exists(self.__datafilename):
             raise IOError #("MISSING_DAT")
 
+        ## The fingerprint of the static part of the DSC header.
+        self.__fingerprint = None
+
+        ## The static detector settings (see getDscSettings).
+        self.__settings = None
+
         # Process the DSC file.
-        self.processDscFile()
+        if header is None:
+            self.processDscFile()
+        else:
+            self.setSettings(header[0], header[1])
+            self.setStartTime(header[2])
 
-        ## The pixel map.
-        self.__pixelmap = {}
+        ## The pixel index and count arrays (read from the data file when
+        ## they are first needed).
+        self.__pixel_arrays = None
 
-        ## The data file format.
-        self.__format = getFormat(self.__datafilename)
+        ## The pixel map (built from the pixel arrays when it is first needed).
+        self.__pixelmap = None
 
-        # Process the data file.
-        self.processDataFile()
+        ## The data file format (found from the data file if not supplied).
+        self.__format = fmt
+
+        ## The contents of the data file (if they have already been read).
+        self.__databuffer = databuffer
+
+        ## The SHA-1 hash of the data file contents (found when first needed).
+        self.__datahash = None
 
     def __lt__(self, other):
         return self.getStartTime() < other.getStartTime()
@@ -119,6 +411,12 @@ class DscFile:
     def getDscFilename(self):
         return self.__dscfilename
 
+    def getFingerprint(self):
+        return self.__fingerprint
+
+    def getSettings(self):
+        return self.__settings
+
     def getDataFilename(self):
         return self.__datafilename
 
@@ -221,244 +519,162 @@ class DscFile:
     def getBSPreampEnabled(self):
         return self.__bspenabled
 
+    def getPixelArrays(self):
+        if self.__pixel_arrays is None: self.processDataFile()
+        return self.__pixel_arrays
+
     def getPixelMap(self):
+        if self.__pixelmap is None:
+            Xs, Cs = self.getPixelArrays()
+            self.__pixelmap = dict(zip(Xs.tolist(), Cs.tolist()))
         return self.__pixelmap
 
+    def getDataHash(self):
+        """
+        Get the SHA-1 hash of the data file contents.
+
+        The contents are kept until the data file is processed, so that
+        the file isn't read twice.
+        """
+
+        if self.__datahash is None:
+
+            if self.__databuffer is None:
+                self.__databuffer = self.readFile(self.__datafilename)
+
+            self.__datahash = hashlib.sha1(self.__databuffer).hexdigest()
+
+        return self.__datahash
+
+    def freePixelMap(self):
+        """ Release the pixel data (it is re-read if it is needed again). """
+        self.__pixel_arrays = None
+        self.__pixelmap = None
+        self.__databuffer = None
+
+    def readFile(self, fn):
+        """ Read a file (from the dataset bundle, if there is one). """
+
+        if self.__bundle is not None:
+            return self.__bundle.read(fn)
+
+        with open(fn, "rb") as f:
+            return f.read()
+
     def processDscFile(self):
         """ Process the detector settings file (.dsc). """
 
-        # The DSC file.
-        f = open(self.__dscfilename, "r")
-
         ## The lines of the DSC file.
-        ls = f.readlines()
+        ls = self.readFile(self.__dscfilename).splitlines(True)
 
-        # Close the DSC file.
-        f.close()
+        if len(ls) == 0 or getFormatFromBuffer(ls[0]) != -1:
+            raise IOError("BAD_FORMAT")
 
         lg.debug("")
 
-        # The frame width and height.
-        whvals = ls[2].strip().split(" ")
+        ## The DSC records.
+        records = getDscRecords(ls)
 
-        try:
-            self.__fWidth = int(whvals[2].split("=")[1])
-        except TypeError:
-            raise IOError("BAD_WIDTH")
+        ## The fingerprint of the static part of the header.
+        fingerprint = getDscFingerprint(ls, records)
 
-        if self.__fWidth < 256 or self.__fWidth > 1024:
-            raise IOError("BAD_WIDTH")
+        if fingerprint in DSC_SETTINGS_CACHE:
+            lg.debug(" * Reusing the settings of an identical DSC header.")
+        else:
+            if len(DSC_SETTINGS_CACHE) >= DSC_CACHE_SIZE:
+                DSC_SETTINGS_CACHE.clear()
+            DSC_SETTINGS_CACHE[fingerprint] = getDscSettings(ls, records)
 
-        try:
-            self.__fHeight = int(whvals[3].split("=")[1])
-        except TypeError:
-            raise IOError("BAD_HEIGHT")
-
-        if self.__fHeight < 256 or self.__fHeight > 1024:
-            raise IOError("BAD_HEIGHT")
-
-        lg.debug(" * Frame dimensions: %d [pix.] x %d [pix.]." % (self.__fWidth, self.__fHeight))
-
-        # Loop over the lines of the DSC file.
-        for i, l in enumerate(ls):
-            #print("%5d: %s" % (i, l.strip()))
-
-            # Acquisition mode.
-            if DSC_ACQ_MODE_STRING in l:
-                try:
-                    self.__acqMode = int(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_ACQ_MODE")
-                lg.debug(" * Acquisition mode is '%s'." % (ACQ_MODES[self.__acqMode]))
-
-            elif DSC_ACQ_TIME_STRING in l:
-                try:
-                    self.__acqTime = float(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_ACQ_TIME")
-                lg.debug(" * Acquisition time is '%f' [%s]." % (self.__acqTime, ACQ_TIME_UNITS_SHORT))
-
-            elif DSC_CHIPID_STRING in l:
-
-                chipid = ls[i+2].strip()
-                if not isChipIdValid(chipid):
-                    raise IOError("Invalid chip ID in the DSC file.")
-                self.__chipid = chipid
-                lg.debug(" * Chip ID is '%s'." % (self.__chipid))
-
-            elif DSC_DACS_STRING in l:
-
-                # Break down the DAC string.
-                self.__dacs = [int(x) for x in ls[i+2].strip().split(" ")]
-
-                self.__IKrum       = self.__dacs[0]
-                self.__Disc        = self.__dacs[1]
-                self.__Preamp      = self.__dacs[2]
-                self.__BuffAnalogA = self.__dacs[3]
-                self.__BuffAnalogB = self.__dacs[4]
-                self.__Hist        = self.__dacs[5]
-                self.__THL         = self.__dacs[6]
-                self.__THLCoarse   = self.__dacs[7]
-                self.__Vcas        = self.__dacs[8]
-                self.__FBK         = self.__dacs[9]
-                self.__GND         = self.__dacs[10]
-                self.__THS         = self.__dacs[11]
-                self.__BiasLVDS    = self.__dacs[12]
-                self.__RefLVDS     = self.__dacs[13]
-
-                lg.debug(" * DAC values:")
-                lg.debug(" * --> IKrum           = %4d" % (self.__IKrum))
-                lg.debug(" * --> Disc            = %4d" % (self.__Disc))
-                lg.debug(" * --> Preamp          = %4d" % (self.__Preamp))
-                lg.debug(" * --> BuffAnalogA     = %4d" % (self.__BuffAnalogA))
-                lg.debug(" * --> BuffAnalogB     = %4d" % (self.__BuffAnalogB))
-                lg.debug(" * --> Hist            = %4d" % (self.__Hist))
-                lg.debug(" * --> THL             = %4d" % (self.__THL))
-                lg.debug(" * --> THLCoarse       = %4d" % (self.__THLCoarse))
-                lg.debug(" * --> Vcas            = %4d" % (self.__Vcas))
-                lg.debug(" * --> FBK             = %4d" % (self.__FBK))
-                lg.debug(" * --> GND             = %4d" % (self.__GND))
-                lg.debug(" * --> THS             = %4d" % (self.__THS))
-                lg.debug(" * --> BiasLVDS        = %4d" % (self.__BiasLVDS))
-                lg.debug(" * --> RefLVDS         = %4d" % (self.__RefLVDS))
-
-            elif DSC_FIRMWARE_STRING in l:
-                self.__firmwarev = ls[i+2].strip()
-
-            # Note - needs 'lower()' because of a 2.1.1/2.2.2 mismatch...
-            elif DSC_BIAS_VOLTAGE_STRING.lower() in l.lower():
-                try:
-                    hv = float(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_HV_VALUE")
-
-                if hv < 0.0 or hv > 100.0:
-                    raise IOError("BAD_HV_VALUE")
-
-                self.__hv = hv
-                lg.debug(" * Bias voltage (HV) is %f [V]." % (self.__hv))
-
-            elif DSC_HW_TIMER_STRING in l:
-                try:
-                    self.__hwTimerMode = int(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_HW_TIMER_MODE")
-                lg.debug(" * Hardware time mode is '%s'." % (HW_TIME_MODES[self.__hwTimerMode]))
-
-            elif DSC_INTERFACE_STRING in l:
-                self.__interface = ls[i+2].strip()
-                lg.debug(" * Interface is '%s'." % (self.__interface))
-
-            elif DSC_MPX_CLOCK_STRING in l:
-                try:
-                    mpxClock = float(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_MPX_CLOCK")
-                self.__mpxClock = mpxClock
-                lg.debug(" * Medipix clock is %f [MHz]." % (self.__mpxClock))
-
-            elif DSC_MPX_TYPE_STRING in l:
-                try:
-                    mpxType = int(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_MPX_TYPE")
-                if mpxType not in [1,2,3]:
-                    raise IOError("BAD_MPX_TYPE")
-                self.__mpxType = mpxType
-                lg.debug(" * Detector type is '%s'." % (MPX_TYPES_LONG[self.__mpxType]))
-
-            elif DSC_PIXELMAN_VERSION_STRING in l:
-                self.__pixelmanv = ls[i+2].strip()
-                lg.debug(" * Pixelman version is '%s'." % (self.__pixelmanv))
-
-            elif DSC_POLARITY_STRING in l:
-                try:
-                    pol = int(ls[i+2].strip())
-                except ValueError:
-                    raise IOError("BAD_POLARITY")
-                if pol not in [0,1]:
-                    raise IOError("BAD_POLARITY")
-                self.__polarity = pol
-                lg.debug(" * Polarity is '%s'." % (POLARITIES[self.__polarity]))
-
-            elif DSC_START_TIME_STRING in l:
-
-                try:
-                    ## The full start time.
-                    st = float(ls[i+2].strip())
-
-                    self.__startTime = st
-
-                except:
-                    raise IOError("BAD_START_TIME")
-
-                sec, sub, sts = getPixelmanTimeString(st)
-
-                self.__startTimeS = sts
-
-                lg.debug(" * Start time is %20.6f [s]." % (self.__startTime))
-                lg.debug(" *--> Converted to string: '%s'." % (sts))
-
-                # Check if the start time matches the supplied string.
-                #if self.__startTimeS is not None and sts != self.__startTimeS:
-                #    lg.debug(" * A mismatch between the start times.")
-                #    raise IOError("START_TIME_MISMATCH")
-
-            #elif DSC_START_TIME_S_STRING in l:
-            #
-            #    # Set the start time string from the DSC file.
-            #    self.__startTimeS = ls[i+2].strip()
-            #
-            #    lg.debug(" * Start time (string) is '%s'." % (self.__startTimeS))
-            #
-            #    #if self.__startTime is not None:
-            #    #    sec, sub, sts = getPixelmanTimeString(self.__startTime)
-            #    #    #if self.__startTimeS != sts:
-            #    #    #    raise IOError("START_TIME_MISMATCH")
-
-            elif DSC_TPX_CLOCK_STRING.lower() in l.lower():
-
-                if "byte[1]" in ls[i+1].strip():
-
-                    val = int(ls[i+2].strip())
-
-                    if val not in [0,1,2,3]:
-                        raise("BAD_TPX_CLOCK_MODE")
-
-                    self.__tpxClock = TPX_CLOCK_VALS[val]
-                    lg.debug(" * Timepix clock = %f [MHz]." % (self.__tpxClock))
-
-                elif "double[1]" in ls[i+1].strip():
-                    self.__tpxClock = float(ls[i+2].strip())
-                else:
-                    raise IOError("BAD_TPX_CLOCK")
-
-            elif DSC_NAME_SN_STRING in l:
-                self.__nameAndSN = ls[i+2].strip()
-                lg.debug(" * Name and serial no. = '%s'." % (self.__nameAndSN))
+        self.setSettings(fingerprint, DSC_SETTINGS_CACHE[fingerprint])
+
+        # The start time (which changes from frame to frame).
+        if DSC_START_TIME_KEY in records:
+
+            try:
+                ## The full start time.
+                st = float(records[DSC_START_TIME_KEY])
+
+            except:
+                raise IOError("BAD_START_TIME")
+
+            self.setStartTime(st)
+
+            lg.debug(" * Start time is %20.6f [s]." % (self.__startTime))
+            lg.debug(" *--> Converted to string: '%s'." % (self.__startTimeS))
 
         lg.debug("")
 
+    def setSettings(self, fingerprint, settings):
+        """
+        Set the static detector settings.
+
+        @param [in] fingerprint The fingerprint of the static DSC header.
+        @param [in] settings The detector settings (see getDscSettings).
+        """
+
+        self.__fingerprint = fingerprint
+
+        self.__settings = settings
+
+        self.__fWidth      = settings["width"]
+        self.__fHeight     = settings["height"]
+        self.__acqMode     = settings["acqmode"]
+        self.__acqTime     = settings["acqtime"]
+        self.__chipid      = settings["chipid"]
+        self.__firmwarev   = settings["firmware"]
+        self.__hv          = settings["hv"]
+        self.__hwTimerMode = settings["hwtimermode"]
+        self.__interface   = settings["interface"]
+        self.__mpxClock    = settings["mpxclock"]
+        self.__mpxType     = settings["mpxtype"]
+        self.__pixelmanv   = settings["pixelmanv"]
+        self.__polarity    = settings["polarity"]
+        self.__tpxClock    = settings["tpxclock"]
+        self.__nameAndSN   = settings["namesn"]
+
+        if settings["dacs"] is not None:
+
+            # Break down the DAC values.
+            self.__dacs = list(settings["dacs"])
+
+            self.__IKrum       = self.__dacs[0]
+            self.__Disc        = self.__dacs[1]
+            self.__Preamp      = self.__dacs[2]
+            self.__BuffAnalogA = self.__dacs[3]
+            self.__BuffAnalogB = self.__dacs[4]
+            self.__Hist        = self.__dacs[5]
+            self.__THL         = self.__dacs[6]
+            self.__THLCoarse   = self.__dacs[7]
+            self.__Vcas        = self.__dacs[8]
+            self.__FBK         = self.__dacs[9]
+            self.__GND         = self.__dacs[10]
+            self.__THS         = self.__dacs[11]
+            self.__BiasLVDS    = self.__dacs[12]
+            self.__RefLVDS     = self.__dacs[13]
+
+    def setStartTime(self, st):
+        """ Set the start time (and the start time string). """
+
+        self.__startTime = st
+
+        self.__startTimeS = getPixelmanTimeString(st)[2]
+
     def processDataFile(self):
         """ Process the accompanying Timepix datafile. """
 
-        df = open(self.__datafilename, "r")
-        ls = df.readlines()
-        df.close()
-
-        # Loop over the lines in the file.
-        for j, l in enumerate(ls):
-
-            if   self.__format == 4114: # ASCII xyC.
-                vals = l.strip().split("\t")
-                self.__pixelmap[self.__fHeight * int(vals[1]) + int(vals[0])] = int(vals[2])
-            elif self.__format == 18: # ASCII matrix.
-                vals = [int(val) for val in l.strip().split(" ")]
-                for i, C in enumerate(vals):
-                    if C > 0:
-                        self.__pixelmap[(self.__fHeight * j) + i] = C
-            elif self.__format == 8210: # ASCII XC
-                vals = [int(val) for val in l.strip().split("\t")]
-                self.__pixelmap[vals[0]] = vals[1]
-            else:
-                raise IOError("FRAME_BAD_FORMAT")
+        ## The contents of the data file.
+        buf = self.__databuffer
+
+        if buf is None:
+            buf = self.readFile(self.__datafilename)
+
+        # The data file is only read once.
+        self.__databuffer = None
+
+        if self.__format is None:
+            self.__format = getFormatFromBuffer(buf)
+        elif not isFormatConsistent(buf, self.__format):
+            lg.debug(" '%s' is not in the dataset's format." % (self.__datafilename))
+            raise IOError("FORMAT_MISMATCH")
+
+        self.__pixel_arrays = getPixelArraysFromBuffer(buf, self.__format, self.__fWidth, self.__fHeight)
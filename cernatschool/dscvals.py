@@ -36,3 +36,48 @@ DSC_START_TIME_S_STRING = "\"Start time (string)\" (\"Acquisition start time (st
 DSC_TPX_CLOCK_STRING = "Timepix clock"
 
 DSC_NAME_SN_STRING = "\"Name+SN\" (\"Name and serial number\"):"
+
+# The DSC record keys (the lower case record names).
+
+DSC_ACQ_MODE_KEY = "acq mode"
+
+DSC_ACQ_TIME_KEY = "acq time"
+
+DSC_CHIPID_KEY = "chipboardid"
+
+DSC_DACS_KEY = "dacs"
+
+DSC_FIRMWARE_KEY = "firmware"
+
+DSC_BIAS_VOLTAGE_KEY = "hv"
+
+DSC_HW_TIMER_KEY = "hw timer"
+
+DSC_INTERFACE_KEY = "interface"
+
+DSC_MPX_CLOCK_KEY = "mpx clock"
+
+DSC_MPX_TYPE_KEY = "mpx type"
+
+DSC_PIXELMAN_VERSION_KEY = "pixelman version"
+
+DSC_POLARITY_KEY = "polarity"
+
+DSC_START_TIME_KEY = "start time"
+
+DSC_START_TIME_S_KEY = "start time (string)"
+
+DSC_TPX_CLOCK_KEY = "timepix clock"
+
+DSC_NAME_SN_KEY = "name+sn"
+
+## The names of the (Timepix) DAC values, in the order they appear in the DSC file.
+DSC_DAC_NAMES = ["IKrum", "Disc", "Preamp", "BuffAnalogA", "BuffAnalogB", "Hist", "THL", "THLCoarse", \
+    "Vcas", "FBK", "GND", "THS", "BiasLVDS", "RefLVDS"]
+
+## The records that change from frame to frame (the rest of the header
+## is usually identical for every frame in a run).
+DSC_DYNAMIC_KEYS = [DSC_START_TIME_KEY, DSC_START_TIME_S_KEY]
+
+## The maximum number of parsed DSC headers to keep.
+DSC_CACHE_SIZE = 64
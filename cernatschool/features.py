@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Frame-level (batched) cluster feature extraction.
+
+All of a frame's cluster properties are computed at once from the
+label and count arrays using grouped reductions, rather than one
+cluster at a time. The results are returned as a NumPy structured
+array (the "cluster table") with one row per cluster. The column names
+match the keys of the cluster properties JSON, plus the cluster's gamma
+candidate category (see gammas.py) where the KlusterFinder sets it.
+"""
+
+#...for the logging.
+import logging as lg
+
+#...for the MATH.
+import numpy as np
+
+#...for the morphology.
+from scipy import ndimage
+
+#...for the linearity calculations and feature sets.
+from helpers import getLinearities, getFeatureSet
+
+#...for the gamma candidate classification.
+from gammas import getGammaCategories, NOT_GAMMA
+
+#...for the structuring elements and the stacked labelling.
+from labelling import EIGHT_CONNECTED, STACKED_EIGHT_CONNECTED, labelPixelStack
+
+## The cluster table columns and types.
+KLUSTER_TABLE_DTYPE = np.dtype([
+    ("size",          np.int32),
+    ("xmin",          np.int32),
+    ("xmax",          np.int32),
+    ("ymin",          np.int32),
+    ("ymax",          np.int32),
+    ("width",         np.int32),
+    ("height",        np.int32),
+    ("x_uw",          np.float64),
+    ("y_uw",          np.float64),
+    ("radius_uw",     np.float64),
+    ("density_uw",    np.float64),
+    ("totalcounts",   np.int64),
+    ("maxcounts",     np.int64),
+    ("lin_m",         np.float64),
+    ("lin_c",         np.float64),
+    ("lin_sumofres",  np.float64),
+    ("lin_linearity", np.float64),
+    ("n_edgepixels",  np.int32),
+    ("edgefrac",      np.float64),
+    ("innerfrac",     np.float64),
+    ("ismc",          np.bool_),
+    ("isedgekluster", np.bool_),
+    ("gamma",         np.int8)
+    ])
+
+def getEdgePixelCounts(ids, Xs, n, rows, cols, frames=None):
+    """
+    Count the edge pixels of every cluster in a frame at once.
+
+    A pixel is an edge pixel if any of its eight neighbours is not hit
+    (or is off the frame). Eroding the frame's occupancy image with a
+    3x3 structuring element leaves only the inner pixels, which are
+    then counted per cluster.
+
+    @param [in] ids The cluster ID (0 to n-1) of each pixel.
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] n The number of clusters.
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @param [in] frames The frame index of each pixel (None for a single frame).
+    @returns The number of edge pixels in each cluster.
+    """
+
+    if frames is None:
+
+        ## The frame occupancy image.
+        occupancy = np.zeros((rows, cols), dtype=bool)
+
+        occupancy.flat[Xs] = True
+
+        ## The inner pixels - those surrounded by hit pixels.
+        inner = ndimage.binary_erosion(occupancy, structure=EIGHT_CONNECTED, border_value=0)
+
+    else:
+
+        # Erode the stack of frames, with no neighbours between frames.
+        Xs = (frames * (rows * cols)) + Xs
+
+        occupancy = np.zeros((frames.max() + 1 if len(frames) > 0 else 0, rows, cols), dtype=bool)
+
+        occupancy.flat[Xs] = True
+
+        inner = ndimage.binary_erosion(occupancy, structure=STACKED_EIGHT_CONNECTED, border_value=0)
+
+    ## The number of inner pixels in each cluster.
+    n_inner = np.bincount(ids, weights=inner.flat[Xs], minlength=n)
+
+    return np.bincount(ids, minlength=n) - n_inner.astype(np.int64)
+
+def getKlusterTableFromPixels(ids, Xs, Cs, n, rows, cols, ismc=False, linmode="compat", features=None, frames=None):
+    """
+    Compute every cluster's properties from the frame's labelled pixels.
+
+    Only the columns of the requested feature groups are filled; the
+    others are left as zero.
+
+    @param [in] ids The cluster ID (0 to n-1) of each pixel.
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] Cs The pixel count array.
+    @param [in] n The number of clusters.
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @param [in] ismc Is the data from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode (see getLinearities).
+    @param [in] features The feature groups to compute (see getFeatureSet).
+    @param [in] frames The frame index of each pixel (None for a single frame).
+    @returns The cluster table - one row per cluster ID.
+    """
+
+    lg.debug(" * Computing the cluster table for %d clusters." % (n))
+
+    ## The feature groups to compute.
+    fs = getFeatureSet(features)
+
+    ## The cluster table to return.
+    t = np.zeros(n, dtype=KLUSTER_TABLE_DTYPE)
+
+    t["ismc"] = ismc
+
+    if n == 0:
+        return t
+
+    xs = Xs % cols
+
+    ys = Xs // cols
+
+    # Size.
+    t["size"] = np.bincount(ids, minlength=n)
+
+    # Extent.
+    if "extent" in fs:
+
+        t["xmin"] = cols; np.minimum.at(t["xmin"], ids, xs)
+        t["ymin"] = rows; np.minimum.at(t["ymin"], ids, ys)
+        t["xmax"] = -1;   np.maximum.at(t["xmax"], ids, xs)
+        t["ymax"] = -1;   np.maximum.at(t["ymax"], ids, ys)
+
+        t["width"]  = t["xmax"] - t["xmin"] + 1
+        t["height"] = t["ymax"] - t["ymin"] + 1
+
+        t["isedgekluster"] = (t["xmin"] == 0) | (t["ymin"] == 0) | \
+            (t["xmax"] == cols - 1) | (t["ymax"] == rows - 1)
+
+    # The unweighted centroid, radius and density.
+    if "radius" in fs:
+
+        t["x_uw"] = np.bincount(ids, weights=xs, minlength=n) / t["size"]
+        t["y_uw"] = np.bincount(ids, weights=ys, minlength=n) / t["size"]
+
+        # The cluster radius is the largest pixel distance from the centroid.
+        dx = xs - t["x_uw"][ids]
+        dy = ys - t["y_uw"][ids]
+
+        ## The largest squared distance in each cluster.
+        r2 = np.zeros(n)
+        np.maximum.at(r2, ids, (dx * dx) + (dy * dy))
+
+        t["radius_uw"] = np.sqrt(r2)
+
+        ## Clusters with a non-zero radius.
+        nz = r2 > 0.0
+        t["density_uw"][nz] = t["size"][nz] / (r2[nz] * np.pi)
+
+    # Counts.
+    if "counts" in fs:
+
+        t["totalcounts"] = np.bincount(ids, weights=Cs, minlength=n)
+        np.maximum.at(t["maxcounts"], ids, Cs)
+
+    # Linearity.
+    if "linearity" in fs:
+
+        t["lin_m"], t["lin_c"], t["lin_sumofres"], t["lin_linearity"] = \
+            getLinearities(ids, xs, ys, n, linmode)
+
+    # Edge pixels.
+    if "edges" in fs:
+
+        t["n_edgepixels"] = getEdgePixelCounts(ids, Xs, n, rows, cols, frames)
+
+        t["edgefrac"]  = t["n_edgepixels"].astype(np.float64) / t["size"]
+        t["innerfrac"] = 1.0 - t["edgefrac"]
+
+    return t
+
+def getKlusterTableWithGammas(ids, Xs, Cs, n, rows, cols, ismc=False, linmode="compat", features=None, \
+    gammas=True, frames=None):
+    """
+    Compute the cluster table, classifying the gamma candidates first.
+
+    The "gamma" column holds each cluster's gamma candidate category.
+    If the gamma candidates aren't wanted, only their size is computed.
+
+    @param [in] ids The cluster ID (0 to n-1) of each pixel.
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] Cs The pixel count array.
+    @param [in] n The number of clusters.
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @param [in] ismc Is the data from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode (see getLinearities).
+    @param [in] features The feature groups to compute (see getFeatureSet).
+    @param [in] gammas Compute the properties of the gamma candidates too?
+    @param [in] frames The frame index of each pixel (None for a single frame).
+    @returns The cluster table - one row per cluster ID.
+    """
+
+    ## The gamma candidate category of each cluster.
+    cats = getGammaCategories(ids, Xs, n, cols)
+
+    if gammas:
+        t = getKlusterTableFromPixels(ids, Xs, Cs, n, rows, cols, ismc, linmode, features, frames)
+    else:
+        # Only compute the table rows of the non-gamma clusters.
+        nongamma = np.flatnonzero(cats == NOT_GAMMA)
+
+        ## The non-gamma cluster ID of each cluster (-1 for gammas).
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[nongamma] = np.arange(len(nongamma))
+
+        ## The pixels in non-gamma clusters.
+        keep = remap[ids] >= 0
+
+        t = np.zeros(n, dtype=KLUSTER_TABLE_DTYPE)
+        t["size"] = np.bincount(ids, minlength=n)
+        t["ismc"] = ismc
+        t[nongamma] = getKlusterTableFromPixels(remap[ids[keep]], Xs[keep], Cs[keep], len(nongamma), \
+            rows, cols, ismc, linmode, features, None if frames is None else frames[keep])
+
+    t["gamma"] = cats
+
+    return t
+
+def getKlusterTable(labels, counts, ismc=False, linmode="compat", features=None):
+    """
+    Compute every cluster's properties from a frame's label image.
+
+    @param [in] labels The (rows, cols) label array (0 = no cluster).
+    @param [in] counts The (rows, cols) pixel count array.
+    @param [in] ismc Is the data from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode (see getLinearities).
+    @param [in] features The feature groups to compute (see getFeatureSet).
+    @returns The cluster table - row i is the cluster with label i+1.
+    """
+
+    rows, cols = labels.shape
+
+    ## The hit (labelled) pixels.
+    Xs = np.flatnonzero(labels)
+
+    return getKlusterTableFromPixels(labels.flat[Xs] - 1, Xs, counts.flat[Xs], \
+        labels.max() if len(Xs) > 0 else 0, rows, cols, ismc, linmode, features)
+
+def getKlusterTableStack(Xs, Cs, offsets, rows, cols, ismc=False, linmode="compat", features=None, gammas=True):
+    """
+    Label a batch of frames and compute their cluster tables in one pass.
+
+    @param [in] Xs The concatenated pixel index (X = y*cols + x) array.
+    @param [in] Cs The concatenated pixel count array.
+    @param [in] offsets The (N+1) offsets of each frame's pixels in Xs.
+    @param [in] rows The number of rows in each frame.
+    @param [in] cols The number of columns in each frame.
+    @param [in] ismc Is the data from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode (see getLinearities).
+    @param [in] features The feature groups to compute (see getFeatureSet).
+    @param [in] gammas Compute the properties of the gamma candidates too?
+    @returns ids The cluster ID of each pixel in Xs.
+    @returns t The cluster table of every cluster in the batch.
+    @returns koffsets The (N+1) offsets of each frame's clusters in the table -
+                      frame i's clusters are t[koffsets[i]:koffsets[i+1]].
+    """
+
+    ids, koffsets = labelPixelStack(Xs, offsets, rows, cols)
+
+    ## The frame of each pixel.
+    frames = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    t = getKlusterTableWithGammas(ids, Xs, Cs, koffsets[-1], rows, cols, ismc, linmode, features, gammas, frames)
+
+    return ids, t, koffsets
@@ -4,8 +4,11 @@
 #...for the logging.
 import logging as lg
 
-##...for the data values.
-#from datavals import *
+#...for the MATH.
+import numpy as np
+
+#...for the data values.
+from datavals import AUTO_ENGINE_OCCUPANCY
 
 #...for the HANDLING.
 from handlers import getPixelmanTimeString, getPixelsStringFromPixelMap
@@ -13,6 +16,9 @@ from handlers import getPixelmanTimeString, getPixelsStringFromPixelMap
 #...for the Klusters (Clusters).
 from kluster import KlusterFinder
 
+#...for the pixel mask array.
+from helpers import getPixelMaskArray
+
 class Frame:
     """
     A wrapper class for Timepix frames.
@@ -185,11 +191,44 @@ class Frame:
         if "pixelmask" in kwargs.keys():
             self.__pixel_mask_map = kwargs["pixelmask"]
 
+        ## The pixel mask as a boolean (height, width) array (True = masked).
+        self.__pixel_mask = getPixelMaskArray(self.__pixel_mask_map, self.__height, self.__width)
+
         ## Is the data from a Monte Carlo simulation?
         self.__isMC = False
         if "ismc" in kwargs.keys():
             self.__ismc = kwargs["ismc"]
 
+        ## The clustering engine to use.
+        self.__engine = "pixel"
+        if "engine" in kwargs.keys():
+            self.__engine = kwargs["engine"]
+
+        ## The occupancy above which the "auto" engine uses labelling.
+        self.__engine_threshold = AUTO_ENGINE_OCCUPANCY
+        if "enginethreshold" in kwargs.keys():
+            self.__engine_threshold = kwargs["enginethreshold"]
+
+        ## The linearity fitting mode.
+        self.__linmode = "compat"
+        if "linmode" in kwargs.keys():
+            self.__linmode = kwargs["linmode"]
+
+        ## The cluster feature groups to compute up front.
+        self.__features = None
+        if "features" in kwargs.keys():
+            self.__features = kwargs["features"]
+
+        ## Compute the cluster table for gamma candidates too?
+        self.__gammas = True
+        if "gammas" in kwargs.keys():
+            self.__gammas = kwargs["gammas"]
+
+        ## The precomputed cluster labels (see Dataset.getFrames).
+        self.__labels = None
+        if "labels" in kwargs.keys():
+            self.__labels = kwargs["labels"]
+
         if "skipclustering" in kwargs.keys():
             if kwargs["skipclustering"]:
                 #print("SKIPPING THE CLUSTERING!")
@@ -199,7 +238,10 @@ class Frame:
         # Do the clustering.
 
         ## The frame's cluster finder.
-        self.__kf = KlusterFinder(self.getPixelMap(), self.getWidth(), self.getHeight(), self.isMC(), self.__pixel_mask_map)
+        self.__kf = KlusterFinder(self.getPixelMap(), self.getWidth(), self.getHeight(), self.isMC(), self.__pixel_mask, self.__engine, self.__linmode, self.__features, self.__gammas, self.__engine_threshold, self.__labels)
+
+        # Record the engine actually used (if "auto" was requested).
+        self.__engine = self.__kf.getEngine()
 
         self.__n_klusters = self.__kf.getNumberOfKlusters()
 
@@ -309,22 +351,11 @@ class Frame:
         return len(self.__pixelmap)
 
     def getNumberOfUnmaskedPixels(self):
-        unmasked = 0
-        #lg.debug(self.__pixelmap)
-        #lg.debug(self.__pixel_mask_map)
-        #for X in self.__pixel_mask_map.keys():
-        #    lg.debug(" * %5d -> (%5d,%5d)." % (X, X%256, X/256))
-        for X in self.__pixelmap.keys():
-            #lg.debug(" * Is %5d -> (%5d,%5d) in the map?" % (X, X%256, X/256))
-            if X not in self.__pixel_mask_map.keys():
-                #lg.debug(" *---> NO!")
-                unmasked += 1
-            #else:
-            #    lg.debug(" *---> YES!")
-        return unmasked
+        Xs = np.fromiter(self.__pixelmap.iterkeys(), dtype=np.int64, count=len(self.__pixelmap))
+        return len(Xs) - int(self.__pixel_mask.flat[Xs].sum())
 
     def getNumberOfMaskedPixels(self):
-        return len(self.__pixel_mask_map)
+        return int(self.__pixel_mask.sum())
 
     def getOccupancy(self):
         return len(self.__pixelmap)
@@ -361,3 +392,9 @@ class Frame:
 
     def getKlusterFinder(self):
         return self.__kf
+
+    def getEngine(self):
+        return self.__engine
+
+    def getKlusterTable(self):
+        return self.__kf.getKlusterTable()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+An on-disk cache of the clusters found in each frame.
+
+Each entry is stored in its own file, named by its key: the SHA-1
+hash of the frame's data file contents, the frame geometry, the
+clustering options and the cache version - a hash of FRAME_CACHE_VERSION
+and of the clustering code's source files (FRAME_CACHE_SOURCES), so any
+change to the code misses the entries made before it. An entry holds the frame's
+pixel arrays (in the order they were read), the cluster ID of each
+unmasked pixel and the frame's cluster table, so a frame found in the
+cache is neither parsed nor clustered (see Dataset.iterFrames).
+
+Rather than being part of the key, the pixel mask is checked when an
+entry is used: the entry records which of the frame's hit pixels were
+masked, so a change to the mask only misses (and replaces) the entries
+of the frames with hits on the pixels that changed.
+
+The cache is kept under its size limit by removing the least recently
+used entries (by modification time, which is updated when an entry is
+used). Each process keeps its own account of the cache's size, so
+processes sharing a cache (e.g. with --jobs) can take it over the limit
+until it is next opened. The entries are written to a temporary file
+first, so that a partial entry is never read, and entries that disappear
+(e.g. removed by another process) are treated as misses.
+"""
+
+# The usual suspects.
+import os, glob
+
+#...for the logging.
+import logging as lg
+
+#...for the cache keys.
+import hashlib, json
+
+#...for reading the cache from the I/O threads.
+import threading
+
+#...for the MATH.
+import numpy as np
+
+#...for the cluster tables.
+from features import KLUSTER_TABLE_DTYPE
+
+#...for the cluster properties.
+from helpers import getFeatureSet, getKlusterPropertiesJson
+
+#...for the pixel orders.
+from labelling import getMaskedPixelMap, getOrderedPixelArrays
+
+#...for the data values.
+from datavals import *
+
+def getFrameCacheVersion(folder=os.path.dirname(os.path.abspath(__file__)), sources=FRAME_CACHE_SOURCES):
+    """
+    Get the frame cache version from the clustering code.
+
+    @param [in] folder The folder containing the source files.
+    @param [in] sources The names of the source files.
+    @returns The version (the SHA-1 hash of FRAME_CACHE_VERSION and the sources).
+    """
+
+    ## The hash of the sources.
+    h = hashlib.sha1(str(FRAME_CACHE_VERSION))
+
+    for fn in sources:
+        h.update(fn)
+        with open(os.path.join(folder, fn), "rb") as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+## The frame cache version of the code being run.
+FRAME_CACHE_CODE_VERSION = getFrameCacheVersion()
+
+def getFrameCacheKey(datahash, width, height, options, version=FRAME_CACHE_CODE_VERSION):
+    """
+    Get the cache key of a frame.
+
+    @param [in] datahash The SHA-1 hash of the frame's data.
+    @param [in] width The frame width [pixels].
+    @param [in] height The frame height [pixels].
+    @param [in] options The frame clustering options (engine, features, etc.).
+    @param [in] version The cache version.
+    @returns The key (a hex string).
+    """
+
+    ## The values the frame's clusters depend on.
+    params = [ \
+        version, width, height, datahash, \
+        options.get("engine", "pixel"), \
+        options.get("enginethreshold", AUTO_ENGINE_OCCUPANCY), \
+        options.get("linmode", "compat"), \
+        sorted(getFeatureSet(options.get("features", None))), \
+        options.get("gammas", True), \
+        options.get("ismc", False) \
+        ]
+
+    return hashlib.sha1(json.dumps(params)).hexdigest()
+
+def getKlusterTableFromKlusters(klusters, features=None):
+    """
+    Get the cluster table of a list of clusters from their properties.
+
+    @param [in] klusters The clusters.
+    @param [in] features The feature groups to include (see getFeatureSet).
+    @returns The cluster table, in the order of the list.
+    """
+
+    ## The cluster table.
+    t = np.zeros(len(klusters), dtype=KLUSTER_TABLE_DTYPE)
+
+    for i, k in enumerate(klusters):
+
+        ## The cluster's properties.
+        p = getKlusterPropertiesJson(None, k, features)
+
+        for name in KLUSTER_TABLE_DTYPE.names:
+            if name in p:
+                t[name][i] = p[name]
+
+        t["gamma"][i] = k.getGammaCategory()
+
+    return t
+
+def writeCacheEntry(fn, Xs, Cs, masked, ids, table):
+    """
+    Write a frame cache entry.
+
+    The entry is FRAME_CACHE_MAGIC, the numbers of pixels, unmasked
+    pixels and clusters (as 8-byte integers), then the arrays' contents.
+
+    @param [in] fn The path to the entry.
+    @param [in] Xs The frame's pixel index array, as read.
+    @param [in] Cs The frame's pixel count array, as read.
+    @param [in] masked Is each of those pixels masked?
+    @param [in] ids The cluster ID of each unmasked pixel (see KlusterFinder).
+    @param [in] table The cluster table.
+    """
+
+    with open(fn, "wb") as f:
+        f.write(FRAME_CACHE_MAGIC)
+        f.write(np.array([len(Xs), len(ids), len(table)], dtype="<u8").tostring())
+        f.write(np.asarray(Xs, dtype="<i8").tostring())
+        f.write(np.asarray(Cs, dtype="<i8").tostring())
+        f.write(np.asarray(ids, dtype="<i8").tostring())
+        f.write(np.asarray(table, dtype=KLUSTER_TABLE_DTYPE).tostring())
+        f.write(np.asarray(masked, dtype=np.bool_).tostring())
+
+def readCacheEntry(fn):
+    """
+    Read a frame cache entry (see writeCacheEntry).
+
+    @param [in] fn The path to the entry.
+    @returns A dictionary of the entry's arrays.
+    """
+
+    with open(fn, "rb") as f:
+        # (Read into a bytearray so that the arrays can be written to.)
+        buf = bytearray(f.read())
+
+    ## The length of the entry's header.
+    hlen = len(FRAME_CACHE_MAGIC) + 24
+
+    if len(buf) < hlen or str(buf[:len(FRAME_CACHE_MAGIC)]) != FRAME_CACHE_MAGIC:
+        raise IOError("BAD_CACHE_ENTRY")
+
+    n, nu, nk = np.frombuffer(buf, dtype="<u8", count=3, offset=len(FRAME_CACHE_MAGIC)).tolist()
+
+    ## The arrays in the entry (name, type, number of entries).
+    arrays = [("Xs", np.dtype("<i8"), n), ("Cs", np.dtype("<i8"), n), ("ids", np.dtype("<i8"), nu), \
+        ("table", KLUSTER_TABLE_DTYPE, nk), ("masked", np.dtype(np.bool_), n)]
+
+    if len(buf) != hlen + sum(dtype.itemsize * count for name, dtype, count in arrays):
+        raise IOError("BAD_CACHE_ENTRY")
+
+    ## The entry.
+    entry = {}
+
+    ## The start of the next array.
+    offset = hlen
+
+    for name, dtype, count in arrays:
+        entry[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+        offset += dtype.itemsize * count
+
+    return entry
+
+def getPixelKlusterIds(Xs, klusters):
+    """
+    Get the index (in a list of clusters) of each pixel's cluster.
+
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] klusters The clusters (between them, holding all of the pixels).
+    @returns The cluster index of each pixel.
+    """
+
+    if len(klusters) == 0:
+        return np.zeros(len(Xs), dtype=np.int64)
+
+    ## The pixels of every cluster.
+    kXs = np.concatenate([np.asarray(k.get_pixel_xy_list(), dtype=np.int64) for k in klusters])
+
+    ## The index of each of those pixels' cluster.
+    kids = np.repeat(np.arange(len(klusters)), [k.getNumberOfPixels() for k in klusters])
+
+    order = np.argsort(kXs)
+
+    return kids[order][np.searchsorted(kXs[order], Xs)]
+
+class FrameCache:
+    """ An on-disk cache of the clusters found in each frame. """
+
+    def __init__(self, foldername, maxsize=FRAME_CACHE_SIZE * 1024 * 1024):
+        """
+        The constructor.
+
+        @param [in] foldername The path to the cache folder (created if needed).
+        @param [in] maxsize The size limit of the cache [bytes].
+        """
+
+        if not os.path.isdir(foldername):
+            os.makedirs(foldername)
+
+        ## The path to the cache folder.
+        self.__foldername = foldername
+
+        ## The size limit of the cache [bytes].
+        self.__maxsize = maxsize
+
+        ## The lock for the index (the cache is read from the I/O threads).
+        self.__lock = threading.Lock()
+
+        ## The cache entries {file name : [size, time last used]}.
+        self.__index = {}
+        #
+        for fn in glob.glob(os.path.join(foldername, "*" + FRAME_CACHE_EXTENSION)):
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            self.__index[fn] = [st.st_size, st.st_mtime]
+
+        ## The total size of the entries [bytes].
+        self.__size = sum(size for size, t in self.__index.values())
+
+        ## The number of frames found in the cache.
+        self.__n_hits = 0
+
+        ## The number of frames not found in the cache.
+        self.__n_misses = 0
+
+        lg.debug(" * Found %d entries (%d bytes) in the frame cache '%s'." % \
+            (len(self.__index), self.__size, foldername))
+
+    def __getstate__(self):
+        # The lock can't be pickled (for the worker processes) - it is remade.
+        state = self.__dict__.copy()
+        del state["_FrameCache__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def getFoldername(self):
+        return self.__foldername
+
+    def getMaxSize(self):
+        return self.__maxsize
+
+    def getSize(self):
+        return self.__size
+
+    def getNumberOfEntries(self):
+        return len(self.__index)
+
+    def getNumberOfHits(self):
+        return self.__n_hits
+
+    def getNumberOfMisses(self):
+        return self.__n_misses
+
+    def getEntryFilename(self, key):
+        return os.path.join(self.__foldername, key + FRAME_CACHE_EXTENSION)
+
+    def get(self, key, mask=None):
+        """
+        Get a frame's entry from the cache.
+
+        @param [in] key The frame's cache key (see getFrameCacheKey).
+        @param [in] mask The boolean (rows, cols) pixel mask array (or None).
+        @returns A dictionary of the pixel arrays ("Xs" and "Cs", as read)
+                 and the precomputed "labels" (ids, n, table) for the
+                 frame's KlusterFinder, or None if the frame isn't in the
+                 cache (or was cached with a different pixel mask).
+        """
+
+        ## The path to the entry.
+        fn = self.getEntryFilename(key)
+
+        ## The entry.
+        entry = None
+        #
+        try:
+            entry = readCacheEntry(fn)
+        except (IOError, OSError):
+            pass
+
+        if entry is not None:
+
+            ## Is each of the frame's pixels masked now?
+            masked = np.zeros(len(entry["Xs"]), dtype=np.bool_) if mask is None else mask.flat[entry["Xs"]]
+
+            if not np.array_equal(masked, entry["masked"]):
+                lg.debug(" * The frame cache entry '%s' has a different pixel mask." % (fn))
+                entry = None
+
+        if entry is None:
+            with self.__lock:
+                self.__n_misses += 1
+            return None
+
+        # Mark the entry as used.
+        try:
+            os.utime(fn, None)
+            st = os.stat(fn)
+        except OSError:
+            st = None
+
+        with self.__lock:
+            self.__n_hits += 1
+            if st is not None:
+                if fn in self.__index:
+                    self.__size -= self.__index[fn][0]
+                self.__index[fn] = [st.st_size, st.st_mtime]
+                self.__size += st.st_size
+
+        return { \
+            "Xs"     : entry["Xs"], \
+            "Cs"     : entry["Cs"], \
+            "labels" : (entry["ids"], len(entry["table"]), entry["table"]) \
+            }
+
+    def put(self, key, f, Xs, Cs, mask=None, features=None):
+        """
+        Add a frame to the cache (replacing any entry it has already).
+
+        @param [in] key The frame's cache key (see getFrameCacheKey).
+        @param [in] f The (clustered) frame.
+        @param [in] Xs The frame's pixel index array, as read.
+        @param [in] Cs The frame's pixel count array, as read.
+        @param [in] mask The boolean (rows, cols) pixel mask array (or None).
+        @param [in] features The feature groups in the cluster table (see getFeatureSet).
+        """
+
+        ## The frame's cluster finder.
+        kf = f.getKlusterFinder()
+
+        ## The clusters.
+        klusters = kf.getListOfKlusters()
+
+        ## The cluster table (made from the clusters for the pixel-by-pixel engine).
+        table = kf.getKlusterTable()
+        #
+        if table is None:
+            table = getKlusterTableFromKlusters(klusters, features)
+
+        ## The unmasked pixels, in the order the cluster finder uses them.
+        Xo, Co = getOrderedPixelArrays(getMaskedPixelMap(f.getPixelMap(), mask))
+
+        ## The path to the entry.
+        fn = self.getEntryFilename(key)
+
+        ## The path the entry is written to first.
+        tmpfn = "%s.%d.tmp" % (fn, os.getpid())
+
+        try:
+            writeCacheEntry(tmpfn, Xs, Cs, np.zeros(len(Xs), dtype=np.bool_) if mask is None else mask.flat[Xs], \
+                getPixelKlusterIds(Xo, klusters), table)
+            os.rename(tmpfn, fn)
+        except (IOError, OSError):
+            lg.debug(" * Unable to write the frame cache entry '%s'." % (fn))
+            if os.path.exists(tmpfn):
+                os.remove(tmpfn)
+            return
+
+        with self.__lock:
+
+            if fn in self.__index:
+                self.__size -= self.__index[fn][0]
+
+            st = os.stat(fn)
+
+            self.__index[fn] = [st.st_size, st.st_mtime]
+
+            self.__size += st.st_size
+
+            self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache is under its size limit. """
+
+        if self.__size <= self.__maxsize:
+            return
+
+        for fn in sorted(self.__index, key = lambda fn: self.__index[fn][1]):
+
+            if self.__size <= self.__maxsize:
+                break
+
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+
+            self.__size -= self.__index.pop(fn)[0]
+
+            lg.debug(" * Removed the frame cache entry '%s'." % (fn))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Gamma candidate classification of small clusters from their shapes.
+
+Every 8-connected cluster of one to four pixels fits in a 4x4 box, so
+its shape can be encoded as a 16-bit mask of the pixel offsets from the
+cluster's (xmin, ymin) corner - bit (4*dy + dx). The gamma category of
+every possible small shape is worked out once, using the same radius
+cuts as Kluster.isGamma, and stored in a lookup table indexed by mask.
+"""
+
+#...for the MATH.
+import numpy as np
+
+#...for the data values.
+from datavals import *
+
+## The gamma categories.
+NOT_GAMMA, MONOPIXEL, BIPIXEL, TRIPIXEL_GAMMA, TETRAPIXEL_GAMMA = 0, 1, 2, 3, 4
+
+## The largest cluster size that can be a gamma candidate.
+MAX_GAMMA_SIZE = 4
+
+def getShapeMask(offsets):
+    """ Get the 16-bit shape mask from a list of (dx, dy) offsets. """
+    return sum(1 << ((4 * dy) + dx) for dx, dy in offsets)
+
+def getShapeRadius(offsets):
+    """ Get the (unweighted) radius of a shape, as Kluster does. """
+
+    xs = np.array([float(dx) for dx, dy in offsets])
+
+    ys = np.array([float(dy) for dx, dy in offsets])
+
+    return np.sqrt(((xs - xs.mean())**2 + (ys - ys.mean())**2).max())
+
+def getSmallShapes():
+    """
+    Find all of the 8-connected shapes with up to MAX_GAMMA_SIZE pixels.
+
+    @returns A dictionary of {shape mask : list of (dx, dy) offsets}.
+    """
+
+    ## The shapes of the current size, as normalised sets of offsets.
+    current = set([frozenset([(0, 0)])])
+
+    ## The shapes found.
+    shapes = {}
+
+    for size in range(1, MAX_GAMMA_SIZE + 1):
+
+        for shape in current:
+            shapes[getShapeMask(shape)] = sorted(shape)
+
+        # Grow each shape by one neighbouring pixel.
+        grown = set()
+        for shape in current:
+            for x, y in shape:
+                for dx in [-1, 0, 1]:
+                    for dy in [-1, 0, 1]:
+                        if (x + dx, y + dy) in shape:
+                            continue
+                        newshape = shape | frozenset([(x + dx, y + dy)])
+                        xmin = min(p[0] for p in newshape)
+                        ymin = min(p[1] for p in newshape)
+                        grown.add(frozenset([(p[0] - xmin, p[1] - ymin) for p in newshape]))
+        current = grown
+
+    return shapes
+
+def getGammaCategoryFromShape(offsets):
+    """ Get the gamma category of a small shape. """
+
+    npix = len(offsets)
+
+    if npix == 1:
+        return MONOPIXEL
+    elif npix == 2:
+        return BIPIXEL
+    elif npix == 3 and getShapeRadius(offsets) < TRIPIXEL_RADIUS:
+        return TRIPIXEL_GAMMA
+    elif npix == 4 and getShapeRadius(offsets) < TETRAPIXEL_RADIUS:
+        return TETRAPIXEL_GAMMA
+
+    return NOT_GAMMA
+
+## The lookup table of gamma categories, indexed by shape mask.
+GAMMA_SHAPE_TABLE = np.zeros(1 << 16, dtype=np.int8)
+
+for mask, offsets in getSmallShapes().iteritems():
+    GAMMA_SHAPE_TABLE[mask] = getGammaCategoryFromShape(offsets)
+
+def getGammaCategory(pixel_xy_list, cols):
+    """
+    Get the gamma category of a single cluster.
+
+    @param [in] pixel_xy_list The cluster's pixel indices (X = y*cols + x).
+    @param [in] cols The number of columns in the frame.
+    @returns The gamma category (NOT_GAMMA for clusters that aren't).
+    """
+
+    if len(pixel_xy_list) > MAX_GAMMA_SIZE:
+        return NOT_GAMMA
+
+    xs = [X % cols for X in pixel_xy_list]
+
+    ys = [X // cols for X in pixel_xy_list]
+
+    xmin, ymin = min(xs), min(ys)
+
+    return int(GAMMA_SHAPE_TABLE[getShapeMask([(x - xmin, y - ymin) for x, y in zip(xs, ys)])])
+
+def getGammaCategories(ids, Xs, n, cols):
+    """
+    Get the gamma category of every cluster in a frame at once.
+
+    @param [in] ids The cluster ID (0 to n-1) of each pixel.
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] n The number of clusters.
+    @param [in] cols The number of columns in the frame.
+    @returns The gamma category of each cluster.
+    """
+
+    if n == 0:
+        return np.zeros(0, dtype=np.int8)
+
+    xs = Xs % cols
+
+    ys = Xs // cols
+
+    ## The cluster (xmin, ymin) corners.
+    xmin = np.full(n, cols, dtype=np.int64); np.minimum.at(xmin, ids, xs)
+    ymin = np.full(n, np.iinfo(np.int64).max, dtype=np.int64); np.minimum.at(ymin, ids, ys)
+
+    dx = xs - xmin[ids]
+    dy = ys - ymin[ids]
+
+    ## Pixels that fit in a 4x4 box (all of them, for the small clusters).
+    inbox = (dx < 4) & (dy < 4)
+
+    ## The shape masks (only meaningful for the small clusters).
+    masks = np.bincount(ids[inbox], weights=np.left_shift(1, (4 * dy[inbox]) + dx[inbox]), \
+        minlength=n).astype(np.int64)
+
+    ## The small clusters.
+    small = np.bincount(ids, minlength=n) <= MAX_GAMMA_SIZE
+
+    cats = np.zeros(n, dtype=np.int8)
+    cats[small] = GAMMA_SHAPE_TABLE[masks[small]]
+
+    return cats
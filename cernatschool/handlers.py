@@ -14,13 +14,16 @@ import re
 #...for the time functionality.
 import time
 
+## The regex for the chipboard ID.
+CHIPID_REGEX = re.compile(r'[A-Z]\d{2,2}-[A-Z]\d{4,4}')
+
+## The regex for the start time string.
+STARTTIME_REGEX = re.compile(r'[A-Z][a-z][a-z] [A-Z][a-z][a-z] \d{2,2} \d{2,2}:\d{2,2}:\d{2,2}.\d{6,6} \d{4,4}')
+
 def isChipIdValid(chipid):
     """ Does the chip ID conform to the UVV-XYYYY format? """
 
-    # regex match for the chipboard ID.
-    r = re.compile(r'[A-Z]\d{2,2}-[A-Z]\d{4,4}')
-
-    if r.match(chipid) is not None:
+    if CHIPID_REGEX.match(chipid) is not None:
         return True
     else:
         return False
@@ -28,10 +31,7 @@ def isChipIdValid(chipid):
 def isStartTimeStringValid(sts):
     """ Check the format of the time string. """
 
-    # regex match for the start time string.
-    r_starttime = re.compile(r'[A-Z][a-z][a-z] [A-Z][a-z][a-z] \d{2,2} \d{2,2}:\d{2,2}:\d{2,2}.\d{6,6} \d{4,4}')
-
-    if r_starttime.match(sts) is not None:
+    if STARTTIME_REGEX.match(sts) is not None:
         return True
     else:
         return False
@@ -11,9 +11,6 @@ import logging as lg
 #...for the MATH.
 import numpy as np
 
-#...for the least squares stuff.
-from scipy.optimize import leastsq
-
 #...for the data values.
 from datavals import *
 
@@ -43,70 +40,105 @@ def getFormat(fn):
     ## Open the file and look at the first line.
     with open(fn, "r") as f:
 
-        l = f.readline().strip()
+        return getFormatFromLine(f.readline())
+
+def getFormatFromBuffer(buf):
+    """
+    Get the file format value from the contents of a file.
 
-        lg.debug("")
-        lg.debug(" *--> First line is:")
-        lg.debug("\n\n%s\n" % (l))
-        lg.debug("")
+    @param [in] buf The contents (or at least the first line) of the file.
+    @returns The file format value (see DATA_FILE_TYPES).
+    """
 
-        ## The file type value.
-        filetypeval = 0
+    return getFormatFromLine(buf[:buf.find("\n") + 1] if "\n" in buf else buf)
 
-        # Is it a DSC file?
-        # TODO: check all possible DSC file starts...
-        if   l == "A000000001":
-            filetypeval = -1
-            lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
-            return filetypeval
+def isFormatConsistent(buf, formatval):
+    """
+    Check that the contents of a data file match the format expected.
 
-        # Is the file empty?
-        if l == "":
-            filetypeval = 4114
-            lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
-            return filetypeval
+    Only the first line is looked at. Empty files match any format.
+
+    @param [in] buf The contents (or at least the first line) of the file.
+    @param [in] formatval The expected file format value.
+    @returns True if the file is in the expected format.
+    """
+
+    if buf.strip() == "":
+        return True
+
+    return getFormatFromBuffer(buf) == formatval
+
+def getFormatFromLine(l):
+    """
+    Get the file format value from the first line of a file.
 
-        # Try to break up the first line into tab-separated integers.
+    @param [in] l The first line of the file.
+    @returns The file format value (see DATA_FILE_TYPES).
+    """
+
+    l = l.strip()
+
+    lg.debug("")
+    lg.debug(" *--> First line is:")
+    lg.debug("\n\n%s\n" % (l))
+    lg.debug("")
 
-        try:
-            ## Values separated by tab
-            tabvals = [int(x) for x in l.split('\t')]
+    ## The file type value.
+    filetypeval = 0
 
-            lg.debug(" %d tab separated values found in the first line." % (len(tabvals)))
+    # Is it a DSC file?
+    # TODO: check all possible DSC file starts...
+    if   l == "A000000001":
+        filetypeval = -1
+        lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
+        return filetypeval
+
+    # Is the file empty?
+    if l == "":
+        filetypeval = 4114
+        lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
+        return filetypeval
 
-            if len(tabvals) == 2:
-                filetypeval = 8210
-            elif len(tabvals) == 3:
-                filetypeval = 4114
-            lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
-            return filetypeval
+    # Try to break up the first line into tab-separated integers.
 
-        except ValueError:
-            lg.debug(" Tab separation into integers failed!")
-            pass
+    try:
+        ## Values separated by tab
+        tabvals = [int(x) for x in l.split('\t')]
 
-        try:
-            ## Values separated by spaces.
-            spcvals = [int(x) for x in l.split(' ')]
+        lg.debug(" %d tab separated values found in the first line." % (len(tabvals)))
 
-            lg.debug(" %d space separated values found in the first line." % (len(spcvals)))
+        if len(tabvals) == 2:
+            filetypeval = 8210
+        elif len(tabvals) == 3:
+            filetypeval = 4114
+        lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
+        return filetypeval
 
-            if len(spcvals) == 256:
-                filetypeval = 18
-            lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
-            return filetypeval
+    except ValueError:
+        lg.debug(" Tab separation into integers failed!")
+        pass
 
-        except ValueError:
-            lg.debug(" Space separation into integers failed!")
-            pass
+    try:
+        ## Values separated by spaces.
+        spcvals = [int(x) for x in l.split(' ')]
 
-        lg.debug(" This is not a valid data file.")
+        lg.debug(" %d space separated values found in the first line." % (len(spcvals)))
 
+        if len(spcvals) == 256:
+            filetypeval = 18
+        lg.debug(" *--> This is a %s file." % (DATA_FILE_TYPES[filetypeval]))
         return filetypeval
 
+    except ValueError:
+        lg.debug(" Space separation into integers failed!")
+        pass
+
+    lg.debug(" This is not a valid data file.")
+
+    return filetypeval
 
 def residuals(p, y, x):
-    """ The residual function required by leastsq."""
+    """ The residual function for a least squares straight line fit (e.g. with leastsq). """
 
     ## The gradient of the line.
     m = p[0]
@@ -123,125 +155,141 @@ def residuals(p, y, x):
     # Return it!
     return res
 
-def getLinearity(pixel_dict):
+def getLinearities(ids, xs, ys, n, mode="compat"):
+    """
+    Find the linearity of every cluster in a frame at once.
+
+    The line of best fit for each cluster is found in closed form from
+    grouped (per-cluster) moment sums, so no iterative solver is needed.
+
+    In "compat" mode the line minimises the y residuals (as getLinearity
+    does) and the vertical, horizontal and single pixel special cases
+    return the same values as getLinearity. In "perpendicular" mode the
+    line minimises the perpendicular distances (total least squares),
+    which makes the linearity rotationally invariant.
+
+    In both modes the residuals are the perpendicular distances of each
+    pixel from the line of best fit.
+
+    @param [in] ids The cluster ID (0 to n-1) of each pixel.
+    @param [in] xs The pixel x values.
+    @param [in] ys The pixel y values.
+    @param [in] n The number of clusters.
+    @param [in] mode The fitting mode ("compat" or "perpendicular").
+    @returns m The gradients of the lines of best fit.
+    @returns c The intercepts of the lines of best fit.
+    @returns sumR The sums of the residuals.
+    @returns lin The linearities, sumR/N_pixels.
     """
-    A helper function for finding the linearity of a cluster.
 
-    The residuals are the perpendicular distances of each pixel
-    from the line of best fit.
+    if mode not in LINEARITY_MODES:
+        raise IOError("BAD_LINEARITY_MODE")
 
-    @param [in] pixel_dict A dictionary of pixel {X:C} values.
-    @returns m The gradient of the line of best fit.
-    @returns c The intercept of the line of best fit.
-    @returns sumR The sum of the residuals.
-    @returns lin The linearity, sumR/N_pixels.
-    """
+    xs = np.asarray(xs, dtype=np.float64)
 
-    lg.debug("*")
-    lg.debug("*--> getLinearity called:")
-    lg.debug("* %d pixels found." % (len(pixel_dict)))
+    ys = np.asarray(ys, dtype=np.float64)
 
-    #m, c, sumR, lin = 0.0, 0.0, 0.0, 0.0
+    ## The number of pixels in each cluster.
+    npix = np.bincount(ids, minlength=n).astype(np.float64)
 
-    ## The list of pixel x values.
-    xs = []
+    ## The cluster centroids.
+    xbar = np.bincount(ids, weights=xs, minlength=n) / npix
+    ybar = np.bincount(ids, weights=ys, minlength=n) / npix
 
-    ## The list of pixel y values.
-    ys = []
+    dx = xs - xbar[ids]
+    dy = ys - ybar[ids]
 
-    # Loop over the pixels provided to get the x and y values.
-    for X, C in pixel_dict.iteritems():
-        x = float(X % 256)
-        y = float(X / 256)
-        xs.append(x)
-        ys.append(y)
+    # The second moments about the centroid.
+    Sxx = np.bincount(ids, weights=dx*dx, minlength=n)
+    Syy = np.bincount(ids, weights=dy*dy, minlength=n)
+    Sxy = np.bincount(ids, weights=dx*dy, minlength=n)
 
-    ## An array of the pixel x values.
-    x_array = np.array(xs)
+    ## Clusters with all pixels in one column (including single pixels).
+    vertical = Sxx == 0.0
 
-    ## The y values.
-    y_array = np.array(ys)
+    ## Clusters with all pixels in one row.
+    horizontal = (Syy == 0.0) & ~vertical
 
-    # If there are no pixels, return 0.0.
-    if len(pixel_dict) == 0:
-        lg.debug("*--> No pixels provided; exiting returning 0.0!")
-        return None, None, None, None
+    ## Single pixel clusters.
+    single = npix == 1
+
+    if mode == "compat":
+
+        m = np.zeros(n)
+        m[~vertical] = Sxy[~vertical] / Sxx[~vertical]
+
+        ## The denominator of |d| (the perpendicular distance).
+        denom = np.sqrt(1.0 + m*m)
+
+        ## The perpendicular distance of each pixel from its cluster's line.
+        ds = np.fabs((m[ids] * dx) - dy) / denom[ids]
 
-    # Check that it's not just a single pixel cluster.
-    if len(x_array) == 1:
-        lg.debug("*--> I am only one pixel! Exiting!")
-        #return None, None, None, None
-        return 0.0, x_array[0], 0.0, 0.0
-
-    # Get the equation of the line
-    #------------------------------
-
-    # Vertical line
-    # For a vertical line of pixels, all of the x values will be identical.
-    if xs.count(xs[0]) == len(xs): # Nifty little trick picked up from SE.
-        # d is the intercept on the x axis
-        #d = x_array[0]
-        return 999999.9, 999999.9, 0.0, 0.0
-
-    # Horizontal line
-    # For a horizontal line of pixels, all of the y values will be identical.
-    # We can just set m to 0 and c to y_i.
-    elif ys.count(ys[0]) == len(ys):
-        return 0.0, ys[0], 0.0, 0.0
-
-    # The line is at an angle to the axes - a bit more interesting!
     else:
-        # A first guess from the "end" pixels.
-        # Note, however, that the "end" pixels may not be at the extremes
-        # of the cluster (to be investigated further...).
-        #
-        lg.debug("* --> Initial guesses from (%3d, %3d) - (%3d, %3d):" % \
-            (x_array[0], y_array[0], x_array[-1], y_array[-1]))
 
-        #m_init = ((y_array[-1])-(y_array[0]))/((x_array[-1])-(x_array[0]))
-        m_init = 0.0
+        ## The angle of each line of best fit to the x axis.
+        theta = 0.5 * np.arctan2(2.0 * Sxy, Sxx - Syy)
 
-        c_init = y_array[0] - (m_init*(x_array[0]))
+        ## The unit normal to each line of best fit.
+        nx, ny = -np.sin(theta), np.cos(theta)
 
-        # A list of the initial guess parameters.
-        p0 = [m_init, c_init]
-        lg.debug("*--> Initial [m, c] = [% f, % f]" % (p0[0], p0[1]))
+        # Lines within rounding of the vertical are treated as vertical.
+        vertical = np.fabs(ny) < 1.0e-12
+        nx[vertical], ny[vertical] = 1.0, 0.0
 
-        # The results of the least-squares finding.
-        plsq = leastsq(residuals, p0, args = (np.array(y_array), np.array(x_array)))
+        m = np.zeros(n)
+        m[~vertical] = -nx[~vertical] / ny[~vertical]
 
-        ## The gradient of the line.
-        m = plsq[0][0]
+        ds = np.fabs((nx[ids] * dx) + (ny[ids] * dy))
 
-        ## The intercept with the y axis.
-        c = plsq[0][1]
+    c = ybar - (m * xbar)
 
-        lg.debug("*--> Found   [m, c] = [% f, % f]" % (m, c))
+    sumR = np.bincount(ids, weights=ds, minlength=n)
 
-        # Now find the perpendicular distance of the pixel from the
-        # line (the residuals).
+    # The special cases.
+    m[vertical] = 999999.9
+    c[vertical] = 999999.9
 
-        ## The denominator of |d| (the perpendicular distance).
-        #
-        # We only need this once, so we do it at the start of the loop.
-        denom = np.sqrt(1 + m*m)
+    if mode == "compat":
+        sumR[vertical | horizontal] = 0.0
+        m[horizontal], c[horizontal] = 0.0, ybar[horizontal]
+        m[single], c[single], sumR[single] = 0.0, xbar[single], 0.0
+    else:
+        m[single], c[single], sumR[single] = 0.0, ybar[single], 0.0
 
-        ## The list of distances, one for each pixel.
-        ds = []
+    return m, c, sumR, sumR / npix
 
-        # Loop over the pixels and calculate the distances.
-        for X, C in pixel_dict.iteritems():
-            x = X % 256
-            y = X / 256
+def getLinearity(pixel_dict, mode="compat", cols=256):
+    """
+    A helper function for finding the linearity of a cluster.
 
-            ## The numerator of |d| (the perpendicular distance).
-            numerator = np.fabs(m * x - y + c)
+    The line of best fit is found as it is for all of the clusters in a
+    frame by getLinearities (including the special cases of single pixels,
+    and vertical and horizontal lines).
 
-            ds.append(numerator/denom)
+    @param [in] pixel_dict A dictionary of pixel {X:C} values.
+    @param [in] mode The fitting mode - see getLinearities.
+    @param [in] cols The number of columns in the frame.
+    @returns m The gradient of the line of best fit.
+    @returns c The intercept of the line of best fit.
+    @returns sumR The sum of the residuals.
+    @returns lin The linearity, sumR/N_pixels.
+    """
+
+    lg.debug("*")
+    lg.debug("*--> getLinearity called:")
+    lg.debug("* %d pixels found." % (len(pixel_dict)))
+
+    # If there are no pixels, return None.
+    if len(pixel_dict) == 0:
+        lg.debug("*--> No pixels provided; exiting returning None!")
+        return None, None, None, None
+
+    ## The pixel indices.
+    Xs = np.fromiter(pixel_dict.iterkeys(), dtype=np.int64, count=len(pixel_dict))
 
-        return m, c, sum(ds), sum(ds)/(float(len(pixel_dict)))
+    m, c, sumR, lin = getLinearities(np.zeros(len(Xs), dtype=np.int64), Xs % cols, Xs // cols, 1, mode)
 
-    print("* ERROR - should not reach this point...")
+    return m[0], c[0], sumR[0], lin[0]
 
 def countEdgePixels(pixels_dict, rows, cols):
     """ Count the number of edge pixels in the cluster. """
@@ -281,7 +329,7 @@ def countEdgePixels(pixels_dict, rows, cols):
             #    continue
 
             # If the next X value is not in the pixel keys, we have an edge pixel.
-            if nX not in pixels_dict.keys():
+            if nX not in pixels_dict:
                 #print "DEBUG: *-----* Found neighbour in self.pixels!"
                 #print "DEBUG: *     \\--* xy = %d" % (nxy)
                 #self.pixels[ xy].set_neighbour( direction,     nxy)
@@ -295,39 +343,148 @@ def countEdgePixels(pixels_dict, rows, cols):
     return num_edge_pixels
 
 
-def getKlusterPropertiesJson(klusterid, k):
-    """ Return a JSON containing the cluster properties. """
+def getFeatureSet(features=None):
+    """
+    Get the set of cluster feature groups to compute.
+
+    @param [in] features "full" (or None) for every feature group, or a
+                         comma-separated string (or list) of the groups
+                         in KLUSTER_FEATURES, e.g. "size,radius,counts".
+    @returns A frozenset of the feature group names.
+    """
+
+    if features is None or features == "full":
+        return frozenset(KLUSTER_FEATURES.keys())
+
+    if isinstance(features, basestring):
+        features = [f.strip() for f in features.split(",") if f.strip() != ""]
+
+    for f in features:
+        if f not in KLUSTER_FEATURES:
+            lg.debug(" Unknown cluster feature group '%s'." % (f))
+            raise IOError("BAD_FEATURE_SET")
+
+    # The cluster size is always available.
+    return frozenset(features) | frozenset(["size"])
+
+def loadPixelMask(fn, rows=256, cols=256):
+    """
+    Load a pixel mask file into a boolean detector-shaped array.
+
+    @param [in] fn The path to the mask file (one tab-separated "x y" per line).
+    @param [in] rows The number of rows in the detector.
+    @param [in] cols The number of columns in the detector.
+    @returns The (rows, cols) mask array (True = masked).
+    """
+
+    with open(fn, "r") as mpf:
+        mask = getPixelMaskFromBuffer(mpf.read(), rows, cols)
+
+    lg.debug(" * Loaded %d masked pixels from '%s'." % (mask.sum(), fn))
+
+    return mask
+
+def getPixelMaskFromBuffer(buf, rows=256, cols=256):
+    """
+    Get a pixel mask array from the contents of a pixel mask file.
+
+    @param [in] buf The contents of the mask file (one tab-separated "x y" per line).
+    @param [in] rows The number of rows in the detector.
+    @param [in] cols The number of columns in the detector.
+    @returns The (rows, cols) mask array (True = masked).
+    """
+
+    ## The pixel mask array.
+    mask = np.zeros((rows, cols), dtype=bool)
+
+    for row in buf.splitlines():
+        if row.strip() == "":
+            continue
+        vals = [int(val) for val in row.strip().split("\t")]
+        mask[vals[1], vals[0]] = True
+
+    return mask
 
-    # Get the line of best fit values for the cluster.
-    m, c, sumR = k.getLineOfBestFitValues()
+def getPixelMaskArray(mask, rows=256, cols=256):
+    """
+    Get a pixel mask as a boolean detector-shaped array.
+
+    @param [in] mask A dictionary of masked pixels {X:C}, or a (rows, cols) mask array.
+    @param [in] rows The number of rows in the detector.
+    @param [in] cols The number of columns in the detector.
+    @returns The (rows, cols) mask array (True = masked).
+    """
+
+    if isinstance(mask, np.ndarray):
+        if mask.shape != (rows, cols):
+            raise IOError("BAD_PIXEL_MASK_SHAPE")
+        return mask
+
+    ## The pixel mask array.
+    mask_array = np.zeros((rows, cols), dtype=bool)
+
+    if mask is not None and len(mask) > 0:
+        mask_array.flat[np.fromiter(mask.iterkeys(), dtype=np.int64, count=len(mask))] = True
+
+    return mask_array
+
+def getKlusterPropertiesJson(klusterid, k, features=None):
+    """
+    Return a JSON containing the cluster properties.
+
+    @param [in] klusterid The cluster ID.
+    @param [in] k The cluster (or its row of a cluster table).
+    @param [in] features The feature groups to include (see getFeatureSet).
+    """
+
+    ## The feature groups to include.
+    fs = getFeatureSet(features)
+
+    # A row of a cluster table already has the properties as columns.
+    if isinstance(k, np.void):
+        p = {"id" : klusterid, "ismc" : k["ismc"].item()}
+        for f in fs:
+            for name in KLUSTER_FEATURES[f]:
+                p[name] = k[name].item()
+        return p
 
     p = {\
         "id"            : klusterid,                  \
         "size"          : k.getNumberOfPixels(),      \
-        "xmin"          : k.getXMin(),                \
-        "xmax"          : k.getXMax(),                \
-        "ymin"          : k.getYMin(),                \
-        "ymax"          : k.getYMax(),                \
-        "width"         : k.getWidth(),               \
-        "height"        : k.getHeight(),              \
-        "x_uw"          : k.getXUW(),                 \
-        "y_uw"          : k.getYUW(),                 \
-        "radius_uw"     : k.getRadiusUW(),            \
-        "density_uw"    : k.getDensityUW(),           \
-        "totalcounts"   : k.getTotalCounts(),         \
-        "maxcounts"     : k.getMaxCountValue(),       \
-        "lin_m"         : m,                          \
-        "lin_c"         : c,                          \
-        "lin_sumofres"  : sumR,                       \
-        "lin_linearity" : k.getLinearity(),           \
-        "n_edgepixels"  : k.getNumberOfEdgePixels(),  \
-        "edgefrac"      : k.getOuterPixelFraction(),  \
-        "innerfrac"     : k.getInnerPixelFraction(),  \
-        "ismc"          : k.isMC(),                   \
-        "isedgekluster" : k.isEdgeCluster()           \
+        "ismc"          : k.isMC()                    \
         #"totalenergy"   :, \
         #"maxenergy"     :, \
         #"frameid"       :\
         }
 
+    # Each group of properties is only calculated if it is requested.
+    if "extent" in fs:
+        p["xmin"]          = k.getXMin()
+        p["xmax"]          = k.getXMax()
+        p["ymin"]          = k.getYMin()
+        p["ymax"]          = k.getYMax()
+        p["width"]         = k.getWidth()
+        p["height"]        = k.getHeight()
+        p["isedgekluster"] = k.isEdgeCluster()
+
+    if "radius" in fs:
+        p["x_uw"]          = k.getXUW()
+        p["y_uw"]          = k.getYUW()
+        p["radius_uw"]     = k.getRadiusUW()
+        p["density_uw"]    = k.getDensityUW()
+
+    if "counts" in fs:
+        p["totalcounts"]   = k.getTotalCounts()
+        p["maxcounts"]     = k.getMaxCountValue()
+
+    if "linearity" in fs:
+        # Get the line of best fit values for the cluster.
+        p["lin_m"], p["lin_c"], p["lin_sumofres"] = k.getLineOfBestFitValues()
+        p["lin_linearity"] = k.getLinearity()
+
+    if "edges" in fs:
+        p["n_edgepixels"]  = k.getNumberOfEdgePixels()
+        p["edgefrac"]      = k.getOuterPixelFraction()
+        p["innerfrac"]     = k.getInnerPixelFraction()
+
     return p
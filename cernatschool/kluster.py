@@ -4,9 +4,6 @@
 #...for the logging.
 import logging as lg
 
-#...for copying.
-from copy import deepcopy
-
 #...for the MATH.
 import numpy as np
 
@@ -20,7 +17,17 @@ from datavals import *
 from pixel import *
 
 #...for the linearity calculations.
-from helpers import getLinearity, countEdgePixels
+from helpers import getLinearity, countEdgePixels, getFeatureSet, getPixelMaskArray
+
+#...for the array-based labelling.
+from labelling import getMaskedPixelMap, getOrderedPixelArrays, labelPixels
+
+#...for the batched cluster properties.
+from features import getKlusterTableFromPixels, getKlusterTableWithGammas
+
+#...for the gamma candidate classification.
+from gammas import getGammaCategory, NOT_GAMMA, \
+    MONOPIXEL, BIPIXEL, TRIPIXEL_GAMMA, TETRAPIXEL_GAMMA
 
 class Kluster:
     """
@@ -29,9 +36,10 @@ class Kluster:
     @param [in] rows The number of rows in the originating frame.
     @param [in] cols The number of columns in the originating frame.
     @param [in] ismc Is the cluster from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode ("compat" or "perpendicular").
     """
 
-    def __init__(self, rows, cols, ismc):
+    def __init__(self, rows, cols, ismc, linmode="compat"):
         """ Constructor. """
 
         lg.debug(" Instantiating a Kluster object.")
@@ -50,7 +58,7 @@ class Kluster:
         ## the list changes during iteration.)
         self.pixel_xy_list = []
 
-        ## A dictionary of the pixels {X:C} (populated after clustering).
+        ## A dictionary of the pixels {X:C} (populated during clustering).
         self.__pixel_dict = {}
 
         ## Multiline JSON entry for the pixel.
@@ -82,6 +90,12 @@ class Kluster:
         ## The unweighted cluster y position [pixels].
         self.__y_uw = None
 
+        ## The unweighted cluster radius [pixels].
+        self.__r_uw = None
+
+        ## The unweighted cluster spatial density [pixels^-2].
+        self.__rho_uw = None
+
         # Unweighted (u subsctript)
         self.r_u     = -1.0
         self.spatial_density_u = -1.0
@@ -110,11 +124,11 @@ class Kluster:
 
         # Energy.
 
-        ## Total energy [keV].
-        self.__energy_total = None
+        ## Total energy [keV] (TMP).
+        self.__energy_total = 0.0
 
-        ## Max. energy [keV].
-        self.__energy_max = None
+        ## Max. energy [keV] (TMP).
+        self.__energy_max = 0.0
 
         # Edge pixel information.
 
@@ -130,9 +144,15 @@ class Kluster:
         ## Is the cluster from Monte Carlo simulation?
         self.__is_mc = ismc
 
+        ## The linearity fitting mode.
+        self.__linmode = linmode
+
         ## Is the cluster on the edge of the frames?
         self.__is_edge_kluster = None
 
+        ## The gamma candidate category (see gammas.py).
+        self.__gamma = None
+
     def __lt__(self, other):
         return self.getNumberOfPixels() < other.getNumberOfPixels()
 
@@ -140,11 +160,15 @@ class Kluster:
         return self.pixel_xy_list
 
     def insert(self, pixel_xy, pixel):
+        self.addPixel(pixel_xy, pixel.getC())
+
+    def addPixel(self, pixel_xy, C):
         self.pixel_xy_list.append(pixel_xy)
-        self.total_counts += pixel.getC()
+        self.__pixel_dict[pixel_xy] = C
+        self.total_counts += C
 
     def contains_pixel(self, pixel_xy):
-        return pixel_xy in self.pixel_xy_list
+        return pixel_xy in self.__pixel_dict
 
     def getNumberOfPixels(self):
         return len(self.pixel_xy_list)
@@ -153,48 +177,55 @@ class Kluster:
         return self.total_counts
 
     def getWidth(self):
-        if self.__width is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__width is None: self.processExtent()
         return self.__width
 
     def getHeight(self):
-        if self.__height is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__height is None: self.processExtent()
         return self.__height
 
     def getXMin(self):
-        if self.__xmin is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__xmin is None: self.processExtent()
         return self.__xmin
 
     def getXMax(self):
-        if self.__xmax is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__xmax is None: self.processExtent()
         return self.__xmax
 
     def getYMin(self):
-        if self.__ymin is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__ymin is None: self.processExtent()
         return self.__ymin
 
     def getYMax(self):
-        if self.__ymax is None: raise IOError("UNPROCESSED_KLUSTER")
+        if self.__ymax is None: self.processExtent()
         return self.__ymax
 
     def getXUW(self):
+        if self.__x_uw is None: self.processRadius()
         return self.__x_uw
 
     def getYUW(self):
+        if self.__y_uw is None: self.processRadius()
         return self.__y_uw
 
     def getRadiusUW(self):
+        if self.__r_uw is None: self.processRadius()
         return self.__r_uw
 
     def getDensityUW(self):
+        if self.__rho_uw is None: self.processRadius()
         return self.__rho_uw
 
     def getMaxCountValue(self):
+        if self.__count_max is None: self.processCounts()
         return self.__count_max
 
     def getLineOfBestFitValues(self):
+        if self.__linearity is None: self.processLinearity()
         return self.__lin_m, self.__lin_c, self.__lin_sumR
 
     def getLinearity(self):
+        if self.__linearity is None: self.processLinearity()
         return self.__linearity
 
     def getTotalEnergy(self):
@@ -204,83 +235,72 @@ class Kluster:
         return self.__energy_max
 
     def getNumberOfEdgePixels(self):
+        if self.__n_edge is None: self.processEdges()
         return self.__n_edge
 
     def getInnerPixelFraction(self):
+        if self.__n_edge is None: self.processEdges()
         return self.__inner_pixels_frac
 
     def getOuterPixelFraction(self):
+        if self.__n_edge is None: self.processEdges()
         return self.__outer_pixels_frac
 
     def isEdgeCluster(self):
+        if self.__is_edge_kluster is None: self.processExtent()
         return self.__is_edge_kluster
 
     def isMC(self):
         return self.__is_mc
 
-    def isGamma(self):
-        """ Is the cluster a gamma candidate? """
-        npix = self.getNumberOfPixels()
-        rad = self.getRadiusUW()
-        return npix == 1 or npix == 2 or (npix==3 and rad<TRIPIXEL_RADIUS) or (npix==4 and rad<TETRAPIXEL_RADIUS)
-
-    def process(self, pixels):
-        #
-        # Note that the pixels are stored in and obtained from the KlusterFinder.
-
-        # Start the string for the pixel JSON
-        self.pixels_string  = "pixels = [\n"
-
-        xs = []
+    def getGammaCategory(self):
+        if self.__gamma is None:
+            self.__gamma = getGammaCategory(self.pixel_xy_list, self.__frame_cols)
+        return self.__gamma
 
-        ys = []
+    def setGammaCategory(self, category):
+        self.__gamma = category
 
-        cs = []
-
-        # Loop over the pixels found in the clustering process.
-        #for bxy in self.pixel_xy_list:
-        for X in self.pixel_xy_list:
-
-            x = float(pixels[X].get_x())
-
-            y = float(pixels[X].get_y())
-
-            c = float(pixels[X].getC())
-
-            xs.append(x)
-
-            ys.append(y)
-
-            cs.append(c)
+    def isGamma(self):
+        """ Is the cluster a gamma candidate? """
+        return self.getGammaCategory() != NOT_GAMMA
 
-            # Add the pixel to the pixel JSON text.
-            self.pixels_string += "  " + pixels[X].pixel_entry()
+    # Note that the pixel counts are stored as the pixels are added, and
+    # that each group of properties is only calculated when it is first
+    # needed (then cached).
 
-            # Add to the cluster's own pixel dictionary.
-            self.__pixel_dict[X] = c
+    def processExtent(self):
+        """ Calculate the cluster extent (and whether it is on the frame edge). """
 
+        xs = [X % self.__frame_cols for X in self.pixel_xy_list]
 
-        # End the string for the pixel JSON
-        self.pixels_string += "]"
+        ys = [X / self.__frame_cols for X in self.pixel_xy_list]
 
-        self.__xmin = min(xs)
+        self.__xmin = float(min(xs))
 
-        self.__xmax = max(xs)
+        self.__xmax = float(max(xs))
 
-        self.__ymin = min(ys)
+        self.__ymin = float(min(ys))
 
-        self.__ymax = max(ys)
+        self.__ymax = float(max(ys))
 
         self.__width = self.__xmax - self.__xmin + 1
 
         self.__height = self.__ymax - self.__ymin + 1
 
+        if 0 in xs or 0 in ys or 255 in xs or 255 in ys:
+            self.__is_edge_kluster = True
+        else:
+            self.__is_edge_kluster = False
+
+    def processRadius(self):
+        """ Calculate the unweighted cluster position, radius and density. """
+
         ## The unweighted cluster x position [pixels].
-        self.__x_uw = np.mean(xs)
+        self.__x_uw = np.mean([float(X % self.__frame_cols) for X in self.pixel_xy_list])
 
         ## The unweighted cluster y position [pixels].
-        self.__y_uw = np.mean(ys)
-
+        self.__y_uw = np.mean([float(X / self.__frame_cols) for X in self.pixel_xy_list])
 
         # Calculate the cluster radius
         #------------------------------
@@ -298,35 +318,57 @@ class Kluster:
         else:
             self.__rho_uw = 0.0
 
-
-        # Cluster counts
-        #----------------
+    def processCounts(self):
+        """ Calculate the cluster counts properties. """
 
         ## The total counts in the cluster.
         self.__total_counts = self.getTotalCounts()
 
         ## The maximum count value in the cluster.
-        self.__count_max = max(cs)
+        self.__count_max = float(max(self.__pixel_dict.values()))
 
-        # Linearity information
-        #-----------------------
-        self.__lin_m, self.__lin_c, self.__lin_sumR, self.__linearity = getLinearity(self.__pixel_dict)
+    def processLinearity(self):
+        """ Calculate the cluster's line of best fit and linearity. """
+
+        self.__lin_m, self.__lin_c, self.__lin_sumR, self.__linearity = getLinearity(self.__pixel_dict, self.__linmode, self.__frame_cols)
+
+    def processEdges(self):
+        """ Calculate the cluster's edge pixel information. """
 
-        # Edge pixel information.
         self.__n_edge = countEdgePixels(self.__pixel_dict, self.__frame_rows, self.__frame_cols)
 
         self.__outer_pixels_frac = float(self.__n_edge)/float(len(self.__pixel_dict))
 
         self.__inner_pixels_frac = 1.0 - self.__outer_pixels_frac
 
-        if 0 in xs or 0 in ys or 255 in xs or 255 in ys:
-            self.__is_edge_kluster = True
-        else:
-            self.__is_edge_kluster = False
+    def process(self):
+        """ Calculate (and log) all of the cluster properties. """
 
-        # TMP
-        self.__energy_total = 0.0
-        self.__energy_max = 0.0
+        # Start the string for the pixel JSON
+        self.pixels_string  = "pixels = [\n"
+
+        # Loop over the pixels found in the clustering process.
+        for X in self.pixel_xy_list:
+
+            # Add the pixel to the pixel JSON text.
+            self.pixels_string += "  {\"x\":%d, \"y\":%d, \"c\":%d},\n" % \
+                (X % self.__frame_cols, X / self.__frame_cols, self.__pixel_dict[X])
+
+        # End the string for the pixel JSON
+        self.pixels_string += "]"
+
+        self.processExtent()
+
+        self.processRadius()
+
+        self.processCounts()
+
+        # Linearity information
+        #-----------------------
+        self.processLinearity()
+
+        # Edge pixel information.
+        self.processEdges()
 
         lg.debug("*")
         lg.debug("* NEW CLUSTER:")
@@ -360,6 +402,55 @@ class Kluster:
         lg.debug("* Number of edge pixels    = %5d" % (self.__n_edge))
         lg.debug("*")
 
+    def processFromTable(self, row, features=None):
+        """
+        Set the cluster properties from a row of the frame's cluster table.
+
+        Only the feature groups that were computed for the table are set;
+        the others are still calculated on demand.
+
+        @param [in] row The cluster's row of the cluster table.
+        @param [in] features The feature groups computed (None for all).
+        """
+
+        if features is None: features = KLUSTER_FEATURES
+
+        if "extent" in features:
+
+            self.__xmin, self.__xmax = float(row["xmin"]), float(row["xmax"])
+
+            self.__ymin, self.__ymax = float(row["ymin"]), float(row["ymax"])
+
+            self.__width, self.__height = float(row["width"]), float(row["height"])
+
+            self.__is_edge_kluster = bool(row["isedgekluster"])
+
+        if "radius" in features:
+
+            self.__x_uw, self.__y_uw = row["x_uw"], row["y_uw"]
+
+            self.__r_uw, self.__rho_uw = row["radius_uw"], row["density_uw"]
+
+        if "counts" in features:
+
+            self.__total_counts = int(row["totalcounts"])
+
+            self.__count_max = float(row["maxcounts"])
+
+        if "linearity" in features:
+
+            self.__lin_m, self.__lin_c = row["lin_m"], row["lin_c"]
+
+            self.__lin_sumR, self.__linearity = row["lin_sumofres"], row["lin_linearity"]
+
+        if "edges" in features:
+
+            self.__n_edge = int(row["n_edgepixels"])
+
+            self.__outer_pixels_frac = row["edgefrac"]
+
+            self.__inner_pixels_frac = row["innerfrac"]
+
     def getKlusterPropertiesJson(self):
 
         m, c, sumR = self.getLineOfBestFitValues()
@@ -397,6 +488,199 @@ class Kluster:
         return self.__pixel_dict
 
 
+class CompactKluster(object):
+    """
+    A compact, array-backed cluster (used by the labelling engine).
+
+    The pixels are held as two contiguous slices of the frame's pixel
+    arrays - the pixel indices (sorted, so that membership is a binary
+    search) and their counts. The properties live in the frame's cluster
+    table; feature groups that weren't computed for the table are
+    calculated (and written to the table) when they are first needed.
+
+    @param [in] rows The number of rows in the originating frame.
+    @param [in] cols The number of columns in the originating frame.
+    @param [in] ismc Is the cluster from a Monte Carlo simulation?
+    @param [in] linmode The linearity fitting mode ("compat" or "perpendicular").
+    @param [in] xys The cluster's (sorted) pixel index array slice.
+    @param [in] cs The cluster's pixel count array slice.
+    @param [in] table The frame's cluster table.
+    @param [in] index The cluster's row in the cluster table.
+    @param [in] done The feature groups already in the cluster table.
+    """
+
+    __slots__ = ("__frame_rows", "__frame_cols", "__is_mc", "__linmode", \
+        "__xys", "__cs", "__table", "__index", "__done")
+
+    def __init__(self, rows, cols, ismc, linmode, xys, cs, table, index, done):
+        """ Constructor. """
+
+        ## The number of rows in the frame.
+        self.__frame_rows = rows
+
+        ## The number of columns in the frame.
+        self.__frame_cols = cols
+
+        ## Is the cluster from Monte Carlo simulation?
+        self.__is_mc = ismc
+
+        ## The linearity fitting mode.
+        self.__linmode = linmode
+
+        ## The pixel indices (X = y*cols + x), in ascending order.
+        self.__xys = xys
+
+        ## The pixel counts.
+        self.__cs = cs
+
+        ## The frame's cluster table.
+        self.__table = table
+
+        ## The cluster's row in the cluster table.
+        self.__index = index
+
+        ## The feature groups that have been computed for the cluster.
+        self.__done = done
+
+    def __lt__(self, other):
+        return self.getNumberOfPixels() < other.getNumberOfPixels()
+
+    def __getValue(self, group, name):
+        """ Get a property from the cluster table (computing it if needed). """
+        if group not in self.__done: self.processFeatures([group])
+        return self.__table[name][self.__index]
+
+    def get_pixel_xy_list(self):
+        return self.__xys.tolist()
+
+    def contains_pixel(self, pixel_xy):
+        i = np.searchsorted(self.__xys, pixel_xy)
+        return i < len(self.__xys) and self.__xys[i] == pixel_xy
+
+    def getNumberOfPixels(self):
+        return len(self.__xys)
+
+    def getTotalCounts(self):
+        return int(self.__cs.sum())
+
+    def getWidth(self):
+        return float(self.__getValue("extent", "width"))
+
+    def getHeight(self):
+        return float(self.__getValue("extent", "height"))
+
+    def getXMin(self):
+        return float(self.__getValue("extent", "xmin"))
+
+    def getXMax(self):
+        return float(self.__getValue("extent", "xmax"))
+
+    def getYMin(self):
+        return float(self.__getValue("extent", "ymin"))
+
+    def getYMax(self):
+        return float(self.__getValue("extent", "ymax"))
+
+    def getXUW(self):
+        return self.__getValue("radius", "x_uw")
+
+    def getYUW(self):
+        return self.__getValue("radius", "y_uw")
+
+    def getRadiusUW(self):
+        return self.__getValue("radius", "radius_uw")
+
+    def getDensityUW(self):
+        return self.__getValue("radius", "density_uw")
+
+    def getMaxCountValue(self):
+        return float(self.__getValue("counts", "maxcounts"))
+
+    def getLineOfBestFitValues(self):
+        return self.__getValue("linearity", "lin_m"), self.__getValue("linearity", "lin_c"), \
+            self.__getValue("linearity", "lin_sumofres")
+
+    def getLinearity(self):
+        return self.__getValue("linearity", "lin_linearity")
+
+    def getTotalEnergy(self):
+        return 0.0
+
+    def getMaxEnergy(self):
+        return 0.0
+
+    def getNumberOfEdgePixels(self):
+        return int(self.__getValue("edges", "n_edgepixels"))
+
+    def getInnerPixelFraction(self):
+        return self.__getValue("edges", "innerfrac")
+
+    def getOuterPixelFraction(self):
+        return self.__getValue("edges", "edgefrac")
+
+    def isEdgeCluster(self):
+        return bool(self.__getValue("extent", "isedgekluster"))
+
+    def isMC(self):
+        return self.__is_mc
+
+    def getGammaCategory(self):
+        return int(self.__table["gamma"][self.__index])
+
+    def isGamma(self):
+        """ Is the cluster a gamma candidate? """
+        return self.getGammaCategory() != NOT_GAMMA
+
+    def processFeatures(self, features):
+        """
+        Calculate feature groups for this cluster and store them in the table.
+
+        @param [in] features The feature groups to calculate.
+        """
+
+        ## The cluster's properties, as a one-row cluster table.
+        t = getKlusterTableFromPixels(np.zeros(len(self.__xys), dtype=np.int64), self.__xys, self.__cs, 1, \
+            self.__frame_rows, self.__frame_cols, self.__is_mc, self.__linmode, features)
+
+        for f in features:
+            for name in KLUSTER_FEATURES[f]:
+                self.__table[name][self.__index] = t[name][0]
+
+        self.__done = self.__done | frozenset(features)
+
+    def process(self):
+        """ Calculate all of the cluster properties. """
+        self.processFeatures([f for f in KLUSTER_FEATURES if f not in self.__done])
+
+    def getKlusterPropertiesJson(self):
+
+        m, c, sumR = self.getLineOfBestFitValues()
+
+        p = {\
+            "size"          : self.getNumberOfPixels(), \
+            "xmin"          : self.getXMin(),           \
+            "xmax"          : self.getXMax(),           \
+            "ymin"          : self.getYMin(),           \
+            "ymax"          : self.getYMax(),           \
+            "width"         : self.getWidth(),          \
+            "height"        : self.getHeight(),         \
+            "x_uw"          : self.getXUW(),            \
+            "y_uw"          : self.getYUW(),            \
+            "radius_uw"     : self.getRadiusUW(),       \
+            "density_uw"    : self.getDensityUW(),      \
+            "totalcounts"   : self.getTotalCounts(),    \
+            "maxcounts"     : self.getMaxCountValue(),  \
+            "lin_m"         : m,                        \
+            "lin_c"         : c,                        \
+            "lin_sumofres"  : sumR,                     \
+            "lin_linearity" : self.getLinearity(),      \
+            }
+        return p
+
+    def getPixelMap(self):
+        return dict(zip(self.__xys.tolist(), self.__cs.tolist()))
+
+
 class KlusterFinder:
     """
     Finds Klusters (blobs) in Timepix frames.
@@ -407,7 +691,7 @@ class KlusterFinder:
     dir_x = [-1, -1,  0,  1,  1,  1,  0, -1]
     dir_y = [ 0,  1,  1,  1,  0, -1, -1, -1]
 
-    def __init__(self, data, r, c, ismc, maskdict={}):
+    def __init__(self, data, r, c, ismc, maskdict={}, engine="pixel", linmode="compat", features=None, gammas=True, threshold=AUTO_ENGINE_OCCUPANCY, labels=None):
 
         """
         Constructor.
@@ -416,7 +700,18 @@ class KlusterFinder:
         @param [in] r The number of rows in the originating frame.
         @param [in] c The number of columns in the originating frame.
         @param [in] ismc Is the cluster from simulated data?
-        @param [in] maskdict A dictionary of masked pixels.
+        @param [in] maskdict A dictionary (or boolean (r, c) array) of masked pixels.
+        @param [in] engine The clustering engine ("pixel", "label" or "auto").
+        @param [in] linmode The linearity fitting mode ("compat" or "perpendicular").
+        @param [in] features The cluster feature groups to compute up front
+                             (see helpers.getFeatureSet); others are lazy.
+        @param [in] gammas Compute the cluster table for gamma candidates too?
+        @param [in] threshold The occupancy above which "auto" uses labelling.
+        @param [in] labels Precomputed (ids, n, table) for the labelling engine -
+                           the cluster ID of each unmasked pixel (in the order of
+                           labelling.getOrderedPixelArrays), the number of
+                           clusters and their cluster table (or None). If given,
+                           they are used whichever engine is chosen.
         """
         lg.debug(""); lg.debug(" Instantiating a cluster finder object."); lg.debug("")
 
@@ -433,13 +728,146 @@ class KlusterFinder:
         ## Are we looking at simulated data?
         self.__is_mc = ismc
 
-        self.__pixel_map = deepcopy(data)
+        ## The pixel mask array.
+        mask = getPixelMaskArray(maskdict, self.rows, self.cols)
+
+        ## The (unmasked) pixel data.
+        self.__pixel_map = getMaskedPixelMap(data, mask)
+
+        if engine not in KLUSTER_ENGINES:
+            raise IOError("BAD_KLUSTER_ENGINE")
+
+        # Choose the engine from the frame occupancy - the neighbour search
+        # is quicker for very sparse frames, labelling for the rest.
+        if engine == "auto":
+            engine = "label" if len(self.__pixel_map) > threshold * r * c else "pixel"
+            lg.debug(" * Using the '%s' clustering engine (occupancy %d/%d)." % \
+                (engine, len(self.__pixel_map), r * c))
+
+        ## The clustering engine used.
+        self.__engine = engine
+
+        if linmode not in LINEARITY_MODES:
+            raise IOError("BAD_LINEARITY_MODE")
+
+        ## The linearity fitting mode.
+        self.__linmode = linmode
+
+        ## The cluster feature groups to compute for the cluster table.
+        self.__features = getFeatureSet(features)
 
-        # Remove the masked pixels from the data.
-        if maskdict is not None:
-            for X in maskdict:
-                if X in self.__pixel_map.keys():
-                    del self.__pixel_map[X]
+        ## Compute the cluster table for the gamma candidates?
+        self.__process_gammas = gammas
+
+        ## The precomputed cluster IDs and table (if there are any).
+        self.__labels = labels
+
+        ## The cluster table (label engine only).
+        self.__table = None
+
+        # Precomputed labels (e.g. from the frame cache) are used whichever
+        # engine would have found them.
+        if engine == "label" or labels is not None:
+            self.findKlustersByLabel()
+        else:
+            self.findKlustersByPixel()
+
+        ## The number of gamma candidates.
+        self.__n_gammas = 0
+
+        ## The number of monopixel candidates.
+        self.__n_g1 = 0
+
+        ## The number of bipixel candidates.
+        self.__n_g2 = 0
+
+        ## The number of tripixel candidates.
+        self.__n_g3 = 0
+
+        ## The number of tetrapixel candidates.
+        self.__n_g4 = 0
+
+        # Count the gamma candidates (classified from their shapes) -
+        # we won't store these so we need to know the numbers.
+        for b in self.blob_list:
+
+            g = b.getGammaCategory()
+
+            if   g == MONOPIXEL:
+                self.__n_g1 += 1
+            elif g == BIPIXEL:
+                self.__n_g2 += 1
+            elif g == TRIPIXEL_GAMMA:
+                self.__n_g3 += 1
+            elif g == TETRAPIXEL_GAMMA:
+                self.__n_g4 += 1
+
+        self.__n_gammas = self.__n_g1 + self.__n_g2 + self.__n_g3 + self.__n_g4
+
+        # Sort the cluster list by cluster size (the labelling engine's
+        # clusters and table are already in this order).
+        self.blob_list.sort(reverse=True)
+
+    def findKlustersByLabel(self):
+        """
+        Find the blobs by labelling the frame's occupancy array.
+
+        The blobs are ordered by size and then by their first pixel in
+        the pixel map, as they are by findKlustersByPixel. Each blob is
+        a CompactKluster backed by slices of the frame's pixel arrays
+        and a row of the cluster table.
+        """
+
+        Xs, Cs = getOrderedPixelArrays(self.__pixel_map)
+
+        ## The precomputed cluster table (if there is one).
+        table = None
+
+        if self.__labels is not None:
+            ids, n, table = self.__labels
+        else:
+            ids, n = labelPixels(Xs, self.rows, self.cols)
+
+        ## The number of pixels in each cluster.
+        sizes = np.bincount(ids, minlength=n)
+
+        # Renumber the clusters in (stable) descending size order.
+        order = np.argsort(-sizes, kind="mergesort")
+
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+
+        ids = rank[ids]
+
+        sizes = sizes[order]
+
+        # Group the pixels by cluster, in ascending pixel index order.
+        bycluster = np.lexsort((Xs, ids))
+
+        ids, Xs, Cs = ids[bycluster], Xs[bycluster], Cs[bycluster]
+
+        if table is not None:
+            self.__table = table[order]
+        else:
+            self.__table = getKlusterTableWithGammas(ids, Xs, Cs, n, self.rows, self.cols, \
+                self.__is_mc, self.__linmode, self.__features, self.__process_gammas)
+
+        ## The gamma candidate category of each cluster.
+        cats = self.__table["gamma"]
+
+        ## The feature groups in the table for processed and unprocessed clusters.
+        done, notdone = self.__features, frozenset(["size"])
+
+        ## The start of each cluster's pixels in the arrays.
+        starts = np.concatenate(([0], np.cumsum(sizes))).tolist()
+
+        for i, g in enumerate(cats.tolist()):
+            self.insert(CompactKluster(self.rows, self.cols, self.__is_mc, self.__linmode, \
+                Xs[starts[i]:starts[i+1]], Cs[starts[i]:starts[i+1]], self.__table, i, \
+                done if (g == NOT_GAMMA or self.__process_gammas) else notdone))
+
+    def findKlustersByPixel(self):
+        """ Find the blobs by growing them from each pixel's neighbours. """
 
         #print "DEBUG: Data supplied has %6d pixels." % \
         #  (len(data))
@@ -493,7 +921,7 @@ class KlusterFinder:
             #  (p.get_x(),p.get_y(),p.get_c(),p.get_mask())
             # Start a new blob if the pixel hasn't been blobed yet.
             if p.get_mask() == -1:
-                blob = Kluster(self.rows, self.cols, self.__is_mc)
+                blob = Kluster(self.rows, self.cols, self.__is_mc, self.__linmode)
                 p.set_mask(0)
                 #print "DEBUG: Mask set to %3d" % (p.get_mask())
                 blob.insert(xy, p)
@@ -509,7 +937,7 @@ class KlusterFinder:
                             # (self.pixels[bxy].get_mask() + 2.0 ** direction)
                             # If the Pixel isn't already in the Kluster, add it.
                             if not blob.contains_pixel(nxy):
-                                blob.insert(nxy, self.pixels[bxy])
+                                blob.insert(nxy, self.pixels[nxy])
                             # end of Pixel presence check.
                         # end of Pixel neighbour in direction existence check.
                 # end of loop over the directions.
@@ -527,51 +955,16 @@ class KlusterFinder:
             # end of loop over blobs
             print "DEBUG:------------------------------"
 
-        ## The number of gamma candidates.
-        self.__n_gammas = 0
-
-        ## The number of monopixel candidates.
-        self.__n_g1 = 0
-
-        ## The number of bipixel candidates.
-        self.__n_g2 = 0
-
-        ## The number of tripixel candidates.
-        self.__n_g3 = 0
-
-        ## The number of tetrapixel candidates.
-        self.__n_g4 = 0
-
-        # Calculate the blob properties
-        for b in self.blob_list:
-            b.process(self.pixels)
-
-            # Count the gamma candidates - we won't store these so we need to
-            # know the numbers.
-            if   b.getNumberOfPixels() == 1:
-                self.__n_g1 += 1
-            # Bipixel gamma.
-            elif b.getNumberOfPixels() == 2:
-                self.__n_g2 += 1
-            # Tripixel...
-            elif b.getNumberOfPixels() == 3:
-                # Tripixel gamma.
-                if b.r_u < TRIPIXEL_RADIUS: #0.75
-                    self.__n_g3 += 1
-            # Tetrapixel...
-            elif b.getNumberOfPixels() == 4:
-                # Tetrapixel gamma.
-                if b.r_u < TETRAPIXEL_RADIUS: #0.71
-                    self.__n_g4 += 1
-
-            self.__n_gammas = self.__n_g1 + self.__n_g2 + self.__n_g3 + self.__n_g4
-
-        # Sort the cluster list by cluster size.
-        self.blob_list.sort(reverse=True)
-
     def insert(self, blob):
         self.blob_list.append(blob)
 
+    def getEngine(self):
+        return self.__engine
+
+    def getKlusterTable(self):
+        """ Get the cluster table, ordered as the list of clusters. """
+        return self.__table
+
     def getNumberOfKlusters(self):
         return len(self.blob_list)
 
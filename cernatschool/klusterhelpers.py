@@ -7,14 +7,25 @@ import os
 #...for the logging.
 import logging as lg
 
-# Import the JSON library.
-import json
+#...for the MATH.
+import numpy as np
+
+#...for reading the cluster information (in any output format).
+from readers import getKlusterColumns
+
+## The cluster properties used.
+KLUSTER_PROPERTY_COLUMNS = ["isedgekluster", "size", "radius_uw", "density_uw", "lin_linearity", "innerfrac", "totalcounts", "maxcounts"]
 
 class KlusterProperties:
     """ A wrapper class for cluster properties. """
 
     def __init__(self, jsonpath):
-        """ Constructor. """
+        """
+        Constructor.
+
+        @param [in] jsonpath The path to the cluster information (JSON Lines, gzipped JSON Lines
+                             or JSON), or to the cluster information columns folder.
+        """
 
         ## Path to the cluster JSON file.
         self.__json_path = jsonpath
@@ -22,43 +33,26 @@ class KlusterProperties:
         if not os.path.exists(self.__json_path):
             raise IOError("* ERROR: '%s' does not exist!" % (self.__json_path))
 
-        kf = open(self.__json_path, "r")
-
-        ## The cluster JSON.
-        self.__json = json.load(kf)
-
-        kf.close()
+        ## The cluster property columns used.
+        columns = getKlusterColumns(self.__json_path, KLUSTER_PROPERTY_COLUMNS)
 
         lg.info(" *")
         lg.info(" * Initialising KlusterProperties object from '%s'." % (self.__json_path))
         lg.info(" *")
 
-        # Get the cluster properties.
-
-        ## The list of clusters.
-        self.__klusters = []
-
-        # Create container lists for the cluster properties.
-        self.__cluster_size      = []
-        self.__cluster_counts    = []
-        self.__cluster_maxcounts = []
-        self.__cluster_radius_u  = []
-        self.__cluster_density_u = []
-        self.__cluster_linearity = []
-        self.__cluster_innerfrac = []
-
-        # Loop over the klusters.
-        for k in self.__json:
-
-            # Add to the cluster property dictionaries.
-            if not k["isedgekluster"]:
-                self.__cluster_size.append(     k["size"])
-                self.__cluster_radius_u.append( k["radius_uw"])
-                self.__cluster_density_u.append(k["density_uw"])
-                self.__cluster_linearity.append(k["lin_linearity"])
-                self.__cluster_innerfrac.append(k["innerfrac"])
-                self.__cluster_counts.append(   k["totalcounts"])
-                self.__cluster_maxcounts.append(k["maxcounts"])
+        # Get the cluster properties (of the clusters not on the edge of the frame).
+
+        ## The clusters not on the edge of the frame.
+        inner = np.logical_not(np.asarray(columns["isedgekluster"], dtype=bool))
+
+        # Create the cluster property lists.
+        self.__cluster_size      = columns["size"][inner].tolist()
+        self.__cluster_counts    = columns["totalcounts"][inner].tolist()
+        self.__cluster_maxcounts = columns["maxcounts"][inner].tolist()
+        self.__cluster_radius_u  = columns["radius_uw"][inner].tolist()
+        self.__cluster_density_u = columns["density_uw"][inner].tolist()
+        self.__cluster_linearity = columns["lin_linearity"][inner].tolist()
+        self.__cluster_innerfrac = columns["innerfrac"][inner].tolist()
 
     def get_number_of_klusters(self):
         return len(self.__cluster_size)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Array-based connected-component labelling for Timepix frames.
+"""
+
+#...for the logging.
+import logging as lg
+
+#...for the MATH.
+import numpy as np
+
+#...for the labelling.
+from scipy import ndimage
+
+## The structuring element for 8-connected (king's move) labelling.
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+## The structuring element for labelling a stack of frames - 8-connected
+## within each frame and never connected between frames.
+STACKED_EIGHT_CONNECTED = np.zeros((3, 3, 3), dtype=bool)
+STACKED_EIGHT_CONNECTED[1] = EIGHT_CONNECTED
+
+def getPixelArrays(pixelmap):
+    """
+    Convert a pixel dictionary into pixel index and count arrays.
+
+    The arrays are returned in the dictionary's iteration order.
+
+    @param [in] pixelmap A dictionary of pixel {X:C} values.
+    @returns Xs The pixel index (X = y*cols + x) array.
+    @returns Cs The pixel count array.
+    """
+
+    ## The number of pixels.
+    n = len(pixelmap)
+
+    Xs = np.fromiter(pixelmap.iterkeys(), dtype=np.int64, count=n)
+
+    Cs = np.fromiter(pixelmap.itervalues(), dtype=np.int64, count=n)
+
+    return Xs, Cs
+
+def getMaskedPixelMap(pixelmap, mask=None):
+    """
+    Remove the masked pixels from a pixel dictionary.
+
+    The pixels are copied one at a time before the masked pixels are
+    removed, as the original KlusterFinder's deep copy of the data did.
+    The layout of the copy sets the order in which the blobs are found,
+    and so the order (and IDs) of clusters of the same size.
+
+    @param [in] pixelmap A dictionary of pixel {X:C} values.
+    @param [in] mask The boolean (rows, cols) pixel mask array (or None).
+    @returns A copy of the pixel map without the masked pixels.
+    """
+
+    ## The copy of the pixel map.
+    pm = dict((X, C) for X, C in pixelmap.iteritems())
+
+    if mask is None or len(pm) == 0:
+        return pm
+
+    Xs, Cs = getPixelArrays(pixelmap)
+
+    # (Removing a pixel doesn't change the order of the others.)
+    for X in Xs[mask.flat[Xs]].tolist():
+        del pm[X]
+
+    return pm
+
+def getOrderedPixelArrays(pixelmap):
+    """
+    Get a frame's pixel arrays in the order the neighbour search visits them.
+
+    The pixels are re-inserted one at a time so that they are in the
+    same order as the pixel-by-pixel KlusterFinder's map of Pixels.
+
+    @param [in] pixelmap A dictionary of pixel {X:C} values.
+    @returns Xs The pixel index (X = y*cols + x) array.
+    @returns Cs The pixel count array.
+    """
+
+    return getPixelArrays(dict((X, C) for X, C in pixelmap.iteritems()))
+
+def getLabelImage(Xs, rows, cols):
+    """
+    Label the 8-connected components of a frame's hit pixels.
+
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @returns labels The (rows, cols) label array (0 = no cluster).
+    @returns n The number of clusters found.
+    """
+
+    ## The frame occupancy image.
+    occupancy = np.zeros((rows, cols), dtype=bool)
+
+    occupancy.flat[Xs] = True
+
+    labels, n = ndimage.label(occupancy, structure=EIGHT_CONNECTED)
+
+    lg.debug(" * Labelling found %d clusters in %d pixels." % (n, len(Xs)))
+
+    return labels, n
+
+def labelPixels(Xs, rows, cols):
+    """
+    Assign a cluster ID to each hit pixel.
+
+    Cluster IDs run from 0 to n-1 in order of each cluster's first
+    pixel in Xs, which matches the order in which the pixel-by-pixel
+    KlusterFinder creates its blobs.
+
+    @param [in] Xs The pixel index (X = y*cols + x) array.
+    @param [in] rows The number of rows in the frame.
+    @param [in] cols The number of columns in the frame.
+    @returns ids The cluster ID of each pixel in Xs.
+    @returns n The number of clusters found.
+    """
+
+    labels, n = getLabelImage(Xs, rows, cols)
+
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), 0
+
+    return getFirstAppearanceIds(labels.flat[Xs], n), n
+
+def getFirstAppearanceIds(hitlabels, n):
+    """
+    Renumber (1-based) labels 0 to n-1 in order of their first appearance.
+
+    @param [in] hitlabels The label of each hit pixel.
+    @param [in] n The number of labels.
+    @returns The renumbered cluster ID of each hit pixel.
+    """
+
+    # Find where each label first appears and renumber in that order.
+    first = np.full(n + 1, len(hitlabels), dtype=np.int64)
+    np.minimum.at(first, hitlabels, np.arange(len(hitlabels)))
+
+    ## The map from label to first-appearance ordered cluster ID.
+    relabel = np.empty(n + 1, dtype=np.int64)
+    relabel[np.argsort(first[1:], kind="mergesort") + 1] = np.arange(n)
+
+    return relabel[hitlabels]
+
+def labelFrameStack(occupancy):
+    """
+    Label the 8-connected components of a stack of frames in one pass.
+
+    Clusters are never joined across frames.
+
+    @param [in] occupancy The (N, rows, cols) array of hits (non-zero = hit).
+    @returns labels The (N, rows, cols) label array (0 = no cluster).
+    @returns n The number of clusters found in all of the frames.
+    """
+
+    labels, n = ndimage.label(occupancy, structure=STACKED_EIGHT_CONNECTED)
+
+    lg.debug(" * Labelling found %d clusters in %d frames." % (n, len(occupancy)))
+
+    return labels, n
+
+def getStackPixelArrays(counts):
+    """
+    Convert an (N, rows, cols) stack of frames into concatenated pixel arrays.
+
+    @param [in] counts The (N, rows, cols) pixel count array (0 = no hit).
+    @returns Xs The concatenated pixel index (X = y*cols + x) array.
+    @returns Cs The concatenated pixel count array.
+    @returns offsets The (N+1) offsets of each frame's pixels in Xs.
+    """
+
+    N, rows, cols = counts.shape
+
+    ## The hit pixels' indices in the stack of frames.
+    SXs = np.flatnonzero(counts)
+
+    ## The offsets of each frame's pixels.
+    offsets = np.searchsorted(SXs, np.arange(N + 1) * (rows * cols))
+
+    return SXs % (rows * cols), counts.flat[SXs].astype(np.int64), offsets
+
+def labelPixelStack(Xs, offsets, rows, cols):
+    """
+    Assign a cluster ID to each hit pixel of a batch of frames.
+
+    The frames' pixels are concatenated, frame i's pixels being
+    Xs[offsets[i]:offsets[i+1]]. Cluster IDs run from 0 to n-1 in order
+    of each cluster's first pixel, so each frame's clusters are
+    numbered in the same order as labelPixels would give them.
+
+    @param [in] Xs The concatenated pixel index (X = y*cols + x) array.
+    @param [in] offsets The (N+1) offsets of each frame's pixels in Xs.
+    @param [in] rows The number of rows in each frame.
+    @param [in] cols The number of columns in each frame.
+    @returns ids The cluster ID of each pixel in Xs.
+    @returns koffsets The (N+1) offsets of each frame's cluster IDs.
+    """
+
+    ## The number of frames.
+    N = len(offsets) - 1
+
+    ## The frame of each pixel.
+    frames = np.repeat(np.arange(N), np.diff(offsets))
+
+    ## The pixel indices in the stack of frames.
+    SXs = (frames * (rows * cols)) + Xs
+
+    ## The occupancy of the stack of frames.
+    occupancy = np.zeros((N, rows, cols), dtype=bool)
+
+    occupancy.flat[SXs] = True
+
+    labels, n = labelFrameStack(occupancy)
+
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(N + 1, dtype=np.int64)
+
+    ids = getFirstAppearanceIds(labels.flat[SXs], n)
+
+    ## The number of clusters in each frame (the highest ID + 1).
+    n_f = np.zeros(N, dtype=np.int64)
+    np.maximum.at(n_f, frames, ids + 1)
+
+    ## The offsets of each frame's cluster IDs.
+    koffsets = np.zeros(N + 1, dtype=np.int64)
+    koffsets[1:] = np.maximum.accumulate(n_f)
+
+    return ids, koffsets
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Dataset manifests - what a dataset folder held when it was last opened.
+
+The manifest (DATASET_MANIFEST_NAME, kept in the dataset folder) records
+the size and modification time of every file in the folder, the data
+file format and, for each DSC file (in start time order), its start time
+and the fingerprint of its static settings. The static settings (chip
+ID, DACs, HV, etc.) are stored once per fingerprint.
+
+If none of the files have changed since, the dataset can be re-opened
+from the manifest without sniffing the data files or parsing any of the
+DSC files. Files changed in place without a change of size or
+modification time will not be noticed.
+"""
+
+# The usual suspects.
+import os
+
+#...for the logging.
+import logging as lg
+
+#...for reading and writing the manifest.
+import json
+
+#...for the data values.
+from datavals import *
+
+def getManifestPath(foldername):
+    """ Get the path of a dataset folder's manifest. """
+    return os.path.join(foldername, DATASET_MANIFEST_NAME)
+
+def getFileStats(filenames):
+    """
+    Get the size and modification time of each file.
+
+    @param [in] filenames The paths to the files.
+    @returns A dictionary of {basename : [size, mtime]}.
+    """
+
+    ## The file sizes and modification times.
+    stats = {}
+
+    for fn in filenames:
+        st = os.stat(fn)
+        stats[os.path.basename(fn)] = [st.st_size, st.st_mtime]
+
+    return stats
+
+def getStrings(d):
+    """ Convert the unicode strings in a (JSON) dictionary's keys and values. """
+
+    return dict((str(k), str(v) if isinstance(v, unicode) else v) for k, v in d.iteritems())
+
+def loadManifest(foldername, stats):
+    """
+    Load a dataset folder's manifest, if it's still valid.
+
+    @param [in] foldername The path to the dataset folder.
+    @param [in] stats The current file sizes and modification times (see getFileStats).
+    @returns The manifest, or None if there isn't a valid one.
+    """
+
+    ## The path to the manifest.
+    fn = getManifestPath(foldername)
+
+    if not os.path.isfile(fn):
+        return None
+
+    try:
+        with open(fn, "r") as mf:
+            manifest = json.load(mf)
+    except ValueError:
+        lg.debug(" * The manifest '%s' can't be read." % (fn))
+        return None
+
+    if manifest.get("version", None) != DATASET_MANIFEST_VERSION:
+        lg.debug(" * The manifest '%s' is out of date." % (fn))
+        return None
+
+    if manifest["files"] != stats:
+        lg.debug(" * The files have changed since the manifest '%s' was written." % (fn))
+        return None
+
+    manifest["settings"] = dict((str(fp), getStrings(settings)) \
+        for fp, settings in manifest["settings"].iteritems())
+
+    lg.debug(" * Using the manifest '%s'." % (fn))
+
+    return manifest
+
+def writeManifest(foldername, stats, fmt, dscfiles):
+    """
+    Write a dataset folder's manifest.
+
+    The manifest isn't written (and no error is raised) if the folder
+    can't be written to.
+
+    @param [in] foldername The path to the dataset folder.
+    @param [in] stats The file sizes and modification times (see getFileStats).
+    @param [in] fmt The data file format.
+    @param [in] dscfiles The DSC file wrappers (in start time order).
+    @returns True if the manifest was written.
+    """
+
+    ## The manifest.
+    manifest = { \
+        "version"  : DATASET_MANIFEST_VERSION, \
+        "format"   : fmt, \
+        "files"    : stats, \
+        "settings" : dict((df.getFingerprint(), df.getSettings()) for df in dscfiles), \
+        "frames"   : [[os.path.basename(df.getDscFilename()), df.getFingerprint(), df.getStartTime()] \
+            for df in dscfiles] \
+        }
+
+    ## The path to the manifest.
+    fn = getManifestPath(foldername)
+
+    try:
+        # Write to a temporary file first so that a partial manifest is never read.
+        with open(fn + ".tmp", "w") as mf:
+            json.dump(manifest, mf)
+        os.rename(fn + ".tmp", fn)
+    except (IOError, OSError):
+        lg.debug(" * Unable to write the manifest '%s'." % (fn))
+        return False
+
+    lg.debug(" * Written the manifest '%s'." % (fn))
+
+    return True
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Background reading of the upcoming frames' data files.
+
+While one frame is being clustered, the data files of the next few
+frames (up to the prefetch depth) are read and parsed by a pool of I/O
+threads, so that the disk and the CPU are kept busy at the same time.
+The frames are still handed out in order: the dataset waits for each
+frame's data to be ready before it is used.
+"""
+
+#...for the logging.
+import logging as lg
+
+#...for the I/O threads.
+from multiprocessing.pool import ThreadPool
+
+class FramePrefetcher:
+    """ Reads the data files of the upcoming frames in background threads. """
+
+    def __init__(self, dscfiles, depth, nthreads=1, read=None):
+        """
+        The constructor.
+
+        @param [in] dscfiles The DSC files of the frames, in the order they will be used.
+        @param [in] depth The number of frames to read ahead (0 to read nothing ahead).
+        @param [in] nthreads The number of I/O threads.
+        @param [in] read The function reading a frame, given its index (None
+                         to read the frame's pixel arrays). It is called once
+                         for every frame waited for, even if nothing is read ahead.
+        """
+
+        ## The DSC files of the frames.
+        self.__dscfiles = dscfiles
+
+        ## The function reading a frame.
+        self.__read = read
+        #
+        if read is None:
+            self.__read = lambda j: self.__dscfiles[j].getPixelArrays()
+
+        ## The number of frames to read ahead.
+        self.__depth = depth
+
+        ## The I/O thread pool (None if nothing is read ahead).
+        self.__pool = None
+        #
+        if depth > 0 and nthreads > 0:
+            self.__pool = ThreadPool(nthreads)
+            lg.debug(" * Reading up to %d frames ahead with %d I/O threads." % (depth, nthreads))
+
+        ## The frames being read {index : result}.
+        self.__pending = {}
+
+        ## The index of the next frame to read.
+        self.__next = 0
+
+    def wait(self, j):
+        """
+        Wait until a frame's data has been read (reading ahead of it too).
+
+        Errors raised while reading the frame are raised here.
+
+        @param [in] j The index of the frame.
+        """
+
+        if self.__pool is None:
+            # Read the frame (and any before it not yet read) now.
+            while self.__next <= j:
+                self.__read(self.__next)
+                self.__next += 1
+            return
+
+        # Keep the queue of frames being read topped up.
+        while self.__next < len(self.__dscfiles) and self.__next <= j + self.__depth:
+            self.__pending[self.__next] = self.__pool.apply_async(self.__read, (self.__next,))
+            self.__next += 1
+
+        if j in self.__pending:
+            self.__pending.pop(j).get()
+
+    def close(self):
+        """ Stop reading ahead. """
+
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool = None
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Readers for the frame and cluster property outputs (see writers.py).
+
+The outputs can be read in any of the formats written by process-frames.py:
+JSON Lines (optionally gzipped) or the legacy single JSON list. The
+cluster information columns are memory-mapped, and only the columns
+asked for are read.
+"""
+
+# The usual suspects.
+import os
+
+#...for the logging.
+import logging as lg
+
+#...for the JSON.
+import json
+
+#...for the compressed JSON Lines.
+import zlib
+
+#...for the MATH.
+import numpy as np
+
+#...for writing the legacy JSON list.
+from writers import JsonListWriter
+
+#...for the data values.
+from datavals import *
+
+def getOutputFormat(filename):
+    """ Get the format of an output file from its extension (None if it isn't an output). """
+
+    for fmt in OUTPUT_FORMAT_ORDER:
+        if filename.endswith(OUTPUT_FORMATS[fmt]):
+            return fmt
+
+    return None
+
+def findOutputFile(foldername, name):
+    """
+    Find an output in a folder, whatever its format.
+
+    @param [in] foldername The path to the output folder.
+    @param [in] name The name of the output, e.g. "klusters".
+    @returns The path to the output file, or None if there isn't one.
+    """
+
+    for fmt in OUTPUT_FORMAT_ORDER:
+
+        ## The path to the output in this format.
+        filename = os.path.join(foldername, name + OUTPUT_FORMATS[fmt])
+
+        if os.path.isfile(filename):
+            return filename
+
+    return None
+
+def iterChunks(filename):
+    """
+    Iterate over the (decompressed) contents of a JSON Lines output.
+
+    Gzipped files are decompressed as they are read, so that everything
+    flushed to a file that wasn't closed (which has no end-of-stream
+    marker, and can't be read with gzip) can still be read. Files made
+    of several gzip members (e.g. appended to) are read in full.
+
+    @param [in] filename The path to the JSON Lines file (.jsonl or .jsonl.gz).
+    """
+
+    ## The gzip decompressor (None if the file isn't gzipped).
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS) if getOutputFormat(filename) == "jsonl.gz" else None
+
+    with open(filename, "rb") as f:
+        while True:
+
+            ## The next chunk of the file.
+            chunk = f.read(1 << 20)
+
+            if chunk == "":
+                break
+
+            if d is None:
+                yield chunk
+                continue
+
+            while chunk != "":
+
+                yield d.decompress(chunk)
+
+                # Anything after the end of a gzip member is another member.
+                chunk = d.unused_data
+                #
+                if chunk != "":
+                    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+def iterEncodedEntries(filename):
+    """
+    Iterate over the JSON-encoded entries of a JSON Lines output.
+
+    An incomplete last line (from processing that stopped while writing)
+    is skipped.
+
+    @param [in] filename The path to the JSON Lines file (.jsonl or .jsonl.gz).
+    """
+
+    ## The part of the file after the last complete line.
+    rest = ""
+
+    for chunk in iterChunks(filename):
+
+        ## The lines in the chunk (the last may be incomplete).
+        lines = (rest + chunk).split("\n")
+
+        rest = lines.pop()
+
+        for line in lines:
+            yield line
+
+    if rest != "":
+        lg.debug(" * Skipping the incomplete last line of '%s'." % (filename))
+
+def iterEntries(filename):
+    """
+    Iterate over the entries of an output, whatever its format.
+
+    @param [in] filename The path to the output file.
+    """
+
+    if getOutputFormat(filename) == "json":
+        with open(filename, "r") as f:
+            for entry in json.load(f):
+                yield entry
+        return
+
+    for line in iterEncodedEntries(filename):
+        yield json.loads(line)
+
+def loadEntries(filename):
+    """ Get the list of entries in an output, whatever its format. """
+    return list(iterEntries(filename))
+
+def convertToJson(filename, jsonfilename):
+    """
+    Write a JSON Lines output as a legacy JSON list.
+
+    The JSON list is identical to json.dump of all of the entries.
+
+    @param [in] filename The path to the JSON Lines file (.jsonl or .jsonl.gz).
+    @param [in] jsonfilename The path to the JSON file to write.
+    @returns The number of entries written.
+    """
+
+    ## The JSON list writer.
+    w = JsonListWriter(jsonfilename)
+
+    ## The entries to write at once.
+    batch = []
+
+    for line in iterEncodedEntries(filename):
+        batch.append(line)
+        if len(batch) >= OUTPUT_FLUSH_ENTRIES:
+            w.appendEncoded(batch)
+            batch = []
+
+    w.appendEncoded(batch)
+
+    w.close()
+
+    return w.getNumberOfEntries()
+
+def findKlusterColumns(foldername):
+    """ Get the path to the cluster information columns in an output folder (None if there aren't any). """
+
+    ## The path to the columns.
+    path = os.path.join(foldername, KLUSTER_COLUMNS_FOLDER)
+
+    return path if os.path.isdir(path) else None
+
+def loadColumns(foldername, names):
+    """
+    Load columns written by a NpyColumnsWriter.
+
+    @param [in] foldername The path to the columns folder.
+    @param [in] names The names of the columns to load.
+    @returns A dictionary of the {name : (memory-mapped) column}.
+    """
+
+    ## The columns.
+    columns = {}
+
+    for name in names:
+
+        ## The path to the column file.
+        fn = os.path.join(foldername, name + ".npy")
+
+        if not os.path.isfile(fn):
+            lg.debug(" * No '%s' column in '%s'." % (name, foldername))
+            raise IOError("NO_COLUMN")
+
+        columns[name] = np.load(fn, mmap_mode="r")
+
+    return columns
+
+def getKlusterColumns(path, names):
+    """
+    Get columns of the cluster information, from the columns or any other output format.
+
+    @param [in] path The path to the columns folder, or to the cluster information file.
+    @param [in] names The names of the columns (cluster properties) to get.
+    @returns A dictionary of the {name : column}.
+    """
+
+    if os.path.isdir(path):
+        return loadColumns(path, names)
+
+    ## The cluster information.
+    entries = loadEntries(path)
+
+    for name in names:
+        if len(entries) > 0 and name not in entries[0]:
+            lg.debug(" * No '%s' property in '%s'." % (name, path))
+            raise IOError("NO_COLUMN")
+
+    return dict((name, np.array([entry[name] for entry in entries])) for name in names)
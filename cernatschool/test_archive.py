@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the MATH.
+import numpy as np
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the binary frame archives.
+from archive import FrameArchive, packDataset, isArchive
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_pack_and_read_archive(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The pixel mask.
+        mask = np.zeros((256, 256), dtype=bool)
+        mask[10, 20] = mask[200, 3] = True
+
+        ## The archive path.
+        fn = os.path.join(self.tmpdir, "kcl.fca")
+
+        self.assertEqual(packDataset(ds, fn, [{"lat" : 51.5}], mask), ds.getNumberOfDataFiles())
+
+        self.assertTrue(isArchive(fn))
+        self.assertFalse(isArchive("testdata/kcldata/metadata.json"))
+
+        ## The archived dataset.
+        ds_a = Dataset(fn)
+
+        self.assertEqual(ds_a.getNumberOfDataFiles(), ds.getNumberOfDataFiles())
+        self.assertEqual(ds_a.getFormat(), ds.getFormat())
+        self.assertEqual(ds_a.getArchive().getMetadata(), [{"lat" : 51.5}])
+        self.assertTrue((ds_a.getArchive().getPixelMask() == mask).all())
+
+        for df, af in zip(ds.dscfiles, ds_a.dscfiles):
+
+            self.assertEqual(af.getStartTime(), df.getStartTime())
+            self.assertEqual(af.getStartTimeS(), df.getStartTimeS())
+            self.assertEqual(af.getAcqTime(), df.getAcqTime())
+            self.assertEqual(af.getChipId(), df.getChipId())
+            self.assertEqual(af.getBiasVoltage(), df.getBiasVoltage())
+            self.assertEqual(af.getDACs(), df.getDACs())
+            self.assertEqual(af.getPixelMap(), df.getPixelMap())
+
+        # The frames' pixels are views of the memory-mapped archive.
+        Xs, Cs = ds_a.getArchive().getPixelArrays(0)
+        self.assertTrue(isinstance(Xs.base, np.memmap) or isinstance(Xs, np.memmap))
+
+        # The frames are the same.
+        for f, f_a in zip(ds.getFrames((0.0, 0.0, 0.0)), ds_a.getFrames((0.0, 0.0, 0.0))):
+            self.assertEqual(f.getNumberOfKlusters(), f_a.getNumberOfKlusters())
+            self.assertEqual(f.getStartTimeSec(), f_a.getStartTimeSec())
+
+    def test_bad_archive(self):
+
+        ## A file that isn't an archive.
+        fn = os.path.join(self.tmpdir, "bad.fca")
+        with open(fn, "w") as f:
+            f.write("Not an archive.")
+
+        self.assertRaises(IOError, FrameArchive, fn)
+        self.assertRaises(IOError, Dataset, fn)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_archive.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("=================================================")
+    lg.info(" Logger output from cernatschool/test_archive.py ")
+    lg.info("=================================================")
+    lg.info("")
+
+    unittest.main()
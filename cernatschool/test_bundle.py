@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for making the bundles.
+import tarfile, zipfile
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the tar and zip dataset bundles.
+from bundle import DatasetBundle, isBundle
+
+class BundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_bundles(self):
+
+        ## The dataset wrapper (for the folder).
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The tar.gz bundle.
+        fn_tgz = os.path.join(self.tmpdir, "kcl.tar.gz")
+        with tarfile.open(fn_tgz, "w:gz") as tf:
+            tf.add("testdata/kcldata", arcname="kcldata")
+
+        ## The zip bundle.
+        fn_zip = os.path.join(self.tmpdir, "kcl.zip")
+        with zipfile.ZipFile(fn_zip, "w") as zf:
+            for bn in os.listdir("testdata/kcldata/ASCIIxyC"):
+                zf.write("testdata/kcldata/ASCIIxyC/" + bn, "ASCIIxyC/" + bn)
+
+        self.assertTrue(isBundle(fn_tgz))
+        self.assertTrue(isBundle(fn_zip))
+        self.assertFalse(isBundle("testdata/kcldata/metadata.json"))
+
+        for fn, folder in [(fn_tgz, "kcldata/ASCIIxyC"), (fn_zip, "ASCIIxyC")]:
+
+            ## The dataset wrapper (for the bundle).
+            ds_b = Dataset(fn)
+
+            self.assertEqual(ds_b.getBundleFolder(), folder)
+            self.assertEqual(ds_b.getNumberOfDataFiles(), ds.getNumberOfDataFiles())
+            self.assertEqual(ds_b.getFormat(), ds.getFormat())
+
+            for df, bf in zip(ds.dscfiles, ds_b.dscfiles):
+                self.assertEqual(bf.getStartTime(), df.getStartTime())
+                self.assertEqual(bf.getChipId(), df.getChipId())
+                self.assertEqual(bf.getPixelMap(), df.getPixelMap())
+
+        # The other files in the bundle can be read too.
+        self.assertEqual(DatasetBundle(fn_tgz).read("kcldata/metadata.json"), \
+            open("testdata/kcldata/metadata.json", "rb").read())
+
+        self.assertRaises(IOError, DatasetBundle(fn_zip).read, "metadata.json")
+
+    def test_tar_members_kept(self):
+
+        for mode, ext in [("w", ".tar"), ("w:gz", ".tar.gz")]:
+
+            ## A tar bundle with other files alongside the dataset.
+            fn = os.path.join(self.tmpdir, "kcl" + ext)
+            with tarfile.open(fn, mode) as tf:
+                tf.add("testdata/kcldata", arcname="kcldata")
+                tf.add("testdata/kclsim/README.md", arcname="README.md")
+                tf.add("testdata/kclsim/metadata.json", arcname="other/metadata.json")
+
+            for folder in [None, "kcldata/ASCIIxyC"]:
+
+                ## The bundle.
+                bundle = DatasetBundle(fn, folder)
+
+                self.assertEqual(bundle.getFolder(), "kcldata/ASCIIxyC")
+                self.assertTrue("other/metadata.json" in bundle.getNames())
+
+                ## The contents kept in memory.
+                contents = bundle._DatasetBundle__contents
+
+                self.assertEqual(bundle.read("kcldata/metadata.json"), \
+                    open("testdata/kcldata/metadata.json", "rb").read())
+
+                ## A data file.
+                data = open("testdata/kcldata/ASCIIxyC/data000.txt", "rb").read()
+
+                self.assertEqual(bundle.read("kcldata/ASCIIxyC/data000.txt"), data)
+
+                if mode == "w":
+
+                    # Uncompressed tar files are read as the files are needed.
+                    self.assertEqual(contents, {})
+                    self.assertEqual(bundle.read("other/metadata.json"), \
+                        open("testdata/kclsim/metadata.json", "rb").read())
+                    continue
+
+                # Only the data folder, and the files beside it, are kept...
+                for name in ["README.md", "other/metadata.json"]:
+                    with self.assertRaises(IOError) as e:
+                        bundle.read(name)
+                    self.assertEqual(str(e.exception), "NOT_KEPT")
+
+                # ...and the data files are let go once they have been read.
+                self.assertFalse("kcldata/ASCIIxyC/data000.txt" in contents)
+                self.assertTrue("kcldata/ASCIIxyC/data001.txt" in contents)
+                self.assertTrue("kcldata/ASCIIxyC/data000.txt.dsc" in contents)
+
+                # (They can still be read again.)
+                self.assertEqual(bundle.read("kcldata/ASCIIxyC/data000.txt"), data)
+
+            # A whole dataset can be processed more than once.
+            ds = Dataset(fn)
+
+            for i in range(2):
+                self.assertEqual(len(ds.getFrames((0.0, 0.0, 0.0), skipclustering=True)), \
+                    ds.getNumberOfDataFiles())
+
+            # No data files are left in memory afterwards.
+            self.assertEqual([name for name in ds.getBundle()._DatasetBundle__contents \
+                if ds.getBundle().isDataFile(name)], [])
+
+    def test_bundle_checks(self):
+
+        ## A bundle with a data file that has no DSC file.
+        fn = os.path.join(self.tmpdir, "bad.zip")
+        with zipfile.ZipFile(fn, "w") as zf:
+            zf.write("testdata/kcldata/ASCIIxyC/data000.txt", "ASCIIxyC/data000.txt")
+            zf.write("testdata/kcldata/ASCIIxyC/data000.txt.dsc", "ASCIIxyC/data000.txt.dsc")
+            zf.write("testdata/kcldata/ASCIIxyC/data001.txt", "ASCIIxyC/data001.txt")
+
+        with self.assertRaises(IOError) as e:
+            Dataset(fn)
+        self.assertEqual(str(e.exception), "MISSING_DSC")
+
+        ## A bundle with DSC files in two folders.
+        fn = os.path.join(self.tmpdir, "two.zip")
+        with zipfile.ZipFile(fn, "w") as zf:
+            for folder in ["a", "b"]:
+                zf.write("testdata/kcldata/ASCIIxyC/data000.txt", folder + "/data000.txt")
+                zf.write("testdata/kcldata/ASCIIxyC/data000.txt.dsc", folder + "/data000.txt.dsc")
+
+        with self.assertRaises(IOError) as e:
+            Dataset(fn)
+        self.assertEqual(str(e.exception), "MULTIPLE_FOLDERS")
+
+        self.assertEqual(Dataset(fn, bundlefolder="b").getNumberOfDataFiles(), 1)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_bundle.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("================================================")
+    lg.info(" Logger output from cernatschool/test_bundle.py ")
+    lg.info("================================================")
+    lg.info("")
+
+    unittest.main()
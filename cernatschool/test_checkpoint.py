@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the JSON.
+import json
+
+#...for the MATH.
+import numpy as np
+
+#...for the output writers.
+from writers import openOutputWriter, NpyColumnsWriter, getKlusterColumnTypes
+
+#...for the output readers.
+from readers import loadEntries
+
+#...for the processing checkpoints.
+from checkpoint import CheckpointLog, loadCheckpoint, getCheckpointPath
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        ## The entries written.
+        self.entries = [{"id" : "k%d" % (i), "size" : i + 1, "ismc" : False} for i in range(6)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_resume_writers(self):
+
+        for fmt in ["jsonl", "jsonl.gz", "json"]:
+
+            ## The path to the output (without the extension).
+            path = os.path.join(self.tmpdir, "klusters")
+
+            ## The writer.
+            w = openOutputWriter(path, fmt)
+            w.append(self.entries[:2])
+
+            ## The checkpointed state.
+            state = w.checkpoint()
+
+            self.assertEqual(state["entries"], 2)
+
+            # Written after the checkpoint, but never checkpointed (and so lost).
+            w.append(self.entries[4:])
+            if fmt != "json":
+                w.flush()
+
+            ## The writer, carrying on from the checkpoint.
+            w = openOutputWriter(path, fmt, state)
+            w.append(self.entries[2:4])
+            w.checkpoint()
+            w.append(self.entries[4:])
+            w.close()
+
+            self.assertEqual(w.getNumberOfEntries(), 6)
+
+            self.assertEqual(loadEntries(path + "." + fmt), self.entries)
+
+            if fmt == "json":
+                self.assertEqual(open(path + ".json", "r").read(), json.dumps(self.entries))
+
+    def test_resume_columns(self):
+
+        ## The columns folder.
+        fn = os.path.join(self.tmpdir, "klustercolumns")
+
+        ## The writer.
+        w = NpyColumnsWriter(fn, getKlusterColumnTypes("size"))
+        w.append(self.entries[:2], 0)
+
+        ## The checkpointed state.
+        state = w.checkpoint()
+
+        w.append(self.entries[2:], 5)
+        w.close()
+
+        w = NpyColumnsWriter(fn, getKlusterColumnTypes("size"), resume=state)
+        w.append(self.entries[2:], 1)
+        w.close()
+
+        self.assertEqual(np.load(os.path.join(fn, "size.npy"), mmap_mode="r").tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(np.load(os.path.join(fn, "frame.npy")).tolist(), [0, 0, 1, 1, 1, 1])
+
+        # A column file shorter than at its checkpoint can't be resumed.
+        with self.assertRaises(IOError) as e:
+            NpyColumnsWriter(fn, getKlusterColumnTypes("size"), resume={"entries" : 7})
+        self.assertEqual(str(e.exception), "BAD_CHECKPOINT")
+
+    def test_checkpoint_log(self):
+
+        self.assertEqual(loadCheckpoint(self.tmpdir), None)
+
+        ## The processing options.
+        options = {"features" : "full", "maxframes" : -1}
+
+        ## The output writers.
+        writers = {"frames" : openOutputWriter(os.path.join(self.tmpdir, "frames"), "jsonl")}
+
+        ## The checkpoint log (checkpointing every two frames).
+        log = CheckpointLog(self.tmpdir, options, writers, interval=2)
+
+        # Nothing has been checkpointed yet.
+        self.assertEqual(loadCheckpoint(self.tmpdir)["outputs"], None)
+
+        for i in range(3):
+            writers["frames"].append(self.entries[i:i + 1])
+            log.addFrame("/data/ASCIIxyC/data%03d.txt.dsc" % (i))
+
+        ## The checkpoint (of the first two frames).
+        checkpoint = loadCheckpoint(self.tmpdir)
+
+        self.assertEqual(checkpoint["options"], options)
+        self.assertEqual(checkpoint["frames"], ["data000.txt.dsc", "data001.txt.dsc"])
+        self.assertEqual(checkpoint["outputs"]["frames"]["entries"], 2)
+
+        # Carry on the checkpoint log.
+        log.close()
+        log = CheckpointLog(self.tmpdir, options, writers, interval=2, resume=True)
+        log.close()
+
+        self.assertEqual(loadCheckpoint(self.tmpdir)["frames"], ["data000.txt.dsc", "data001.txt.dsc", "data002.txt.dsc"])
+        self.assertEqual(loadCheckpoint(self.tmpdir)["outputs"]["frames"]["entries"], 3)
+
+        # A checkpoint that can't be read.
+        with open(getCheckpointPath(self.tmpdir), "w") as f:
+            f.write("{\n")
+
+        with self.assertRaises(IOError) as e:
+            loadCheckpoint(self.tmpdir)
+        self.assertEqual(str(e.exception), "BAD_CHECKPOINT")
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_checkpoint.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("====================================================")
+    lg.info(" Logger output from cernatschool/test_checkpoint.py ")
+    lg.info("====================================================")
+    lg.info("")
+
+    unittest.main()
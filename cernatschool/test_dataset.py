@@ -10,6 +10,12 @@ import unittest
 #...for the logging.
 import logging as lg
 
+#...for the temporary files.
+import tempfile, shutil
+
+#...for counting the file opens.
+import __builtin__
+
 #...for the dataset wrapper.
 from dataset import Dataset
 
@@ -34,6 +40,229 @@ class DatasetTest(unittest.TestCase):
         # The data format of the folder.
         self.assertEqual(pds.getFolderFormat(), "ASCII [x, y, C]")
 
+    def test_iterate_frames(self):
+
+        ## The Pixelman dataset object.
+        pds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The frame generator.
+        frames = pds.iterFrames((0.0, 0.0, 0.0), engine="label", chunksize=10)
+
+        self.assertEqual(frames.next().getStartTime(), pds.dscfiles[0].getStartTime())
+
+        ## The start times of the frames.
+        starttimes = [pds.dscfiles[0].getStartTime()] + [f.getStartTime() for f in frames]
+
+        self.assertEqual(len(starttimes), pds.getNumberOfDataFiles())
+        self.assertEqual(starttimes, sorted(starttimes))
+
+        # The frames are the same as those from getFrames.
+        self.assertEqual([f.getNumberOfKlusters() for f in pds.iterFrames((0.0, 0.0, 0.0))], \
+            [f.getNumberOfKlusters() for f in pds.getFrames((0.0, 0.0, 0.0))])
+
+    def test_prefetch_frames(self):
+
+        ## The Pixelman dataset object.
+        pds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The frames read one at a time.
+        frames = pds.getFrames((0.0, 0.0, 0.0), engine="auto", chunksize=10)
+
+        ## The frames read ahead by the I/O threads.
+        frames_p = pds.getFrames((0.0, 0.0, 0.0), engine="auto", chunksize=10, prefetch=4, iothreads=3)
+
+        self.assertEqual([f.getStartTime() for f in frames_p], [f.getStartTime() for f in frames])
+        self.assertEqual([f.getNumberOfKlusters() for f in frames_p], [f.getNumberOfKlusters() for f in frames])
+
+        # Stopping early releases the frames that were read ahead.
+        frames_p = pds.iterFrames((0.0, 0.0, 0.0), engine="pixel", prefetch=8)
+        frames_p.next()
+        frames_p.close()
+
+        for df in pds.dscfiles:
+            self.assertEqual(df._DscFile__pixel_arrays, None)
+
+    def test_files_opened_once(self):
+
+        ## The number of times each file is opened.
+        opens = {}
+
+        ## The built-in open function.
+        builtin_open = __builtin__.open
+
+        def counting_open(fn, *args, **kwargs):
+            opens[fn] = opens.get(fn, 0) + 1
+            return builtin_open(fn, *args, **kwargs)
+
+        __builtin__.open = counting_open
+
+        try:
+            pds = Dataset("testdata/kcldata/ASCIIxyC/", usemanifest=False)
+            frames = list(pds.iterFrames((0.0, 0.0, 0.0)))
+        finally:
+            __builtin__.open = builtin_open
+
+        self.assertEqual(len(opens), 2 * pds.getNumberOfDataFiles())
+        self.assertEqual(max(opens.values()), 1)
+
+    def test_format_mismatch(self):
+
+        ## A temporary dataset folder.
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            for fn in ["data000.txt", "data000.txt.dsc", "data001.txt", "data001.txt.dsc"]:
+                shutil.copy(os.path.join("testdata/kcldata/ASCIIxyC", fn), tmpdir)
+
+            # Rewrite the second data file in the ASCII [X, C] format.
+            with open(os.path.join(tmpdir, "data001.txt"), "w") as f:
+                f.write("1439\t68\n")
+
+            ## The Pixelman dataset object.
+            pds = Dataset(tmpdir)
+
+            self.assertEqual(pds.getFolderFormat(), "ASCII [x, y, C]")
+
+            # The mismatch is found when the second data file is read.
+            self.assertRaises(IOError, pds.getFrames, (0.0, 0.0, 0.0))
+
+            # (Including when the data files are read ahead.)
+            self.assertRaises(IOError, pds.getFrames, (0.0, 0.0, 0.0), prefetch=2)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_watch_folder(self):
+
+        ## A temporary dataset folder.
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            ## The watched dataset.
+            pds = Dataset(tmpdir, watch=True)
+
+            self.assertEqual(pds.pollNewDscFiles(), [])
+
+            # A data file without its DSC file isn't a frame yet.
+            shutil.copy("testdata/kcldata/ASCIIxyC/data001.txt", tmpdir)
+            self.assertEqual(pds.pollNewDscFiles(), [])
+
+            # Nor is a new pair (it might still be being written)...
+            shutil.copy("testdata/kcldata/ASCIIxyC/data001.txt.dsc", tmpdir)
+            self.assertEqual(pds.pollNewDscFiles(), [])
+
+            # ...until it hasn't changed since the last poll.
+            new = pds.pollNewDscFiles()
+            self.assertEqual([df.getDscFilename() for df in new], [tmpdir + "/data001.txt.dsc"])
+            self.assertEqual(pds.pollNewDscFiles(), [])
+
+            for fn in ["data000.txt", "data000.txt.dsc", "data002.txt", "data002.txt.dsc"]:
+                shutil.copy(os.path.join("testdata/kcldata/ASCIIxyC", fn), tmpdir)
+            pds.pollNewDscFiles()
+
+            # The new frames are in start time order.
+            new = pds.pollNewDscFiles()
+            self.assertEqual(len(new), 2)
+            self.assertTrue(new[0].getStartTime() < new[1].getStartTime())
+
+            self.assertEqual(pds.getNumberOfDataFiles(), 3)
+            self.assertEqual(len(pds.getFrames((0.0, 0.0, 0.0), selection=new)), 2)
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_watch_bad_frames(self):
+
+        ## A temporary dataset folder.
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            ## The watched dataset.
+            pds = Dataset(tmpdir, watch=True)
+
+            for fn in ["data000.txt", "data000.txt.dsc", "data003.txt", "data003.txt.dsc"]:
+                shutil.copy(os.path.join("testdata/kcldata/ASCIIxyC", fn), tmpdir)
+
+            # A pair with a corrupt DSC file...
+            shutil.copy("testdata/kcldata/ASCIIxyC/data001.txt", tmpdir)
+            with open(os.path.join(tmpdir, "data001.txt.dsc"), "w") as f:
+                f.write("Not a DSC file\n")
+
+            # ...and a pair with a data file in another format.
+            shutil.copy("testdata/kcldata/ASCIIxyC/data002.txt.dsc", tmpdir)
+            with open(os.path.join(tmpdir, "data002.txt"), "w") as f:
+                f.write("0 0 0 0\n1 1 1 1\n")
+
+            pds.pollNewDscFiles()
+
+            # The good frames are still found.
+            new = pds.pollNewDscFiles()
+            self.assertEqual(sorted(os.path.basename(df.getDscFilename()) for df in new), \
+                ["data000.txt.dsc", "data003.txt.dsc"])
+            self.assertEqual(pds.getRejectedDscFilenames(), ["data001.txt.dsc", "data002.txt.dsc"])
+
+            # Only the frames found are recorded.
+            self.assertEqual(pds.getNumberOfDataFiles(), 2)
+            self.assertEqual(len(pds.getFrames((0.0, 0.0, 0.0), selection=new)), 2)
+
+            # The rejected frames aren't tried again...
+            self.assertEqual(pds.pollNewDscFiles(), [])
+
+            # ...unless they are replaced.
+            shutil.copy("testdata/kcldata/ASCIIxyC/data001.txt.dsc", tmpdir)
+            pds.pollNewDscFiles()
+            new = pds.pollNewDscFiles()
+            self.assertEqual([os.path.basename(df.getDscFilename()) for df in new], ["data001.txt.dsc"])
+            self.assertEqual(pds.getRejectedDscFilenames(), ["data002.txt.dsc"])
+
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_select_frames(self):
+
+        ## The Pixelman dataset object.
+        pds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The start times of the frames.
+        starttimes = [df.getStartTime() for df in pds.dscfiles]
+
+        ## A time window.
+        selection = pds.selectDscFiles(mintime=starttimes[10], maxtime=starttimes[20])
+        self.assertEqual(selection, pds.dscfiles[10:20])
+
+        # The detector settings.
+        self.assertEqual(len(pds.selectDscFiles(chipid="B06-W0212", biasvoltage=95.0)), len(pds.dscfiles))
+        self.assertEqual(pds.selectDscFiles(chipid="A01-W0001"), [])
+        self.assertEqual(pds.selectDscFiles(biasvoltage=50.0), [])
+        self.assertEqual(len(pds.selectDscFiles(dacs={"IKrum" : 1, "THL" : 405})), len(pds.dscfiles))
+        self.assertEqual(pds.selectDscFiles(dacs={"IKrum" : 2}), [])
+        self.assertRaises(IOError, pds.selectDscFiles, dacs={"Ikrum" : 1})
+
+        # The maximum number of frames.
+        selection = pds.selectDscFiles(mintime=starttimes[5], maxframes=3)
+        self.assertEqual(selection, pds.dscfiles[5:8])
+
+        ## The data files opened.
+        opens = []
+
+        ## The built-in open function.
+        builtin_open = __builtin__.open
+
+        def counting_open(fn, *args, **kwargs):
+            opens.append(fn)
+            return builtin_open(fn, *args, **kwargs)
+
+        __builtin__.open = counting_open
+
+        try:
+            frames = list(pds.iterFrames((0.0, 0.0, 0.0), selection=selection, engine="label"))
+        finally:
+            __builtin__.open = builtin_open
+
+        # Only the selected frames' data files are read.
+        self.assertEqual([f.getStartTime() for f in frames], starttimes[5:8])
+        self.assertEqual(sorted(opens), sorted(df.getDataFilename() for df in selection))
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the MATH.
+import numpy as np
+
+#...for reading the data files.
+from dsc import getPixelArraysFromFile
+
+#...for the DSC files.
+import dsc
+
+class DscTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def writeFile(self, name, text):
+        fn = os.path.join(self.tmpdir, name)
+        with open(fn, "w") as f:
+            f.write(text)
+        return fn
+
+    def test_read_pixel_arrays(self):
+
+        # ASCII [x, y, C] (with Windows line endings).
+        fn = self.writeFile("xyc.txt", "159\t5\t68\r\n3\t0\t12\r\n")
+        Xs, Cs = getPixelArraysFromFile(fn, 4114)
+        self.assertEqual(Xs.tolist(), [(256 * 5) + 159, 3])
+        self.assertEqual(Cs.tolist(), [68, 12])
+
+        # ASCII [X, C].
+        fn = self.writeFile("xc.txt", "1439\t68\n3\t12\n")
+        Xs, Cs = getPixelArraysFromFile(fn, 8210)
+        self.assertEqual(Xs.tolist(), [1439, 3])
+        self.assertEqual(Cs.tolist(), [68, 12])
+
+        # ASCII matrix.
+        m = np.zeros((256, 256), dtype=np.int64)
+        m[5, 159], m[0, 3] = 68, 12
+        fn = self.writeFile("matrix.txt", "\n".join(" ".join(str(C) for C in row) for row in m) + "\n")
+        Xs, Cs = getPixelArraysFromFile(fn, 18)
+        self.assertEqual(Xs.tolist(), [3, (256 * 5) + 159])
+        self.assertEqual(Cs.tolist(), [12, 68])
+
+        # An empty frame.
+        fn = self.writeFile("empty.txt", "")
+        Xs, Cs = getPixelArraysFromFile(fn, 4114)
+        self.assertEqual(len(Xs), 0)
+
+        # A truncated frame.
+        fn = self.writeFile("bad.txt", "159\t5\t68\n3\t0\n")
+        self.assertRaises(IOError, getPixelArraysFromFile, fn, 4114)
+
+        # A frame with a bad value part way through (or at the end).
+        for text in ["1\t2\t3\n4\t5\t6.5\n7\t8\t9\n", "1\t2\t3\n4\t5\tx\n7\t8\t9\n", "1439\t68\n3\t12.5\n"]:
+            fn = self.writeFile("bad.txt", text)
+            with self.assertRaises(IOError) as e:
+                getPixelArraysFromFile(fn, 4114 if text.count("\n") == 3 else 8210)
+            self.assertEqual(str(e.exception), "BAD_DATA_FILE")
+
+    def test_dsc_settings_cache(self):
+
+        ## A DSC file from the test data.
+        fn = "testdata/kcldata/ASCIIxyC/" + sorted(f for f in os.listdir("testdata/kcldata/ASCIIxyC") if f.endswith(".dsc"))[0]
+
+        with open(fn, "r") as f:
+            text = f.read()
+
+        ## The same header with a different start time.
+        ls = text.splitlines(True)
+        records = dsc.getDscRecords(ls)
+        i = records["start time:line"]
+        ls[i] = "%f\n" % (float(ls[i]) + 60.0)
+        fn_b = self.writeFile("b.txt.dsc", "".join(ls))
+        self.writeFile("b.txt", "")
+
+        self.assertEqual(dsc.getDscFingerprint(ls, dsc.getDscRecords(ls)), \
+            dsc.getDscFingerprint(text.splitlines(True), records))
+
+        dsc.DSC_SETTINGS_CACHE.clear()
+
+        df_a = dsc.DscFile(fn)
+
+        self.assertEqual(len(dsc.DSC_SETTINGS_CACHE), 1)
+
+        df_b = dsc.DscFile(fn_b)
+
+        # The static settings are reused, the start time is not.
+        self.assertEqual(len(dsc.DSC_SETTINGS_CACHE), 1)
+        self.assertEqual(df_a.getDACs(), df_b.getDACs())
+        self.assertEqual(df_a.getChipId(), df_b.getChipId())
+        self.assertEqual(df_a.getTpxClock(), df_b.getTpxClock())
+        self.assertAlmostEqual(df_b.getStartTime() - df_a.getStartTime(), 60.0, places=3)
+        self.assertNotEqual(df_a.getStartTimeS(), df_b.getStartTimeS())
+
+        # Changing a static setting changes the fingerprint.
+        i = records["hv:line"]
+        ls[i] = "42.0\n"
+        self.writeFile("c.txt", "")
+        df_c = dsc.DscFile(self.writeFile("c.txt.dsc", "".join(ls)))
+        self.assertEqual(len(dsc.DSC_SETTINGS_CACHE), 2)
+        self.assertEqual(df_c.getBiasVoltage(), 42.0)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_dsc.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("=============================================")
+    lg.info(" Logger output from cernatschool/test_dsc.py ")
+    lg.info("=============================================")
+    lg.info("")
+
+    unittest.main()
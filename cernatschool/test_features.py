@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the MATH.
+import numpy as np
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the klusters.
+from kluster import KlusterFinder
+
+#...for the cluster table.
+from features import getKlusterTable, getEdgePixelCounts
+
+#...for getting the cluster properties JSON.
+from helpers import getKlusterPropertiesJson
+
+#...for the linearity calculations.
+from helpers import getLinearity, getLinearities, residuals
+
+#...for the least squares fits to compare with.
+from scipy.optimize import leastsq
+
+class FeaturesTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_kluster_table_from_label_image(self):
+
+        ## The label image: an L-shaped tripixel and a monopixel on the edge.
+        labels = np.zeros((256, 256), dtype=np.int32)
+        labels[10, 20] = labels[10, 21] = labels[11, 20] = 1
+        labels[0, 100] = 2
+
+        ## The counts.
+        counts = np.zeros((256, 256), dtype=np.int32)
+        counts[10, 20], counts[10, 21], counts[11, 20] = 5, 7, 3
+        counts[0, 100] = 12
+
+        t = getKlusterTable(labels, counts)
+
+        self.assertEqual(len(t), 2)
+        self.assertEqual(t["size"].tolist(), [3, 1])
+        self.assertEqual(t["xmin"].tolist(), [20, 100])
+        self.assertEqual(t["ymax"].tolist(), [11, 0])
+        self.assertEqual(t["totalcounts"].tolist(), [15, 12])
+        self.assertEqual(t["maxcounts"].tolist(), [7, 12])
+        self.assertAlmostEqual(t["x_uw"][0], 20.0 + (1.0/3.0), places=6)
+        self.assertAlmostEqual(t["radius_uw"][0], np.sqrt(5.0)/3.0, places=6)
+        self.assertAlmostEqual(t["density_uw"][1], 0.0, places=6)
+        self.assertEqual(t["isedgekluster"].tolist(), [False, True])
+
+    def test_edge_pixel_counts(self):
+
+        # A 3x3 block (one inner pixel), a 2x2 block on the frame edge
+        # and a 4x3 block (two inner pixels).
+        Xs, ids = [], []
+        for i, (x0, y0, w, h) in enumerate([(10, 10, 3, 3), (0, 254, 2, 2), (50, 60, 4, 3)]):
+            for y in range(y0, y0 + h):
+                for x in range(x0, x0 + w):
+                    Xs.append((256 * y) + x); ids.append(i)
+
+        n_edge = getEdgePixelCounts(np.array(ids), np.array(Xs), 3, 256, 256)
+
+        self.assertEqual(n_edge.tolist(), [8, 4, 10])
+
+    def test_linearity_special_cases(self):
+
+        # A single pixel, a vertical line and a horizontal line.
+        ids = np.array([0, 1, 1, 1, 2, 2])
+        xs  = np.array([5, 7, 7, 7, 1, 2])
+        ys  = np.array([9, 1, 2, 3, 4, 4])
+
+        m, c, sumR, lin = getLinearities(ids, xs, ys, 3, "compat")
+
+        self.assertEqual(m.tolist(), [0.0, 999999.9, 0.0])
+        self.assertEqual(c.tolist(), [5.0, 999999.9, 4.0])
+        self.assertEqual(sumR.tolist(), [0.0, 0.0, 0.0])
+
+        m, c, sumR, lin = getLinearities(ids, xs, ys, 3, "perpendicular")
+
+        self.assertEqual(m.tolist(), [0.0, 999999.9, 0.0])
+        self.assertEqual(c.tolist(), [9.0, 999999.9, 4.0])
+        self.assertEqual(lin.tolist(), [0.0, 0.0, 0.0])
+
+    def test_perpendicular_linearity_is_rotationally_invariant(self):
+
+        ## A slightly bent track.
+        xs = np.array([10, 11, 12, 13, 14, 14, 15])
+        ys = np.array([20, 21, 22, 22, 23, 24, 25])
+
+        ids = np.zeros(len(xs), dtype=np.int64)
+
+        # Swapping x and y reflects the track about y = x.
+        l_a = getLinearities(ids, xs, ys, 1, "perpendicular")[3][0]
+        l_b = getLinearities(ids, ys, xs, 1, "perpendicular")[3][0]
+
+        # Rotating by 90 degrees.
+        l_c = getLinearities(ids, -ys + 100, xs, 1, "perpendicular")[3][0]
+
+        self.assertAlmostEqual(l_a, l_b, places=9)
+        self.assertAlmostEqual(l_a, l_c, places=9)
+
+        # A single cluster gives the same fit, whatever the frame width.
+        for cols in [256, 512]:
+            pd = dict(((cols * y) + x, 1) for x, y in zip(xs, ys))
+            for mode in ["compat", "perpendicular"]:
+                for a, b in zip(getLinearity(pd, mode, cols), getLinearities(ids, xs, ys, 1, mode)):
+                    self.assertAlmostEqual(a, b[0], places=12)
+
+    def test_linearity_matches_least_squares(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        for df in ds.dscfiles[:20]:
+
+            ## The cluster finder.
+            kf = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="pixel")
+
+            for k in kf.getListOfKlusters():
+
+                ## The pixel x and y values.
+                xs = np.array([X % 256 for X in k.getPixelMap()], dtype=np.float64)
+                ys = np.array([X / 256 for X in k.getPixelMap()], dtype=np.float64)
+
+                # (The special cases are checked above.)
+                if len(set(xs)) == 1 or len(set(ys)) == 1:
+                    continue
+
+                # The original iterative least squares fit.
+                m, c = leastsq(residuals, [0.0, ys[0]], args = (ys, xs))[0]
+                sumR = np.sum(np.fabs(m * xs - ys + c)) / np.sqrt(1 + m*m)
+
+                self.assertAlmostEqual(k.getLinearity(), sumR / len(xs), places=6)
+                self.assertAlmostEqual(k.getLineOfBestFitValues()[0], m, places=6)
+
+    def test_feature_sets(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The pixel map of the first frame.
+        pm = ds.dscfiles[0].getPixelMap()
+
+        ## A cluster finder computing the size and radius only.
+        kf = KlusterFinder(pm, 256, 256, False, engine="label", features="size,radius")
+
+        ## A cluster finder computing all of the features.
+        kf_full = KlusterFinder(pm, 256, 256, False, engine="label")
+
+        t = kf.getKlusterTable()
+
+        self.assertTrue((t["radius_uw"] == kf_full.getKlusterTable()["radius_uw"]).all())
+        self.assertTrue((t["lin_linearity"] == 0.0).all())
+
+        # The cluster properties JSON only contains the requested features.
+        p = getKlusterPropertiesJson(0, kf.getListOfKlusters()[0], "size,radius")
+        self.assertEqual(sorted(p.keys()), \
+            ["density_uw", "id", "ismc", "radius_uw", "size", "x_uw", "y_uw"])
+        self.assertEqual(sorted(getKlusterPropertiesJson(0, t[0], "size,radius").keys()), sorted(p.keys()))
+
+        # Other properties are still calculated on demand.
+        for k, k_full in zip(kf.getListOfKlusters(), kf_full.getListOfKlusters()):
+            self.assertAlmostEqual(k.getLinearity(), k_full.getLinearity(), places=3)
+            self.assertEqual(k.getNumberOfEdgePixels(), k_full.getNumberOfEdgePixels())
+
+        self.assertRaises(IOError, KlusterFinder, pm, 256, 256, False, features="size,colour")
+
+    def test_kluster_table_matches_klusters(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        for df in ds.dscfiles[:20]:
+
+            ## The pixel-by-pixel cluster finder.
+            kf = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="pixel")
+
+            ## The cluster table from the labelling cluster finder.
+            t = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="label").getKlusterTable()
+
+            self.assertEqual(len(t), kf.getNumberOfKlusters())
+
+            for i, k in enumerate(kf.getListOfKlusters()):
+
+                ## The properties from the cluster object.
+                p_k = getKlusterPropertiesJson(i, k)
+
+                ## The properties from the cluster table.
+                p_t = getKlusterPropertiesJson(i, t[i])
+
+                self.assertEqual(sorted(p_k.keys()), sorted(p_t.keys()))
+
+                for key, val in p_k.iteritems():
+                    self.assertAlmostEqual(val, p_t[key], places=3)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_features.txt', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("==================================================")
+    lg.info(" Logger output from cernatschool/test_features.py ")
+    lg.info("==================================================")
+    lg.info("")
+
+    unittest.main()
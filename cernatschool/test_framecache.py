@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the JSON.
+import json
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the cluster properties.
+from helpers import getKlusterPropertiesJson
+
+#...for the frame cache.
+from framecache import FrameCache, getFrameCacheKey, getFrameCacheVersion, FRAME_CACHE_CODE_VERSION
+
+#...for the data values.
+from datavals import FRAME_CACHE_SOURCES
+
+class FrameCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        ## The dataset.
+        self.ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The frames used.
+        self.selection = self.ds.dscfiles[:30]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def getFrames(self, cache, **kwargs):
+        """ Get the frame and cluster information of the frames. """
+
+        ## The information of each frame.
+        frames = []
+
+        for f in self.ds.iterFrames((0.0, 0.0, 0.0), selection = self.selection, cache = cache, **kwargs):
+            frames.append((f.getEngine(), f.getNumberOfUnmaskedPixels(), f.getNumberOfGammas(), \
+                [json.dumps(getKlusterPropertiesJson("k", k)) for k in f.getKlusterFinder().getListOfKlusters()]))
+
+        return frames
+
+    def test_cached_frames(self):
+
+        for engine in ["auto", "pixel", "label"]:
+
+            ## The frames, without a cache.
+            frames = self.getFrames(None, engine = engine, chunksize = 7)
+
+            ## The cache.
+            cache = FrameCache(os.path.join(self.tmpdir, engine))
+
+            self.assertEqual(self.getFrames(cache, engine = engine, chunksize = 7), frames)
+            self.assertEqual(cache.getNumberOfMisses(), len(self.selection))
+            self.assertEqual(cache.getNumberOfEntries(), len(self.selection))
+
+            # The frames are all found in the cache the second time.
+            cache = FrameCache(os.path.join(self.tmpdir, engine))
+
+            self.assertEqual(self.getFrames(cache, engine = engine, chunksize = 7, prefetch = 4), frames)
+            self.assertEqual(cache.getNumberOfHits(), len(self.selection))
+            self.assertEqual(cache.getNumberOfMisses(), 0)
+
+    def test_mask_change(self):
+
+        ## The cache.
+        cache = FrameCache(self.tmpdir)
+
+        ## The pixel mask.
+        mask = {1000 : 1}
+
+        self.getFrames(cache, engine = "auto", pixelmask = mask)
+
+        ## The pixels added to the mask (hit pixels of the first frame).
+        added = sorted(self.selection[0].getPixelMap().keys())[:2]
+
+        ## The frames with hits on those pixels.
+        n_changed = len([df for df in self.selection if any(X in df.getPixelMap() for X in added)])
+        #
+        for df in self.selection:
+            df.freePixelMap()
+
+        mask.update((X, 1) for X in added)
+
+        cache = FrameCache(self.tmpdir)
+
+        self.assertEqual(self.getFrames(cache, engine = "auto", pixelmask = mask), \
+            self.getFrames(None, engine = "auto", pixelmask = mask))
+
+        # Only the frames with hits on the changed pixels are clustered again.
+        self.assertEqual(cache.getNumberOfMisses(), n_changed)
+        self.assertEqual(cache.getNumberOfHits(), len(self.selection) - n_changed)
+
+    def test_keys(self):
+
+        ## The clustering options.
+        options = {"engine" : "auto", "features" : "full"}
+
+        ## The key.
+        key = getFrameCacheKey("abc", 256, 256, options)
+
+        self.assertEqual(key, getFrameCacheKey("abc", 256, 256, {"engine" : "auto"}))
+
+        self.assertNotEqual(key, getFrameCacheKey("abd", 256, 256, options))
+        self.assertNotEqual(key, getFrameCacheKey("abc", 256, 256, dict(options, features = "size")))
+        self.assertNotEqual(key, getFrameCacheKey("abc", 256, 256, dict(options, linmode = "perpendicular")))
+        self.assertNotEqual(key, getFrameCacheKey("abc", 256, 256, options, "0" * 40))
+
+    def test_code_version(self):
+
+        ## The folder the clustering code is in.
+        folder = os.path.dirname(os.path.abspath(inspect.getfile(FrameCache)))
+
+        self.assertEqual(getFrameCacheVersion(folder), FRAME_CACHE_CODE_VERSION)
+
+        ## A copy of the clustering code.
+        codedir = os.path.join(self.tmpdir, "code")
+        os.mkdir(codedir)
+        for fn in FRAME_CACHE_SOURCES:
+            shutil.copy(os.path.join(folder, fn), codedir)
+
+        self.assertEqual(getFrameCacheVersion(codedir), FRAME_CACHE_CODE_VERSION)
+
+        # Any change to the code changes the version (and so the keys).
+        with open(os.path.join(codedir, "labelling.py"), "a") as f:
+            f.write("\n")
+
+        self.assertNotEqual(getFrameCacheVersion(codedir), FRAME_CACHE_CODE_VERSION)
+
+    def test_eviction(self):
+
+        ## The cache.
+        cache = FrameCache(self.tmpdir)
+
+        self.getFrames(cache)
+
+        ## The cache entries, oldest first.
+        fns = [cache.getEntryFilename(getFrameCacheKey(df.getDataHash(), 256, 256, {})) for df in self.selection]
+
+        for i, fn in enumerate(fns):
+            os.utime(fn, (1000 + i, 1000 + i))
+
+        ## The size of the newest ten entries.
+        size = sum(os.path.getsize(fn) for fn in fns[-10:])
+
+        cache = FrameCache(self.tmpdir, size)
+
+        cache.evict()
+
+        self.assertEqual(cache.getNumberOfEntries(), 10)
+        self.assertEqual(cache.getSize(), size)
+        self.assertEqual([os.path.exists(fn) for fn in fns], [False] * 20 + [True] * 10)
+
+        # A corrupt entry is a miss.
+        with open(fns[-1], "r+b") as f:
+            f.truncate(100)
+
+        self.assertEqual(cache.get(os.path.basename(fns[-1]).split(".")[0]), None)
+        self.assertEqual(cache.getNumberOfMisses(), 1)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_framecache.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("====================================================")
+    lg.info(" Logger output from cernatschool/test_framecache.py ")
+    lg.info("====================================================")
+    lg.info("")
+
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the MATH.
+import numpy as np
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the klusters.
+from kluster import KlusterFinder
+
+#...for the data values.
+from datavals import *
+
+#...for the gamma candidate classification.
+from gammas import getSmallShapes, getGammaCategories, GAMMA_SHAPE_TABLE, \
+    NOT_GAMMA, MONOPIXEL, BIPIXEL, TRIPIXEL_GAMMA, TETRAPIXEL_GAMMA
+
+class GammasTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_small_shapes(self):
+
+        ## The number of shapes of each size.
+        n_shapes = [0, 0, 0, 0, 0]
+
+        for mask, offsets in getSmallShapes().iteritems():
+            n_shapes[len(offsets)] += 1
+
+        # The numbers of fixed 8-connected polyplets of size 1 to 4.
+        self.assertEqual(n_shapes[1:], [1, 4, 20, 110])
+
+        # The L-shaped tripixels and the 2x2 square are the only
+        # tri- and tetrapixel gammas.
+        self.assertEqual((GAMMA_SHAPE_TABLE == TRIPIXEL_GAMMA).sum(), 4)
+        self.assertEqual((GAMMA_SHAPE_TABLE == TETRAPIXEL_GAMMA).sum(), 1)
+
+    def test_gamma_categories(self):
+
+        # A monopixel, a diagonal bipixel, an L-shaped tripixel,
+        # a straight tripixel and a 2x2 square.
+        ids = np.array([0, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 4])
+        xs  = np.array([5, 9, 10, 20, 21, 20, 30, 31, 32, 40, 41, 40, 41])
+        ys  = np.array([5, 9, 10, 20, 20, 21, 30, 30, 30, 40, 40, 41, 41])
+
+        cats = getGammaCategories(ids, (256 * ys) + xs, 5, 256)
+
+        self.assertEqual(cats.tolist(), \
+            [MONOPIXEL, BIPIXEL, TRIPIXEL_GAMMA, NOT_GAMMA, TETRAPIXEL_GAMMA])
+
+    def test_lookup_matches_radius_cuts(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        for df in ds.dscfiles[:20]:
+
+            for engine in ["pixel", "label"]:
+
+                ## The cluster finder.
+                kf = KlusterFinder(df.getPixelMap(), 256, 256, False, engine=engine, gammas=False)
+
+                for k in kf.getListOfKlusters():
+
+                    npix = k.getNumberOfPixels()
+                    rad  = k.getRadiusUW()
+
+                    ## Is the cluster a gamma according to the radius cuts?
+                    isgamma = npix == 1 or npix == 2 or \
+                        (npix == 3 and rad < TRIPIXEL_RADIUS) or (npix == 4 and rad < TETRAPIXEL_RADIUS)
+
+                    self.assertEqual(k.isGamma(), isgamma)
+
+                self.assertEqual(kf.getNumberOfGammas(), \
+                    len([k for k in kf.getListOfKlusters() if k.isGamma()]))
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_gammas.txt', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("================================================")
+    lg.info(" Logger output from cernatschool/test_gammas.py ")
+    lg.info("================================================")
+    lg.info("")
+
+    unittest.main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the MATH.
+import numpy as np
+
+#...for copying.
+from copy import deepcopy
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for the klusters.
+from kluster import KlusterFinder
+
+#...for the labelling.
+from labelling import labelPixels, labelPixelStack, labelFrameStack, getStackPixelArrays
+
+#...for the cluster tables.
+from features import getKlusterTableStack
+
+#...for the pixel mask array.
+from helpers import getPixelMaskArray
+
+#...for the 'auto' engine calibration.
+from calibration import getEngineThreshold, calibrateEngineThreshold, getBenchmarkFrames
+
+class LabellingTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_label_pixels(self):
+
+        # Two clusters: a diagonal pair (8-connected) and a lone pixel.
+        Xs = np.array([(256*10) + 10, (256*11) + 11, (256*50) + 50, (256*10) + 11])
+
+        ids, n = labelPixels(Xs, 256, 256)
+
+        self.assertEqual(n, 2)
+        self.assertEqual(ids.tolist(), [0, 0, 1, 0])
+
+    def test_label_pixel_stack(self):
+
+        ## A stack of three frames: a pair at the bottom of the first frame,
+        ## nothing in the second and a pair at the top of the third frame.
+        counts = np.zeros((3, 256, 256), dtype=np.int64)
+        counts[0, 255, 10] = counts[0, 255, 11] = 5
+        counts[2,   0, 10] = counts[2,   0, 11] = 7
+        counts[2, 100, 50] = 3
+
+        Xs, Cs, offsets = getStackPixelArrays(counts)
+
+        self.assertEqual(offsets.tolist(), [0, 2, 2, 5])
+
+        ids, koffsets = labelPixelStack(Xs, offsets, 256, 256)
+
+        # The clusters are never joined across frames.
+        self.assertEqual(ids.tolist(), [0, 0, 1, 1, 2])
+        self.assertEqual(koffsets.tolist(), [0, 1, 1, 3])
+
+        labels, n = labelFrameStack(counts)
+
+        self.assertEqual(n, 3)
+        self.assertEqual(labels[0, 255, 11], labels[0, 255, 10])
+        self.assertNotEqual(labels[2, 0, 10], labels[0, 255, 10])
+
+        ids, t, koffsets = getKlusterTableStack(Xs, Cs, offsets, 256, 256)
+
+        self.assertEqual(t["totalcounts"].tolist(), [10, 14, 3])
+        self.assertEqual(t["n_edgepixels"].tolist(), [2, 2, 1])
+        self.assertEqual(t["isedgekluster"].tolist(), [True, True, False])
+
+    def test_bulk_labelling(self):
+
+        for path in ["testdata/kcldata/ASCIIxyC/", "testdata/kclsim/ASCIIxyC/"]:
+
+            ## The dataset wrapper.
+            ds = Dataset(path)
+
+            for gammas in [True, False]:
+
+                ## The frames, labelled in chunks.
+                frames = ds.getFrames((0.0, 0.0, 0.0), engine="label", chunksize=7, gammas=gammas)
+
+                for df, f in zip(ds.dscfiles, frames):
+
+                    ## The frame's cluster finder.
+                    kf = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="label", gammas=gammas)
+
+                    self.assertEqual(f.getNumberOfKlusters(), kf.getNumberOfKlusters())
+                    self.assertEqual(f.getNumberOfGammas(), kf.getNumberOfGammas())
+
+                    for k_f, k in zip(f.getKlusterFinder().getListOfKlusters(), kf.getListOfKlusters()):
+                        self.assertEqual(k_f.getPixelMap(), k.getPixelMap())
+
+                    t_f, t = f.getKlusterTable(), kf.getKlusterTable()
+
+                    for name in t.dtype.names:
+                        self.assertTrue(np.allclose(t_f[name], t[name]))
+
+    def test_engines_agree(self):
+
+        for path in ["testdata/kcldata/ASCIIxyC/", "testdata/kclsim/ASCIIxyC/"]:
+
+            ## The dataset wrapper.
+            ds = Dataset(path)
+
+            for df in ds.dscfiles:
+
+                ## The pixel-by-pixel cluster finder.
+                kf_p = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="pixel")
+
+                ## The labelling cluster finder.
+                kf_l = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="label")
+
+                self.assertEqual(kf_p.getNumberOfKlusters(), kf_l.getNumberOfKlusters())
+                self.assertEqual(kf_p.getNumberOfGammas(), kf_l.getNumberOfGammas())
+
+                for k_p, k_l in zip(kf_p.getListOfKlusters(), kf_l.getListOfKlusters()):
+                    self.assertEqual(k_p.getPixelMap(), k_l.getPixelMap())
+                    self.assertEqual(k_p.getTotalCounts(), k_l.getTotalCounts())
+                    self.assertAlmostEqual(k_p.getRadiusUW(), k_l.getRadiusUW(), places=6)
+
+    def test_kluster_order(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        for df in ds.dscfiles:
+
+            ## The pixel map.
+            pm = df.getPixelMap()
+
+            ## The pixel mask - every seventh hit pixel.
+            maskdict = dict((X, 1) for X in sorted(pm.keys())[::7])
+
+            # Find the clusters as the original KlusterFinder did: deep copy the
+            # pixel map, remove the masked pixels, and grow a cluster from each
+            # pixel not already in one (in the order of a map of the pixels).
+            data = deepcopy(pm)
+            for X in maskdict:
+                del data[X]
+            #
+            pixels = {}
+            for X, C in data.iteritems():
+                pixels[X] = C
+
+            ## The clusters, in the order they are found.
+            klusters = []
+
+            ## The pixels already in a cluster.
+            found = set()
+
+            for X in pixels:
+                if X in found:
+                    continue
+                kluster, todo = set([X]), [X]
+                while len(todo) > 0:
+                    x, y = todo[-1] % 256, todo.pop() / 256
+                    for nx, ny in [(x + i, y + j) for i in [-1, 0, 1] for j in [-1, 0, 1]]:
+                        if 0 <= nx < 256 and 0 <= ny < 256 and (ny * 256 + nx) in pixels \
+                            and (ny * 256 + nx) not in kluster:
+                            kluster.add(ny * 256 + nx)
+                            todo.append(ny * 256 + nx)
+                found |= kluster
+                klusters.append(sorted(kluster))
+
+            klusters.sort(key=len, reverse=True)
+
+            # Clusters of the same size are in the same order (so have the same IDs).
+            for engine in ["pixel", "label"]:
+
+                ## The cluster finder.
+                kf = KlusterFinder(pm, 256, 256, False, maskdict=maskdict, engine=engine)
+
+                self.assertEqual([sorted(k.getPixelMap().keys()) for k in kf.getListOfKlusters()], klusters)
+
+    def test_compact_klusters(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        for df in ds.dscfiles[:20]:
+
+            ## The pixel-by-pixel cluster finder.
+            kf_p = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="pixel")
+
+            ## The labelling cluster finder, computing only the cluster sizes up front.
+            kf_l = KlusterFinder(df.getPixelMap(), 256, 256, False, engine="label", features="size")
+
+            for k_p, k_l in zip(kf_p.getListOfKlusters(), kf_l.getListOfKlusters()):
+
+                self.assertEqual(sorted(k_p.get_pixel_xy_list()), k_l.get_pixel_xy_list())
+
+                for X in k_p.get_pixel_xy_list():
+                    self.assertTrue(k_l.contains_pixel(X))
+                self.assertFalse(k_l.contains_pixel(-1))
+                self.assertFalse(k_l.contains_pixel(256 * 256))
+
+                self.assertEqual(k_p.getXMin(), k_l.getXMin())
+                self.assertEqual(k_p.getHeight(), k_l.getHeight())
+                self.assertEqual(k_p.isEdgeCluster(), k_l.isEdgeCluster())
+                self.assertEqual(k_p.getMaxCountValue(), k_l.getMaxCountValue())
+                self.assertEqual(k_p.getNumberOfEdgePixels(), k_l.getNumberOfEdgePixels())
+                self.assertAlmostEqual(k_p.getDensityUW(), k_l.getDensityUW(), places=6)
+                self.assertAlmostEqual(k_p.getLinearity(), k_l.getLinearity(), places=3)
+
+            # The lazily calculated properties are stored in the cluster table.
+            self.assertEqual(kf_l.getKlusterTable()["xmin"].tolist(), \
+                [k.getXMin() for k in kf_l.getListOfKlusters()])
+
+    def test_pixel_masking(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The pixel map of the first frame.
+        pm = ds.dscfiles[0].getPixelMap()
+
+        ## The pixel mask - every tenth hit pixel and one pixel that isn't hit.
+        maskdict = dict((X, 1) for X in sorted(pm.keys())[::10])
+        maskdict[max(pm.keys()) + 1] = 1
+
+        ## The mask as a boolean array.
+        mask = getPixelMaskArray(maskdict, 256, 256)
+
+        self.assertEqual(mask.sum(), len(maskdict))
+
+        ## The pixel map with the masked pixels removed by hand.
+        unmasked = dict((X, C) for X, C in pm.iteritems() if X not in maskdict)
+
+        for engine in ["pixel", "label"]:
+
+            ## The cluster finder with the unmasked pixels.
+            kf = KlusterFinder(unmasked, 256, 256, False, engine=engine)
+
+            for m in [maskdict, mask]:
+
+                ## The cluster finder with the masked pixels.
+                kf_m = KlusterFinder(pm, 256, 256, False, maskdict=m, engine=engine)
+
+                self.assertEqual(sorted(sorted(k.getPixelMap().items()) for k in kf.getListOfKlusters()), \
+                    sorted(sorted(k.getPixelMap().items()) for k in kf_m.getListOfKlusters()))
+
+        # The original pixel map is left alone.
+        self.assertEqual(pm, ds.dscfiles[0].getPixelMap())
+
+        ## The frames (with the mask shared between them).
+        frames = ds.getFrames((0.0, 0.0, 0.0), pixelmask=maskdict, skipclustering=True)
+
+        self.assertEqual(frames[0].getNumberOfMaskedPixels(), len(maskdict))
+        self.assertEqual(frames[0].getNumberOfUnmaskedPixels(), len(unmasked))
+
+    def test_auto_engine(self):
+
+        ## The dataset wrapper.
+        ds = Dataset("testdata/kcldata/ASCIIxyC/")
+
+        ## The pixel map of the first frame.
+        pm = ds.dscfiles[0].getPixelMap()
+
+        ## The frame occupancy.
+        occ = float(len(pm)) / (256.0 * 256.0)
+
+        self.assertEqual(KlusterFinder(pm, 256, 256, False, engine="auto", threshold=occ * 2.0).getEngine(), "pixel")
+        self.assertEqual(KlusterFinder(pm, 256, 256, False, engine="auto", threshold=occ / 2.0).getEngine(), "label")
+
+        # The engine used is recorded in the frames.
+        frames = ds.getFrames((0.0, 0.0, 0.0), engine="auto", enginethreshold=0.0)
+        self.assertEqual(set(f.getEngine() for f in frames), set(["label"]))
+
+        self.assertRaises(IOError, KlusterFinder, pm, 256, 256, False, engine="fastest")
+
+    def test_engine_calibration(self):
+
+        # Labelling wins above an occupancy of 0.01.
+        occs = [0.0001, 0.001, 0.02, 0.05]
+        self.assertAlmostEqual(getEngineThreshold(occs, [1.0, 2.0, 5.0, 9.0], [3.0, 3.0, 3.0, 3.0]), \
+            np.sqrt(0.001 * 0.02))
+
+        # One engine always wins.
+        self.assertEqual(getEngineThreshold(occs, [1.0, 1.0, 1.0, 1.0], [2.0, 2.0, 2.0, 2.0]), 1.0)
+        self.assertEqual(getEngineThreshold(occs, [2.0, 2.0, 2.0, 2.0], [1.0, 1.0, 1.0, 1.0]), 0.0)
+
+        ## The calibrated threshold from a quick benchmark.
+        th = calibrateEngineThreshold(getBenchmarkFrames(occupancies=[0.0001, 0.05]), repeats=1)
+
+        self.assertTrue(0.0 <= th <= 1.0)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_labelling.txt', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("===================================================")
+    lg.info(" Logger output from cernatschool/test_labelling.py ")
+    lg.info("===================================================")
+    lg.info("")
+
+    unittest.main()
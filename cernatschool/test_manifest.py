@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the Pixelman dataset wrapper.
+from dataset import Dataset
+
+#...for counting the files opened.
+import __builtin__
+
+#...for the dataset manifests.
+from manifest import getManifestPath
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.tmpdir, "ASCIIxyC")
+        shutil.copytree("testdata/kcldata/ASCIIxyC", self.folder)
+        if os.path.exists(getManifestPath(self.folder)):
+            os.remove(getManifestPath(self.folder))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_reopen_from_manifest(self):
+
+        ## The dataset, opened without a manifest.
+        ds = Dataset(self.folder)
+
+        self.assertTrue(os.path.isfile(getManifestPath(self.folder)))
+
+        ## The files opened.
+        opens = []
+
+        ## The built-in open function.
+        builtin_open = __builtin__.open
+
+        def counting_open(fn, *args, **kwargs):
+            opens.append(fn)
+            return builtin_open(fn, *args, **kwargs)
+
+        # Re-opening the dataset only reads the manifest.
+        __builtin__.open = counting_open
+        try:
+            ds_m = Dataset(self.folder)
+        finally:
+            __builtin__.open = builtin_open
+
+        self.assertEqual(opens, [getManifestPath(self.folder)])
+
+        self.assertEqual(ds_m.getNumberOfDataFiles(), ds.getNumberOfDataFiles())
+        self.assertEqual(ds_m.getFormat(), ds.getFormat())
+
+        for df, mf in zip(ds.dscfiles, ds_m.dscfiles):
+            self.assertEqual(mf.getDscFilename(), df.getDscFilename())
+            self.assertEqual(mf.getStartTime(), df.getStartTime())
+            self.assertEqual(mf.getStartTimeS(), df.getStartTimeS())
+            self.assertEqual(mf.getChipId(), df.getChipId())
+            self.assertEqual(mf.getDACs(), df.getDACs())
+            self.assertEqual(mf.getBiasVoltage(), df.getBiasVoltage())
+            self.assertEqual(mf.getPixelMap(), df.getPixelMap())
+
+    def test_stale_manifest(self):
+
+        Dataset(self.folder)
+
+        # Remove a DSC file - the manifest is no longer valid.
+        os.remove(os.path.join(self.folder, "data005.txt.dsc"))
+
+        with self.assertRaises(IOError) as e:
+            Dataset(self.folder)
+        self.assertEqual(str(e.exception), "MISSING_DSC")
+
+        # Without the data file the dataset is fine again.
+        os.remove(os.path.join(self.folder, "data005.txt"))
+
+        self.assertEqual(Dataset(self.folder).getNumberOfDataFiles(), 119)
+
+        # A corrupt manifest is ignored (and replaced).
+        with open(getManifestPath(self.folder), "w") as mf:
+            mf.write("{")
+
+        self.assertEqual(Dataset(self.folder).getNumberOfDataFiles(), 119)
+        self.assertEqual(Dataset(self.folder).getNumberOfDataFiles(), 119)
+
+    def test_no_manifest(self):
+
+        Dataset(self.folder, usemanifest=False)
+
+        self.assertFalse(os.path.exists(getManifestPath(self.folder)))
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_manifest.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("==================================================")
+    lg.info(" Logger output from cernatschool/test_manifest.py ")
+    lg.info("==================================================")
+    lg.info("")
+
+    unittest.main()
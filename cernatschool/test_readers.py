@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the JSON.
+import json
+
+#...for the compressed JSON Lines.
+import gzip
+
+#...for the output writers.
+from writers import openOutputWriter, NpyColumnsWriter, getKlusterColumnTypes
+
+#...for the output readers.
+from readers import findOutputFile, loadEntries, convertToJson, findKlusterColumns, getKlusterColumns
+
+class ReadersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        ## The entries written.
+        self.entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2.5}, {"id" : "c", "size" : 3}]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, fmt):
+        w = openOutputWriter(os.path.join(self.tmpdir, name), fmt)
+        w.append(self.entries)
+        w.close()
+
+    def test_read_all_formats(self):
+
+        self.assertEqual(findOutputFile(self.tmpdir, "klusters"), None)
+
+        for fmt, ext in [("json", ".json"), ("jsonl.gz", ".jsonl.gz"), ("jsonl", ".jsonl")]:
+
+            self.write("klusters", fmt)
+
+            # JSON Lines are preferred to the legacy JSON list.
+            self.assertEqual(findOutputFile(self.tmpdir, "klusters"), os.path.join(self.tmpdir, "klusters" + ext))
+
+            self.assertEqual(loadEntries(os.path.join(self.tmpdir, "klusters" + ext)), self.entries)
+
+    def test_incomplete_last_line(self):
+
+        self.write("frames", "jsonl")
+
+        ## The JSON Lines file.
+        fn = os.path.join(self.tmpdir, "frames.jsonl")
+
+        # Stop part of the way through the last entry.
+        with open(fn, "a") as f:
+            f.write('{"id" : "d", "si')
+
+        self.assertEqual(loadEntries(fn), self.entries)
+
+    def test_gzip_members(self):
+
+        self.write("frames", "jsonl.gz")
+
+        ## The gzipped JSON Lines file.
+        fn = os.path.join(self.tmpdir, "frames.jsonl.gz")
+
+        # Append a second gzip member that hasn't been closed.
+        f = gzip.open(fn, "ab")
+        f.write(json.dumps(self.entries[0]) + "\n")
+        f.flush()
+
+        self.assertEqual(loadEntries(fn), self.entries + self.entries[:1])
+
+        f.close()
+
+    def test_convert_to_json(self):
+
+        for fmt in ["jsonl", "jsonl.gz"]:
+
+            self.write("frames", fmt)
+
+            ## The legacy JSON list file.
+            fn = os.path.join(self.tmpdir, "frames.json")
+
+            self.assertEqual(convertToJson(os.path.join(self.tmpdir, "frames." + fmt), fn), 3)
+
+            # The JSON list is identical to one written all at once.
+            self.assertEqual(open(fn, "r").read(), json.dumps(self.entries))
+
+    def test_kluster_columns(self):
+
+        ## The cluster information.
+        entries = [{"id" : "k%d" % (i), "size" : i + 1, "ismc" : False} for i in range(4)]
+
+        w = openOutputWriter(os.path.join(self.tmpdir, "klusters"), "jsonl")
+        w.append(entries)
+        w.close()
+
+        self.assertEqual(findKlusterColumns(self.tmpdir), None)
+
+        w = NpyColumnsWriter(os.path.join(self.tmpdir, "klustercolumns"), getKlusterColumnTypes("size"))
+        w.append(entries, 0)
+        w.close()
+
+        self.assertEqual(findKlusterColumns(self.tmpdir), os.path.join(self.tmpdir, "klustercolumns"))
+
+        # The columns are the same from either output.
+        for path in [os.path.join(self.tmpdir, "klusters.jsonl"), findKlusterColumns(self.tmpdir)]:
+
+            ## The cluster size column.
+            columns = getKlusterColumns(path, ["size"])
+
+            self.assertEqual(columns.keys(), ["size"])
+            self.assertEqual(columns["size"].tolist(), [1, 2, 3, 4])
+
+            with self.assertRaises(IOError) as e:
+                getKlusterColumns(path, ["radius_uw"])
+            self.assertEqual(str(e.exception), "NO_COLUMN")
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_readers.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("=================================================")
+    lg.info(" Logger output from cernatschool/test_readers.py ")
+    lg.info("=================================================")
+    lg.info("")
+
+    unittest.main()
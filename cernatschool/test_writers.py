@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#...the usual suspects.
+import os, inspect
+
+#...for the unit testing.
+import unittest
+
+#...for the logging.
+import logging as lg
+
+#...for the temporary files.
+import tempfile, shutil
+
+#...for the JSON.
+import json
+
+#...for the compressed JSON Lines.
+import gzip
+
+#...for the output writers.
+from writers import JsonListWriter, JsonLinesWriter, openOutputWriter, NpyColumnsWriter, getKlusterColumnTypes
+
+#...for reading the outputs.
+from readers import loadEntries
+
+#...for the MATH.
+import numpy as np
+
+class WritersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_json_list_writer(self):
+
+        ## The entries to write.
+        entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2}, {"id" : "c", "size" : 3.5}]
+
+        ## The JSON file.
+        fn = os.path.join(self.tmpdir, "klusters.json")
+
+        ## The writer.
+        w = JsonListWriter(fn)
+
+        # The file is a valid (empty) list before anything is written...
+        self.assertEqual(json.load(open(fn, "r")), [])
+
+        w.append(entries[:1])
+        w.append([])
+
+        # ...and after every batch.
+        self.assertEqual(json.load(open(fn, "r")), entries[:1])
+
+        w.append(entries[1:])
+        w.close()
+
+        self.assertEqual(json.load(open(fn, "r")), entries)
+
+        # The file is the same as one written all at once.
+        self.assertEqual(open(fn, "r").read(), json.dumps(entries))
+
+    def test_json_list_writer_encoded(self):
+
+        ## The entries to write.
+        entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2}]
+
+        ## The JSON file.
+        fn = os.path.join(self.tmpdir, "frames.json")
+
+        ## The writer.
+        w = JsonListWriter(fn)
+
+        w.appendEncoded([json.dumps(entries[0])])
+        w.append(entries[1:])
+        w.close()
+
+        self.assertEqual(w.getNumberOfEntries(), 2)
+
+        self.assertEqual(open(fn, "r").read(), json.dumps(entries))
+
+    def test_json_lines_writer(self):
+
+        ## The entries to write.
+        entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2}, {"id" : "c", "size" : 3.5}]
+
+        ## The JSON Lines file.
+        fn = os.path.join(self.tmpdir, "klusters.jsonl")
+
+        ## The writer (flushing every two entries).
+        w = JsonLinesWriter(fn, flushentries=2)
+
+        w.append(entries[:1])
+
+        # Nothing has been flushed yet...
+        self.assertEqual(open(fn, "r").read(), "")
+
+        w.appendEncoded([json.dumps(entries[1])])
+
+        # ...until two entries have been written.
+        self.assertEqual(open(fn, "r").read(), "".join(json.dumps(e) + "\n" for e in entries[:2]))
+
+        w.append(entries[2:])
+        w.close()
+
+        self.assertEqual(w.getNumberOfEntries(), 3)
+
+        self.assertEqual([json.loads(line) for line in open(fn, "r")], entries)
+
+    def test_gzipped_json_lines_writer(self):
+
+        ## The entries to write.
+        entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2}]
+
+        ## The writer.
+        w = openOutputWriter(os.path.join(self.tmpdir, "frames"), "jsonl.gz")
+        w.append(entries)
+        w.close()
+
+        ## The gzipped JSON Lines file.
+        fn = os.path.join(self.tmpdir, "frames.jsonl.gz")
+
+        self.assertEqual([json.loads(line) for line in gzip.open(fn, "rb")], entries)
+
+        with self.assertRaises(IOError) as e:
+            openOutputWriter(os.path.join(self.tmpdir, "frames"), "xml")
+        self.assertEqual(str(e.exception), "BAD_OUTPUT_FORMAT")
+
+    def test_flush_while_open(self):
+
+        ## The entries to write.
+        entries = [{"id" : "a", "size" : 1}, {"id" : "b", "size" : 2}]
+
+        for fmt in ["json", "jsonl", "jsonl.gz"]:
+
+            ## The writer (as used by process-frames.py).
+            w = openOutputWriter(os.path.join(self.tmpdir, "frames"), fmt)
+
+            ## The output file.
+            fn = os.path.join(self.tmpdir, "frames." + fmt)
+
+            w.append(entries[:1])
+            w.flush()
+
+            # The flushed entries can be read while the file is still open...
+            self.assertEqual(loadEntries(fn), entries[:1])
+
+            w.append(entries[1:])
+            w.flush()
+
+            # ...including those added since.
+            self.assertEqual(loadEntries(fn), entries)
+
+            w.close()
+
+        ## The columns folder.
+        fn = os.path.join(self.tmpdir, "klustercolumns")
+
+        ## The columns writer.
+        w = NpyColumnsWriter(fn, getKlusterColumnTypes("size"))
+
+        w.append([{"size" : 3, "ismc" : False, "isedgekluster" : False}], 0)
+        w.flush()
+
+        self.assertEqual(np.load(os.path.join(fn, "size.npy"), mmap_mode="r").tolist(), [3])
+
+        w.close()
+
+    def test_npy_columns_writer(self):
+
+        ## The columns for the size and extent features.
+        columns = getKlusterColumnTypes("size,extent")
+
+        self.assertEqual([name for name, dtype in columns], \
+            ["frame", "size", "xmin", "xmax", "ymin", "ymax", "width", "height", "ismc", "isedgekluster"])
+
+        ## The entries to write.
+        entries = [{"size" : 3, "ismc" : False, "xmin" : 1.0, "xmax" : 2.0, "ymin" : 0.0, "ymax" : 1.0, \
+            "width" : 2.0, "height" : 2.0, "isedgekluster" : i % 2 == 0} for i in range(5)]
+
+        ## The columns folder.
+        fn = os.path.join(self.tmpdir, "klustercolumns")
+
+        ## The writer (flushing every three entries).
+        w = NpyColumnsWriter(fn, columns, flushentries=3)
+
+        # The (empty) columns can be loaded straight away...
+        self.assertEqual(np.load(os.path.join(fn, "size.npy")).shape, (0,))
+
+        w.append(entries[:2], 0)
+        w.append(entries[2:4], 2)
+
+        # ...and after every flush.
+        self.assertEqual(np.load(os.path.join(fn, "frame.npy"), mmap_mode="r").tolist(), [0, 0, 2, 2])
+
+        w.append(entries[4:], 3)
+        w.close()
+
+        self.assertEqual(w.getNumberOfEntries(), 5)
+
+        ## The edge cluster column.
+        edges = np.load(os.path.join(fn, "isedgekluster.npy"), mmap_mode="r")
+
+        self.assertEqual(edges.dtype, np.bool_)
+        self.assertEqual(edges.tolist(), [e["isedgekluster"] for e in entries])
+
+        self.assertEqual(np.load(os.path.join(fn, "xmin.npy")).dtype, np.int32)
+
+
+if __name__ == "__main__":
+
+    lg.basicConfig(filename='log_test_writers.log', filemode='w', level=lg.DEBUG)
+
+    lg.info("")
+    lg.info("=================================================")
+    lg.info(" Logger output from cernatschool/test_writers.py ")
+    lg.info("=================================================")
+    lg.info("")
+
+    unittest.main()
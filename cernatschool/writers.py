@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Writers for the frame and cluster property outputs.
+
+The outputs are written as the frames are processed, rather than all at
+once at the end, so that they can be read while processing continues.
+The default format is JSON Lines (one entry per line, optionally
+gzipped); the legacy format is a single JSON list.
+
+The cluster properties are also written as columns: one NumPy .npy file
+per property, which can be memory-mapped and read on their own.
+
+Each writer can checkpoint its output (write everything out to disk and
+return its state), and be re-opened from a checkpointed state to carry
+on where it left off (see checkpoint.py).
+"""
+
+# The usual suspects.
+import os
+
+#...for the JSON.
+import json
+
+#...for the compressed JSON Lines.
+import gzip
+
+#...for the logging.
+import logging as lg
+
+#...for the .npy file headers.
+import struct
+
+#...for the MATH.
+import numpy as np
+
+#...for the cluster property types.
+from features import KLUSTER_TABLE_DTYPE
+
+#...for the feature sets.
+from helpers import getFeatureSet
+
+#...for the data values.
+from datavals import *
+
+def openForResume(filename, size):
+    """
+    Open an output file to carry on writing after a checkpoint.
+
+    Anything written after the checkpoint is removed.
+
+    @param [in] filename The path to the output file.
+    @param [in] size The size of the file at the checkpoint [bytes].
+    @returns The file, positioned at its end.
+    """
+
+    if not os.path.isfile(filename) or os.path.getsize(filename) < size:
+        lg.debug(" * '%s' is shorter than at its checkpoint." % (filename))
+        raise IOError("BAD_CHECKPOINT")
+
+    ## The output file.
+    f = open(filename, "r+b")
+
+    f.truncate(size)
+
+    f.seek(0, 2)
+
+    return f
+
+def syncFile(f):
+    """ Write a file's contents out to disk. """
+
+    f.flush()
+
+    os.fsync(f.fileno())
+
+class JsonListWriter:
+    """
+    Writes a JSON list one batch of entries at a time.
+
+    The file is a complete JSON list (identical to json.dump of all of
+    the entries) after every batch: each batch is written over the
+    closing bracket, which is then written again.
+    """
+
+    def __init__(self, filename, resume=None):
+        """
+        The constructor.
+
+        @param [in] filename The path to the JSON file (any existing file is replaced).
+        @param [in] resume The checkpointed state to carry on from (None to start afresh).
+        """
+
+        if resume is not None:
+
+            ## The JSON file.
+            self.__f = openForResume(filename, resume["size"])
+
+            ## The number of entries written.
+            self.__n = resume["entries"]
+
+            return
+
+        self.__f = open(filename, "w")
+
+        self.__n = 0
+
+        self.__f.write("[]")
+
+        self.__f.flush()
+
+    def getNumberOfEntries(self):
+        return self.__n
+
+    def append(self, entries):
+        """ Add a batch of entries to the list. """
+
+        self.appendEncoded([json.dumps(entry) for entry in entries])
+
+    def appendEncoded(self, encoded):
+        """ Add a batch of entries, already encoded as JSON, to the list. """
+
+        if len(encoded) == 0:
+            return
+
+        # Overwrite the closing bracket.
+        self.__f.seek(-1, 2)
+
+        if self.__n > 0:
+            self.__f.write(", ")
+
+        self.__f.write(", ".join(encoded))
+
+        self.__f.write("]")
+
+        self.__f.flush()
+
+        self.__n += len(encoded)
+
+    def flush(self):
+        """ Write out the entries added so far (each batch already is). """
+
+        pass
+
+    def checkpoint(self):
+        """ Write everything out to disk, returning the state to resume from. """
+
+        syncFile(self.__f)
+
+        return {"size" : self.__f.tell(), "entries" : self.__n}
+
+    def close(self):
+        self.__f.close()
+
+class JsonLinesWriter:
+    """
+    Writes entries as JSON Lines (one JSON entry per line).
+
+    The file is flushed every OUTPUT_FLUSH_ENTRIES entries (and when
+    closed), so at most that many entries are lost if processing stops
+    unexpectedly. An incomplete last line is ignored when reading.
+
+    Gzipped files are written as a new gzip member after each checkpoint,
+    so that the file can be cut back to a checkpoint and carried on.
+    """
+
+    def __init__(self, filename, compress=False, flushentries=OUTPUT_FLUSH_ENTRIES, resume=None):
+        """
+        The constructor.
+
+        @param [in] filename The path to the JSON Lines file (any existing file is replaced).
+        @param [in] compress Write the file gzipped?
+        @param [in] flushentries The number of entries written between flushes.
+        @param [in] resume The checkpointed state to carry on from (None to start afresh).
+        """
+
+        ## The path to the JSON Lines file.
+        self.__filename = filename
+
+        ## Write the file gzipped?
+        self.__compress = compress
+
+        ## The JSON Lines file.
+        self.__f = None
+        #
+        if resume is None:
+            self.__f = open(filename, "wb")
+        else:
+            self.__f = openForResume(filename, resume["size"])
+
+        ## The gzipped file (written to the JSON Lines file; None if not compressed).
+        self.__gz = None
+        #
+        if compress:
+            self.__gz = gzip.GzipFile(filename, "wb", fileobj = self.__f)
+
+        ## The number of entries written between flushes.
+        self.__flush_entries = flushentries
+
+        ## The number of entries written.
+        self.__n = 0 if resume is None else resume["entries"]
+
+        ## The number of entries written since the last flush.
+        self.__n_unflushed = 0
+
+    def getNumberOfEntries(self):
+        return self.__n
+
+    def append(self, entries):
+        """ Add a batch of entries. """
+
+        self.appendEncoded([json.dumps(entry) for entry in entries])
+
+    def appendEncoded(self, encoded):
+        """ Add a batch of entries, already encoded as JSON. """
+
+        ## The file the entries are written to.
+        f = self.__gz if self.__compress else self.__f
+
+        for line in encoded:
+            f.write(line + "\n")
+
+        self.__n += len(encoded)
+
+        self.__n_unflushed += len(encoded)
+
+        if self.__n_unflushed >= self.__flush_entries:
+            self.flush()
+
+    def flush(self):
+        """ Write out the entries added so far. """
+
+        if self.__compress:
+            self.__gz.flush()
+
+        self.__f.flush()
+
+        self.__n_unflushed = 0
+
+    def checkpoint(self):
+        """ Write everything out to disk, returning the state to resume from. """
+
+        # Finish the gzip member (the next is started after the checkpoint).
+        if self.__compress:
+            self.__gz.close()
+
+        syncFile(self.__f)
+
+        self.__n_unflushed = 0
+
+        ## The state to resume from.
+        state = {"size" : self.__f.tell(), "entries" : self.__n}
+
+        if self.__compress:
+            self.__gz = gzip.GzipFile(self.__filename, "wb", fileobj = self.__f)
+
+        return state
+
+    def close(self):
+
+        if self.__compress:
+            self.__gz.close()
+
+        self.__f.close()
+
+def openOutputWriter(path, fmt, resume=None):
+    """
+    Open a writer for a frame or cluster information output.
+
+    @param [in] path The path to the output, without the file extension.
+    @param [in] fmt The output format (see OUTPUT_FORMATS).
+    @param [in] resume The checkpointed state to carry on from (None to start afresh).
+    @returns The writer.
+    """
+
+    if fmt not in OUTPUT_FORMATS:
+        raise IOError("BAD_OUTPUT_FORMAT")
+
+    ## The output file name.
+    filename = path + OUTPUT_FORMATS[fmt]
+
+    if fmt == "json":
+        return JsonListWriter(filename, resume = resume)
+
+    return JsonLinesWriter(filename, compress = (fmt == "jsonl.gz"), resume = resume)
+
+def getNpyHeader(dtype, n):
+    """
+    Get the header of a one-dimensional .npy file.
+
+    The header is always NPY_HEADER_SIZE bytes long, so that it can be
+    rewritten in place as the number of entries grows.
+
+    @param [in] dtype The NumPy type of the entries.
+    @param [in] n The number of entries.
+    @returns The header.
+    """
+
+    ## The array description.
+    d = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (dtype.str, n)
+
+    return "\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_SIZE - 10) + d.ljust(NPY_HEADER_SIZE - 11) + "\n"
+
+def getKlusterColumnTypes(features=None):
+    """
+    Get the cluster information columns written for a set of features.
+
+    The "frame" column is the index of the cluster's frame in the frame
+    information.
+
+    @param [in] features The feature groups (see getFeatureSet).
+    @returns A list of the (column name, NumPy type).
+    """
+
+    ## The cluster properties included.
+    names = set(["size", "ismc"])
+    #
+    for f in getFeatureSet(features):
+        names.update(KLUSTER_FEATURES[f])
+
+    return [("frame", np.dtype("<i8"))] + \
+        [(name, KLUSTER_TABLE_DTYPE[name]) for name in KLUSTER_TABLE_DTYPE.names if name in names]
+
+class NpyColumnsWriter:
+    """
+    Writes entries as columns: one .npy file per property.
+
+    The entries are buffered and written every OUTPUT_FLUSH_ENTRIES
+    entries (and when closed). The column file headers are then updated,
+    so each column can always be loaded (and memory-mapped) in full.
+    """
+
+    def __init__(self, foldername, columns, flushentries=OUTPUT_FLUSH_ENTRIES, resume=None):
+        """
+        The constructor.
+
+        @param [in] foldername The path to the folder for the columns (created if needed).
+        @param [in] columns A list of the (column name, NumPy type).
+        @param [in] flushentries The number of entries written between flushes.
+        @param [in] resume The checkpointed state to carry on from (None to start afresh).
+        """
+
+        if not os.path.isdir(foldername):
+            os.mkdir(foldername)
+
+        ## The columns.
+        self.__columns = columns
+
+        ## The number of entries written.
+        self.__n = 0 if resume is None else resume["entries"]
+
+        ## The column files {name : file}.
+        self.__files = {}
+        #
+        for name, dtype in columns:
+
+            ## The path to the column file.
+            fn = os.path.join(foldername, name + ".npy")
+
+            if resume is None:
+                self.__files[name] = open(fn, "w+b")
+            else:
+                self.__files[name] = openForResume(fn, NPY_HEADER_SIZE + self.__n * dtype.itemsize)
+
+            self.__files[name].seek(0)
+            self.__files[name].write(getNpyHeader(dtype, self.__n))
+            self.__files[name].flush()
+
+        ## The entries not yet written {name : values}.
+        self.__buffers = dict((name, []) for name, dtype in columns)
+
+        ## The number of entries written between flushes.
+        self.__flush_entries = flushentries
+
+        ## The number of entries written since the last flush.
+        self.__n_unflushed = 0
+
+    def getNumberOfEntries(self):
+        return self.__n
+
+    def append(self, entries, frame):
+        """
+        Add a frame's entries.
+
+        @param [in] entries The cluster information of the frame's clusters.
+        @param [in] frame The index of the frame (the "frame" column).
+        """
+
+        for name, dtype in self.__columns:
+            if name == "frame":
+                self.__buffers[name].extend([frame] * len(entries))
+            else:
+                self.__buffers[name].extend(entry[name] for entry in entries)
+
+        self.__n += len(entries)
+
+        self.__n_unflushed += len(entries)
+
+        if self.__n_unflushed >= self.__flush_entries:
+            self.flush()
+
+    def flush(self):
+        """ Write out the entries added so far. """
+
+        for name, dtype in self.__columns:
+
+            ## The column file.
+            f = self.__files[name]
+
+            f.seek(0, 2)
+            f.write(np.array(self.__buffers[name], dtype=dtype).tostring())
+
+            # Update the number of entries in the header.
+            f.seek(0)
+            f.write(getNpyHeader(dtype, self.__n))
+
+            f.flush()
+
+            self.__buffers[name] = []
+
+        self.__n_unflushed = 0
+
+    def checkpoint(self):
+        """ Write everything out to disk, returning the state to resume from. """
+
+        self.flush()
+
+        for f in self.__files.values():
+            syncFile(f)
+
+        return {"entries" : self.__n}
+
+    def close(self):
+
+        self.flush()
+
+        for f in self.__files.values():
+            f.close()
@@ -30,6 +30,9 @@ from plotting.histograms import Hist, Hist2D
 #...for processing and wrapping the kluster properties.
 from cernatschool.klusterhelpers import KlusterProperties
 
+#...for finding the cluster information (in any output format).
+from cernatschool.readers import findOutputFile, findKlusterColumns
+
 #...for the comparison histograms.
 from plotting.histograms import HistCompare
 
@@ -92,20 +95,20 @@ if __name__ == "__main__":
     lg.info(" * Creating directory '%s'..." % (kppath))
     lg.info("")
 
-    ## The path to the real data klusters JSON.
-    dat_klusters_path = (datpath + "/klusters.json").replace('//', '/')
+    ## The path to the real data cluster information.
+    dat_klusters_path = findKlusterColumns(datpath) or findOutputFile(datpath, "klusters")
     #
-    if not os.path.exists(dat_klusters_path):
-        raise IOError("* ERROR: '%s' does not exist!" % (dat_klusters_path))
+    if dat_klusters_path is None:
+        raise IOError("* ERROR: no cluster information found in '%s'!" % (datpath))
 
     ## The real data cluster properties wrapper.
     dat_kl_prop = KlusterProperties(dat_klusters_path)
 
-    ## The path to the simulated data klusters JSON.
-    sim_klusters_path = (simpath + "/klusters.json").replace('//', '/')
+    ## The path to the simulated data cluster information.
+    sim_klusters_path = findKlusterColumns(simpath) or findOutputFile(simpath, "klusters")
     #
-    if not os.path.exists(sim_klusters_path):
-        raise IOError("* ERROR: '%s' does not exist!" % (sim_klusters_path))
+    if sim_klusters_path is None:
+        raise IOError("* ERROR: no cluster information found in '%s'!" % (simpath))
 
     ## The simulated data cluster properties wrapper.
     sim_kl_prop = KlusterProperties(sim_klusters_path)
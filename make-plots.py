@@ -21,8 +21,14 @@ import logging as lg
 #...for file manipulation.
 from shutil import rmtree
 
-# Import the JSON library.
-import json
+#...for the MATH.
+import numpy as np
+
+#...for reading the frame and cluster information (in any output format).
+from cernatschool.readers import findOutputFile, findKlusterColumns, loadEntries, getKlusterColumns
+
+#...for the cluster properties used.
+from cernatschool.klusterhelpers import KLUSTER_PROPERTY_COLUMNS
 
 #...for the histograms.
 from plotting.histograms import Hist, Hist2D
@@ -91,17 +97,21 @@ if __name__ == "__main__":
     lg.info(" * Creating directory '%s'..." % (kppath))
     lg.info("")
 
-    ## The frame properties JSON file - FIXME: check it exists...
-    ff = open(datapath + "/frames.json", "r")
+    ## The frame properties file.
+    ff = findOutputFile(datapath, "frames")
     #
-    fd = json.load(ff)
-    ff.close()
+    if ff is None:
+        raise IOError("* ERROR: no frame information found in '%s'!" % (datapath))
+    #
+    fd = loadEntries(ff)
 
-    ## The cluster properties JSON file - FIXME: check it exists...
-    kf = open(datapath + "/klusters.json", "r")
+    ## The cluster properties columns (or file, if the columns weren't written).
+    kf = findKlusterColumns(datapath) or findOutputFile(datapath, "klusters")
+    #
+    if kf is None:
+        raise IOError("* ERROR: no cluster information found in '%s'!" % (datapath))
     #
-    kd = json.load(kf)
-    kf.close()
+    kd = getKlusterColumns(kf, KLUSTER_PROPERTY_COLUMNS)
 
 
     # The frames
@@ -148,7 +158,7 @@ if __name__ == "__main__":
     fp += "      <ul>\n"
     fp += "        <li>Dataset path = '%s'</li>\n" % (datapath)
     fp += "        <li>Number of frames = %d</li>\n" % (len(fd))
-    fp += "        <li>Number of clusters (dat.) = %d</li>\n" % (len(kd))
+    fp += "        <li>Number of clusters (dat.) = %d</li>\n" % (len(kd["size"]))
     fp += "      </ul>\n"
     fp += "    </p>\n"
     fp += "    <h2>Frame properties</h2>\n"
@@ -175,30 +185,17 @@ if __name__ == "__main__":
     # Clusters
     #----------
 
-    ## A list of clusters.
-    klusters = []
-
-    # Create container lists for the cluster properties.
-    cluster_size      = []
-    cluster_counts    = []
-    cluster_maxcounts = []
-    cluster_radius_u  = []
-    cluster_density_u = []
-    cluster_linearity = []
-    cluster_innerfrac = []
-
-    # Loop over the klusters.
-    for k in kd:
-
-        # Add to the cluster property dictionaries.
-        if not k["isedgekluster"]:
-            cluster_size.append(     k["size"])
-            cluster_radius_u.append( k["radius_uw"])
-            cluster_density_u.append(k["density_uw"])
-            cluster_linearity.append(k["lin_linearity"])
-            cluster_innerfrac.append(k["innerfrac"])
-            cluster_counts.append(   k["totalcounts"])
-            cluster_maxcounts.append(k["maxcounts"])
+    ## The clusters not on the edge of the frame.
+    inner = np.logical_not(np.asarray(kd["isedgekluster"], dtype=bool))
+
+    # Create the cluster property lists.
+    cluster_size      = kd["size"][inner].tolist()
+    cluster_counts    = kd["totalcounts"][inner].tolist()
+    cluster_maxcounts = kd["maxcounts"][inner].tolist()
+    cluster_radius_u  = kd["radius_uw"][inner].tolist()
+    cluster_density_u = kd["density_uw"][inner].tolist()
+    cluster_linearity = kd["lin_linearity"][inner].tolist()
+    cluster_innerfrac = kd["innerfrac"][inner].tolist()
 
     # Cluster plots
     #---------------
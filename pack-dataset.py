@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+
+ CERN@school - Packing Datasets
+
+ See the README.md file for more information.
+
+"""
+
+# Import the code needed to manage files.
+import os
+
+#...for parsing the arguments.
+import argparse
+
+#...for the logging.
+import logging as lg
+
+# Import the JSON library.
+import json
+
+#...for processing the datasets.
+from cernatschool.dataset import Dataset
+
+#...for writing the binary frame archive.
+from cernatschool.archive import packDataset
+
+#...for loading the pixel mask.
+from cernatschool.helpers import loadPixelMask
+
+
+if __name__ == "__main__":
+
+    print("*")
+    print("*===============================*")
+    print("* CERN@school - dataset packing *")
+    print("*===============================*")
+
+    # Get the datafile path from the command line.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputPath",       help="Path to the input dataset.")
+    parser.add_argument("archivePath",     help="The path of the archive to write.")
+    parser.add_argument("-v", "--verbose", help="Increase output verbosity", action="store_true")
+    args = parser.parse_args()
+
+    ## The path to the dataset.
+    datapath = args.inputPath
+
+    ## The path to the archive.
+    archivepath = args.archivePath
+
+    # Set the logging level.
+    if args.verbose:
+        level=lg.DEBUG
+    else:
+        level=lg.INFO
+
+    # Configure the logging.
+    lg.basicConfig(filename=archivepath + '.log', filemode='w', level=level)
+
+    print("*")
+    print("* Input path                  : '%s'" % (datapath))
+    print("* Archive path                : '%s'" % (archivepath))
+    print("*")
+
+    ## The dataset to pack.
+    ds = Dataset(datapath + "/ASCIIxyC/")
+
+    ## The frame width and height.
+    width, height = 256, 256
+    #
+    if len(ds.dscfiles) > 0:
+        width, height = ds.dscfiles[0].getFrameWidth(), ds.dscfiles[0].getFrameHeight()
+
+    ## The dataset metadata (if there is any).
+    fmd = None
+    #
+    if os.path.exists(datapath + "/metadata.json"):
+        with open(datapath + "/metadata.json", "r") as fmdf:
+            fmd = json.load(fmdf)
+
+    ## The pixel mask (if there is one).
+    pixel_mask = None
+    #
+    if os.path.exists(datapath + "/masked_pixels.txt"):
+        pixel_mask = loadPixelMask(datapath + "/masked_pixels.txt", height, width)
+
+    ## The number of frames packed.
+    n_frames = packDataset(ds, archivepath, fmd, pixel_mask)
+
+    print("* Packed %d frames into '%s'." % (n_frames, archivepath))
+    print("*")
@@ -12,9 +12,15 @@
 # Import the code needed to manage files.
 import os, glob
 
+#...for waiting between polls of a watched folder.
+import time
+
 #...for parsing the arguments.
 import argparse
 
+#...for processing the frames in parallel.
+from multiprocessing import Pool
+
 #...for the logging.
 import logging as lg
 
@@ -30,8 +36,162 @@ from cernatschool.dataset import Dataset
 #...for making the frame and clusters images.
 from visualisation.visualisation import makeFrameImage, makeKlusterImage
 
-#...for getting the cluster properties JSON.
-from cernatschool.helpers import getKlusterPropertiesJson
+#...for the default 'auto' clustering engine threshold and read-ahead settings.
+from cernatschool.datavals import AUTO_ENGINE_OCCUPANCY, PREFETCH_DEPTH, IO_THREADS, WATCH_INTERVAL, FRAME_CHUNK_SIZE, OUTPUT_FORMATS, KLUSTER_COLUMNS_FOLDER, CHECKPOINT_FRAMES, FRAME_CACHE_SIZE
+
+#...for calibrating the 'auto' clustering engine threshold.
+from cernatschool.calibration import calibrateEngineThreshold
+
+#...for getting the cluster properties JSON and the pixel mask.
+from cernatschool.helpers import getKlusterPropertiesJson, loadPixelMask, getPixelMaskFromBuffer
+
+#...for reading binary frame archives.
+from cernatschool.archive import isArchive
+
+#...for reading tar and zip dataset bundles.
+from cernatschool.bundle import isBundle, isTarBundle
+
+#...for writing the frame and cluster information as it is made.
+from cernatschool.writers import openOutputWriter, NpyColumnsWriter, getKlusterColumnTypes
+
+#...for converting the outputs to the legacy JSON lists.
+from cernatschool.readers import convertToJson
+
+#...for resuming interrupted runs.
+from cernatschool.checkpoint import CheckpointLog, loadCheckpoint, getCheckpointOptions
+
+#...for caching the clusters found in each frame.
+from cernatschool.framecache import FrameCache
+
+
+def processFrame(f, gamma, features, frpath, klpath):
+    """
+    Make the images and the frame and cluster information for a frame.
+
+    @param [in] f The frame.
+    @param [in] gamma Include the gamma candidate clusters?
+    @param [in] features The cluster feature groups to write.
+    @param [in] frpath The path to the frame images.
+    @param [in] klpath The path to the cluster images.
+    @returns metadata The frame information.
+    @returns klusters The cluster information for each cluster.
+    """
+
+    ## The basename for the data frame, based on frame information.
+    bn = "%s_%d-%06d" % (f.getChipId(), f.getStartTimeSec(), f.getStartTimeSubSec())
+
+    # Create the frame image.
+    makeFrameImage(bn, f.getPixelMap(), frpath)
+
+    # Create the metadata dictionary for the frame.
+    metadata = {
+        "id"          : bn,
+        #
+        "chipid"      : f.getChipId(),
+        "hv"          : f.getBiasVoltage(),
+        "ikrum"       : f.getIKrum(),
+        #
+        "lat"         : f.getLatitude(),
+        "lon"         : f.getLongitude(),
+        "alt"         : f.getAltitude(),
+        #
+        "start_time"  : f.getStartTimeSec(),
+        "end_time"    : f.getEndTimeSec(),
+        "acqtime"     : f.getAcqTime(),
+        #
+        "n_pixel"     : f.getNumberOfUnmaskedPixels(),
+        "occ"         : f.getOccupancy(),
+        "occ_pc"      : f.getOccupancyPc(),
+        #
+        "n_kluster"   : f.getNumberOfKlusters(),
+        "n_gamma"     : f.getNumberOfGammas(),
+        "n_non_gamma" : f.getNumberOfNonGammas(),
+        #
+        "ismc"        : int(f.isMC()),
+        #
+        "engine"      : f.getEngine()
+        }
+
+    # The cluster analysis
+    #----------------------
+
+    ## A list of clusters.
+    klusters = []
+
+    # Loop over the clusters.
+    for i, kl in enumerate(f.getKlusterFinder().getListOfKlusters()):
+
+        if not gamma and kl.isGamma():
+            continue
+
+        ## The kluster ID.
+        klusterid = bn + "_k%05d" % (i)
+
+        # Get the cluster properties JSON entry and add it to the list.
+        klusters.append(getKlusterPropertiesJson(klusterid, kl, features))
+
+        # Make the cluster image.
+        makeKlusterImage(klusterid, kl, klpath)
+
+    return metadata, klusters
+
+## The dataset and processing options of a worker process (see initWorker).
+WORKER_STATE = {}
+
+def initWorker(path, bundlefolder, geo, frameargs, gamma, features, frpath, klpath):
+    """
+    Set up a worker process for processing frames in parallel.
+
+    Each worker opens the dataset for itself (which is quick if the
+    dataset's manifest is up to date, or it is an archive).
+
+    @param [in] path The path to the dataset folder, archive or bundle.
+    @param [in] bundlefolder The folder in the bundle holding the data files.
+    @param [in] geo The (latitude, longitude, altitude) of the dataset.
+    @param [in] frameargs The frame reading and clustering options.
+    @param [in] gamma Include the gamma candidate clusters?
+    @param [in] features The cluster feature groups to write.
+    @param [in] frpath The path to the frame images.
+    @param [in] klpath The path to the cluster images.
+    """
+
+    ds = Dataset(path, bundlefolder)
+
+    WORKER_STATE["ds"]        = ds
+    WORKER_STATE["dscfiles"]  = dict((df.getDscFilename(), df) for df in ds.dscfiles)
+    WORKER_STATE["geo"]       = geo
+    WORKER_STATE["frameargs"] = frameargs
+    WORKER_STATE["gamma"]     = gamma
+    WORKER_STATE["features"]  = features
+    WORKER_STATE["frpath"]    = frpath
+    WORKER_STATE["klpath"]    = klpath
+
+def processFrames(dscfilenames):
+    """
+    Process a chunk of frames in a worker process (see initWorker).
+
+    The information is returned already encoded as JSON, so that it is
+    written out exactly as it would be by a single process (the order of
+    the keys of the unpickled dictionaries could differ).
+
+    @param [in] dscfilenames The DSC file names of the frames.
+    @returns The encoded (frame information, cluster information) of each frame, in order.
+    """
+
+    ## The DSC files of the frames.
+    selection = [WORKER_STATE["dscfiles"][fn] for fn in dscfilenames]
+
+    ## The encoded frame and cluster information of each frame.
+    results = []
+
+    for f in WORKER_STATE["ds"].iterFrames(WORKER_STATE["geo"], selection = selection, **WORKER_STATE["frameargs"]):
+
+        metadata, klusters = processFrame(f, WORKER_STATE["gamma"], WORKER_STATE["features"], \
+            WORKER_STATE["frpath"], WORKER_STATE["klpath"])
+
+        results.append((json.dumps(metadata), [json.dumps(kl) for kl in klusters]))
+
+    return results
 
 
 if __name__ == "__main__":
@@ -43,11 +203,32 @@ if __name__ == "__main__":
 
     # Get the datafile path from the command line.
     parser = argparse.ArgumentParser()
-    parser.add_argument("inputPath",       help="Path to the input dataset.")
+    parser.add_argument("inputPath",       help="Path to the input dataset (or binary frame archive, or tar/zip bundle).")
     parser.add_argument("outputPath",      help="The path for the output files.")
     parser.add_argument("--maxframes",     help="The maximum number of frames to skim.", default=-1, type=int)
+    parser.add_argument("--mintime",       help="Only process frames starting at or after this time [s].", default=None, type=float)
+    parser.add_argument("--maxtime",       help="Only process frames starting before this time [s].", default=None, type=float)
+    parser.add_argument("--chipid",        help="Only process frames from this chip.", default=None)
+    parser.add_argument("--hv",            help="Only process frames with this bias voltage [V].", default=None, type=float)
+    parser.add_argument("--dac",           help="Only process frames with this DAC value, e.g. IKrum=1 (may be repeated).", default=[], action="append")
     parser.add_argument("-v", "--verbose", help="Increase output verbosity", action="store_true")
     parser.add_argument("-g", "--gamma",   help="Process gamma candidates too", action="store_true")
+    parser.add_argument("--engine",        help="The clustering engine to use.", default="auto", choices=["pixel", "label", "auto"])
+    parser.add_argument("--enginethreshold", help="The occupancy above which the 'auto' engine uses labelling.", default=AUTO_ENGINE_OCCUPANCY, type=float)
+    parser.add_argument("--calibrate",     help="Calibrate the 'auto' engine threshold before processing", action="store_true")
+    parser.add_argument("--features",      help="The cluster features to compute ('full' or e.g. 'size,radius,counts').", default="full")
+    parser.add_argument("--prefetch",      help="The number of frames to read ahead while clustering (0 to switch off).", default=PREFETCH_DEPTH, type=int)
+    parser.add_argument("--iothreads",     help="The number of threads reading the frames ahead.", default=IO_THREADS, type=int)
+    parser.add_argument("--jobs",          help="The number of processes to process the frames with.", default=1, type=int)
+    parser.add_argument("--watch",         help="Keep watching the dataset folder for new frames", action="store_true")
+    parser.add_argument("--watchinterval", help="The time between polls of the watched folder [s].", default=WATCH_INTERVAL, type=float)
+    parser.add_argument("--outputformat",  help="The frame and cluster information output format.", default="jsonl", choices=sorted(OUTPUT_FORMATS.keys()))
+    parser.add_argument("--legacyjson",    help="Also write the information as the legacy frames.json and klusters.json", action="store_true")
+    parser.add_argument("--checkpoint",    help="The number of frames processed between checkpoints.", default=CHECKPOINT_FRAMES, type=int)
+    parser.add_argument("--resume",        help="Carry on from the last checkpoint of an interrupted run", action="store_true")
+    parser.add_argument("--cache",         help="The folder for the frame cache (the clusters found in each frame).", default=None)
+    parser.add_argument("--cachesize",     help="The frame cache size limit [MB].", default=FRAME_CACHE_SIZE, type=float)
+    parser.add_argument("--linearity",     help="The linearity line of best fit mode.", default="compat", choices=["compat", "perpendicular"])
     args = parser.parse_args()
 
     ## The path to the data file.
@@ -66,7 +247,13 @@ if __name__ == "__main__":
         level=lg.INFO
 
     # Configure the logging.
-    lg.basicConfig(filename=outputpath + '/log_process-frames.log', filemode='w', level=level)
+    lg.basicConfig(filename=outputpath + '/log_process-frames.log', filemode='a' if args.resume else 'w', level=level)
+
+    ## The checkpoint of the run being resumed (None if starting afresh).
+    checkpoint = loadCheckpoint(outputpath) if args.resume else None
+    #
+    if checkpoint is not None and checkpoint["outputs"] is None:
+        checkpoint = None
 
     print("*")
     print("* Input path                  : '%s'" % (datapath))
@@ -82,6 +269,20 @@ if __name__ == "__main__":
     else:
         print("* Gamma candidate clusters WILL NOT be processed.")
     print("*")
+    print("* Clustering engine           : '%s'" % (args.engine))
+    if args.engine == "auto":
+        if checkpoint is not None:
+            # Carry on with the threshold the run was started with.
+            args.enginethreshold = checkpoint["options"]["enginethreshold"]
+        elif args.calibrate:
+            print("* Calibrating the 'auto' engine threshold...")
+            args.enginethreshold = calibrateEngineThreshold(features = args.features)
+        print("* Engine occupancy threshold  : %f" % (args.enginethreshold))
+    print("* Linearity fitting mode      : '%s'" % (args.linearity))
+    print("* Cluster features            : '%s'" % (args.features))
+    print("* Frames read ahead           : % 10d (%d I/O threads)" % (args.prefetch, args.iothreads))
+    print("* Output format               : '%s'" % (args.outputformat))
+    print("*")
 
 
     # Set up the directories
@@ -96,34 +297,97 @@ if __name__ == "__main__":
     ## The path to the frame images.
     frpath = outputpath + "/frames/"
     #
-    if os.path.isdir(frpath):
+    if os.path.isdir(frpath) and checkpoint is None:
         rmtree(frpath)
         lg.info(" * Removing directory '%s'..." % (frpath))
-    os.mkdir(frpath)
-    lg.info(" * Creating directory '%s'..." % (frpath))
+    if not os.path.isdir(frpath):
+        os.mkdir(frpath)
+        lg.info(" * Creating directory '%s'..." % (frpath))
     lg.info("")
 
     ## The path to the cluster images.
     klpath = outputpath + "/clusters/"
     #
-    if os.path.isdir(klpath):
+    if os.path.isdir(klpath) and checkpoint is None:
         rmtree(klpath)
         lg.info(" * Removing directory '%s'..." % (klpath))
-    os.mkdir(klpath)
-    lg.info(" * Creating directory '%s'..." % (klpath))
+    if not os.path.isdir(klpath):
+        os.mkdir(klpath)
+        lg.info(" * Creating directory '%s'..." % (klpath))
     lg.info("")
 
-    ## The dataset to process.
-    ds = Dataset(datapath + "/ASCIIxyC/")
+    ## The path to the cluster information columns.
+    kcpath = outputpath + "/" + KLUSTER_COLUMNS_FOLDER + "/"
+    #
+    if os.path.isdir(kcpath) and checkpoint is None:
+        rmtree(kcpath)
+        lg.info(" * Removing directory '%s'..." % (kcpath))
+
+    # Remove the frame and cluster information from previous runs (in any format).
+    if checkpoint is None:
+        for name in ["frames", "klusters"]:
+            for ext in OUTPUT_FORMATS.values():
+                if os.path.isfile(outputpath + "/" + name + ext):
+                    os.remove(outputpath + "/" + name + ext)
+                    lg.info(" * Removing '%s'..." % (outputpath + "/" + name + ext))
 
-    # Get the metadata from the JSON.
+    ## The dataset to process.
+    ds = None
 
     ## The frame metadata.
     fmd = None
-    #
-    with open(datapath + "/metadata.json", "r") as fmdf:
-        fmd = json.load(fmdf, fmd)
-    #
+
+    ## The pixel mask (shared by all of the frames).
+    pixel_mask = None
+
+    if args.watch and os.path.isfile(datapath):
+        raise IOError("* ERROR: only dataset folders can be watched!")
+
+    if args.watch and args.jobs > 1:
+        raise IOError("* ERROR: watched folders are processed by a single process!")
+
+    if isArchive(datapath):
+
+        # The metadata and pixel mask are stored in the archive.
+        ds = Dataset(datapath)
+        #
+        fmd = ds.getArchive().getMetadata()
+        #
+        if fmd is None:
+            raise IOError("* ERROR: '%s' archive has no metadata!" % (datapath))
+        #
+        pixel_mask = ds.getArchive().getPixelMask()
+
+    elif isBundle(datapath):
+
+        # Each worker process would have to read the whole tar file again
+        # (and keep the data in memory).
+        if args.jobs > 1 and isTarBundle(datapath):
+            raise IOError("* ERROR: tar bundles are processed by a single process - use a zip bundle or an archive (pack-dataset.py) with --jobs!")
+
+        # The data files are read straight out of the bundle.
+        ds = Dataset(datapath)
+
+        ## The dataset folder in the bundle (holding the ASCIIxyC folder).
+        bundlepath = os.path.dirname(ds.getBundleFolder())
+        #
+        if bundlepath != "":
+            bundlepath += "/"
+
+        fmd = json.loads(ds.getBundle().read(bundlepath + "metadata.json"))
+
+        pixel_mask = getPixelMaskFromBuffer(ds.getBundle().read(bundlepath + "masked_pixels.txt"))
+
+    else:
+
+        ds = Dataset(datapath + "/ASCIIxyC/", watch = args.watch)
+
+        # Get the metadata from the JSON.
+        with open(datapath + "/metadata.json", "r") as fmdf:
+            fmd = json.load(fmdf, fmd)
+
+        pixel_mask = loadPixelMask(datapath + "/masked_pixels.txt")
+
     ## Latitude of the dataset [deg.].
     lat = fmd[0]['lat'] # [deg.]
     #
@@ -133,108 +397,239 @@ if __name__ == "__main__":
     ## Altitude of the dataset [m].
     alt = fmd[0]['alt'] # [m]
 
-    ## The pixel mask.
-    pixel_mask = {}
+    ## The DAC values required.
+    dacs = {}
+    #
+    for d in args.dac:
+        if len(d.split("=")) != 2:
+            raise IOError("* ERROR: '%s' is not a DAC value (e.g. IKrum=1)!" % (d))
+        dacs[d.split("=")[0]] = int(d.split("=")[1])
+
+    ## The frames to process, selected from their detector settings alone
+    ## (so the other data files aren't read).
+    selection = ds.selectDscFiles(args.mintime, args.maxtime, args.chipid, args.hv, dacs, max_frames)
+
+    ## The frame reading and clustering options.
+    frameargs = { \
+        "prefetch"        : args.prefetch, \
+        "iothreads"       : args.iothreads, \
+        "pixelmask"       : pixel_mask, \
+        "engine"          : args.engine, \
+        "enginethreshold" : args.enginethreshold, \
+        "linmode"         : args.linearity, \
+        "features"        : args.features, \
+        "gammas"          : args.gamma \
+        }
+
+    ## The frame cache (None if the frames aren't cached).
+    cache = None
+    #
+    if args.cache is not None:
+        cache = FrameCache(args.cache, int(args.cachesize * 1024 * 1024))
+        frameargs["cache"] = cache
 
-    with open(datapath + "/masked_pixels.txt", "r") as mpf:
-        rows = mpf.readlines()
-        for row in rows:
-            vals = [int(val) for val in row.strip().split("\t")]
-            x = vals[0]; y = vals[1]; X = (256*y) + x; C = 1
-            pixel_mask[X] = C
+    ## The processing options (a resumed run must use the same ones).
+    options = getCheckpointOptions({ \
+        "input"           : os.path.abspath(datapath), \
+        "maxframes"       : args.maxframes, \
+        "mintime"         : args.mintime, \
+        "maxtime"         : args.maxtime, \
+        "chipid"          : args.chipid, \
+        "hv"              : args.hv, \
+        "dacs"            : dacs, \
+        "gamma"           : args.gamma, \
+        "engine"          : args.engine, \
+        "enginethreshold" : args.enginethreshold, \
+        "linearity"       : args.linearity, \
+        "features"        : args.features, \
+        "outputformat"    : args.outputformat \
+        })
 
-    ## The frames from the dataset.
-    frames = ds.getFrames((lat, lon, alt), pixelmask = pixel_mask)
+    ## The output states to carry on from {name : state} (all None if starting afresh).
+    resume = {"frames" : None, "klusters" : None, "klustercolumns" : None}
 
-    lg.info(" * Found %d datafiles." % (len(frames)))
-    print("* Found %d datafiles." % (len(frames)))
-    print("*")
+    ## The DSC file names of the frames already processed.
+    done = set()
 
-    if max_frames < 0 or max_frames > len(frames):
-        max_frames = len(frames)
+    if checkpoint is not None:
 
+        if checkpoint["options"] != options:
+            raise IOError("* ERROR: the run in '%s' was started with different options!" % (outputpath))
 
-    ## A list of frames.
-    mds = []
+        resume = checkpoint["outputs"]
 
-    # Clusters
-    #----------
+        done = set(checkpoint["frames"])
 
-    ## A list of clusters.
-    klusters = []
+        # Skip the frames already processed.
+        selection = [df for df in selection if os.path.basename(df.getDscFilename()) not in done]
+
+        print("* Resuming after %d frames." % (len(checkpoint["frames"])))
+        print("*")
+
+    ## The frame information writer.
+    frames_writer = openOutputWriter(outputpath + "/frames", args.outputformat, resume["frames"])
+
+    ## The cluster information writer.
+    klusters_writer = openOutputWriter(outputpath + "/klusters", args.outputformat, resume["klusters"])
+
+    ## The cluster information columns writer.
+    columns_writer = NpyColumnsWriter(kcpath, getKlusterColumnTypes(args.features), resume = resume["klustercolumns"])
+
+    ## The checkpoints of the frames processed.
+    checkpoint_log = CheckpointLog(outputpath, options, \
+        {"frames" : frames_writer, "klusters" : klusters_writer, "klustercolumns" : columns_writer}, \
+        args.checkpoint, checkpoint is not None)
 
     ## Frame count.
-    count = 0
-
-    # Loop over the frames.
-    for i, f in enumerate(sorted(frames)):
-
-        if i % 10 == 0:
-            print("* Processing frame % 5d of % 5d..." % (i, max_frames))
-
-        ## The basename for the data frame, based on frame information.
-        bn = "%s_%d-%06d" % (f.getChipId(), f.getStartTimeSec(), f.getStartTimeSubSec())
-
-        # Create the frame image.
-        makeFrameImage(bn, f.getPixelMap(), frpath)
-
-        # Create the metadata dictionary for the frame.
-        metadata = {
-            "id"          : bn,
-            #
-            "chipid"      : f.getChipId(),
-            "hv"          : f.getBiasVoltage(),
-            "ikrum"       : f.getIKrum(),
-            #
-            "lat"         : f.getLatitude(),
-            "lon"         : f.getLongitude(),
-            "alt"         : f.getAltitude(),
-            #
-            "start_time"  : f.getStartTimeSec(),
-            "end_time"    : f.getEndTimeSec(),
-            "acqtime"     : f.getAcqTime(),
-            #
-            "n_pixel"     : f.getNumberOfUnmaskedPixels(),
-            "occ"         : f.getOccupancy(),
-            "occ_pc"      : f.getOccupancyPc(),
-            #
-            "n_kluster"   : f.getNumberOfKlusters(),
-            "n_gamma"     : f.getNumberOfGammas(),
-            "n_non_gamma" : f.getNumberOfNonGammas(),
-            #
-            "ismc"        : int(f.isMC())
-            }
-
-        # Add the frame metadata to the list of frames.
-        mds.append(metadata)
-
-        # The cluster analysis
-        #----------------------
-
-        # Loop over the clusters.
-        for i, kl in enumerate(f.getKlusterFinder().getListOfKlusters()):
-
-            if not args.gamma and kl.isGamma():
-                continue
-
-            ## The kluster ID.
-            klusterid = bn + "_k%05d" % (i)
-
-            # Get the cluster properties JSON entry and add it to the list.
-            klusters.append(getKlusterPropertiesJson(klusterid, kl))
-
-            # Make the cluster image.
-            makeKlusterImage(klusterid, kl, klpath)
-
-        count += 1
-
-        if count >= max_frames: break
-        #break # TMP - uncomment to only process the first frame.
-
-    # Write out the frame information to a JSON file.
-    with open(outputpath + "/frames.json", "w") as jf:
-        json.dump(mds, jf)
-
-    # Write out the cluster information to a JSON file.
-    with open(outputpath + "/klusters.json", "w") as jf:
-        json.dump(klusters, jf)
+    count = len(done)
+
+    try:
+
+        if not args.watch:
+
+            ## The frames from the dataset (read and clustered one at a time).
+            frames = ds.iterFrames((lat, lon, alt), selection = selection, **frameargs)
+
+            lg.info(" * Found %d datafiles." % (ds.getNumberOfDataFiles()))
+            print("* Found %d datafiles." % (ds.getNumberOfDataFiles()))
+            print("*")
+
+            lg.info(" * Selected %d frames." % (len(selection)))
+            print("* Selected %d frames." % (len(selection)))
+            print("*")
+
+            max_frames = len(selection)
+
+            ## The frames' results from the worker processes (in start time order).
+            results = []
+
+            ## The worker processes.
+            pool = None
+
+            if args.jobs > 1:
+
+                ## The number of frames sent to a worker at once.
+                chunksize = max(1, min(FRAME_CHUNK_SIZE, -(-len(selection) // (4 * args.jobs))))
+
+                ## The DSC file names of each chunk of frames.
+                chunks = [[df.getDscFilename() for df in selection[j:j + chunksize]] \
+                    for j in range(0, len(selection), chunksize)]
+
+                pool = Pool(args.jobs, initWorker, (ds.foldername, ds.getBundleFolder(), (lat, lon, alt), \
+                    dict(frameargs, prefetch = 0), args.gamma, args.features, frpath, klpath))
+
+                results = (result for chunk in pool.imap(processFrames, chunks) for result in chunk)
+
+                # No frames are read in this process.
+                frames = []
+
+            try:
+
+                # Gather the results from the worker processes.
+                for i, (metadata, klusters) in enumerate(results):
+
+                    if i % 10 == 0:
+                        print("* Processing frame % 5d of % 5d..." % (i, max_frames))
+
+                    # Write out the frame and cluster information.
+                    frames_writer.appendEncoded([metadata])
+                    klusters_writer.appendEncoded(klusters)
+                    columns_writer.append([json.loads(kl) for kl in klusters], count)
+
+                    checkpoint_log.addFrame(selection[i].getDscFilename())
+
+                    count += 1
+
+            finally:
+
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+
+            # Loop over the frames (in start time order).
+            for i, f in enumerate(frames):
+
+                if i % 10 == 0:
+                    print("* Processing frame % 5d of % 5d..." % (i, max_frames))
+
+                metadata, klusters = processFrame(f, args.gamma, args.features, frpath, klpath)
+
+                # Write out the frame and cluster information.
+                frames_writer.append([metadata])
+                klusters_writer.append(klusters)
+                columns_writer.append(klusters, count)
+
+                checkpoint_log.addFrame(selection[i].getDscFilename())
+
+                count += 1
+
+                if i + 1 >= max_frames: break
+                #break # TMP - uncomment to only process the first frame.
+
+        else:
+
+            print("* Watching '%s' for new frames every %.1f [s] (Ctrl-C to stop)..." % (datapath, args.watchinterval))
+            print("*")
+
+            ## The frames rejected by the polls so far.
+            rejected = set()
+
+            while max_frames < 0 or count < max_frames:
+
+                ## The new frames, once they have been completely written (and not already processed).
+                selection = ds.selectDscFiles(args.mintime, args.maxtime, args.chipid, args.hv, dacs, \
+                    max_frames - count if max_frames >= 0 else -1, \
+                    [df for df in ds.pollNewDscFiles() if os.path.basename(df.getDscFilename()) not in done])
+
+                for i, f in enumerate(ds.iterFrames((lat, lon, alt), selection = selection, **frameargs)):
+
+                    metadata, klusters = processFrame(f, args.gamma, args.features, frpath, klpath)
+
+                    # Write out the frame and cluster information.
+                    frames_writer.append([metadata])
+                    klusters_writer.append(klusters)
+                    columns_writer.append(klusters, count)
+
+                    checkpoint_log.addFrame(selection[i].getDscFilename())
+
+                    count += 1
+
+                if len(selection) > 0:
+
+                    # Write out the new frames now, rather than waiting for the writers to fill up.
+                    frames_writer.flush()
+                    klusters_writer.flush()
+                    columns_writer.flush()
+
+                    lg.info(" * Processed %d new frames (%d in total)." % (len(selection), count))
+                    print("* Processed %d new frames (%d in total)." % (len(selection), count))
+
+                for bn in sorted(set(ds.getRejectedDscFilenames()) - rejected):
+                    print("* Skipping '%s' - it couldn't be read (see the log)." % (bn))
+
+                rejected = set(ds.getRejectedDscFilenames())
+
+                if max_frames < 0 or count < max_frames:
+                    time.sleep(args.watchinterval)
+
+    except KeyboardInterrupt:
+        print("*")
+        print("* Stopped after %d frames." % (count))
+
+    finally:
+        checkpoint_log.close()
+        frames_writer.close()
+        klusters_writer.close()
+        columns_writer.close()
+
+    # The worker processes keep their own frame cache counts.
+    if cache is not None and args.jobs <= 1:
+        lg.info(" * Found %d frames in the frame cache (%d not)." % (cache.getNumberOfHits(), cache.getNumberOfMisses()))
+        print("*")
+        print("* Found %d frames in the frame cache (%d not)." % (cache.getNumberOfHits(), cache.getNumberOfMisses()))
+
+    # Write the legacy JSON lists if requested.
+    if args.legacyjson and args.outputformat != "json":
+        for name in ["frames", "klusters"]:
+            print("* Writing '%s'..." % (outputpath + "/" + name + ".json"))
+            convertToJson(outputpath + "/" + name + OUTPUT_FORMATS[args.outputformat], outputpath + "/" + name + ".json")